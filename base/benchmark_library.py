@@ -0,0 +1,145 @@
+# benchmark_library.py
+
+import argparse
+import time
+import random
+import timeit
+import threading
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+
+from library_system import LibrarySystem, ConcurrentLibrarySystem, Book, CompactBookStore
+
+def build_library(num_books: int, num_borrowed: int, num_overdue: int, seed: int = 42) -> LibrarySystem:
+    """Create a library with a mix of available, borrowed and overdue books."""
+    rng = random.Random(seed)
+    library = LibrarySystem()
+    for i in range(num_books):
+        library.add_book(f"B{i}", f"Title {i}", f"Author {i % 1000}")
+
+    now = datetime.now()
+    borrowed = rng.sample(range(num_books), num_borrowed)
+    for n, i in enumerate(borrowed):
+        book_id = f"B{i}"
+        library.borrow_book(book_id, f"user{n}")
+        if n < num_overdue:
+            library.books[book_id].due_date = now - timedelta(hours=rng.randint(1, 500))
+    return library
+
+def scan_overdue_books(library: LibrarySystem) -> List[Book]:
+    """The full-catalog scan get_overdue_books used before the due-date index."""
+    now = datetime.now()
+    return [
+        book for book in library.books.values()
+        if not book.is_available and book.due_date and book.due_date < now
+    ]
+
+def benchmark_overdue(num_books: int, num_borrowed: int, num_overdue: int, repeats: int) -> None:
+    """Compare the indexed overdue query against the full scan."""
+    library = build_library(num_books, num_borrowed, num_overdue)
+
+    indexed = {book.book_id for book in library.get_overdue_books()}
+    scanned = {book.book_id for book in scan_overdue_books(library)}
+    assert indexed == scanned, "Index and scan disagree on overdue books"
+
+    scan_time = timeit.timeit(lambda: scan_overdue_books(library), number=repeats) / repeats
+    index_time = timeit.timeit(library.get_overdue_books, number=repeats) / repeats
+    next_due_time = timeit.timeit(lambda: library.get_next_due_books(10), number=repeats) / repeats
+
+    print(f"\nOverdue lookup ({num_books} books, {num_borrowed} borrowed, {num_overdue} overdue):")
+    print(f"  Full scan:           {scan_time * 1e3:9.3f} ms")
+    print(f"  Due-date index:      {index_time * 1e3:9.3f} ms  ({scan_time / index_time:.1f}x)")
+    print(f"  Next 10 coming due:  {next_due_time * 1e3:9.3f} ms")
+
+def measure_record_memory(compact: bool, num_books: int, num_borrowed: int) -> int:
+    """Bytes allocated to hold the book records alone (no search or due index)."""
+    now = datetime.now()
+    tracemalloc.start()
+    books = CompactBookStore() if compact else {}
+    for i in range(num_books):
+        book_id, title, author = f"B{i}", f"Title {i}", f"Author {i % 1000}"
+        if compact:
+            book = books.add(book_id, title, author)
+        else:
+            book = books[book_id] = Book(book_id, title, author)
+        if i < num_borrowed:
+            book.is_available = False
+            book.borrower = f"user{i % 5000}"
+            book.due_date = now + timedelta(days=14)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+def benchmark_memory(num_books: int, num_borrowed: int) -> None:
+    """Compare per-book record memory of the dict-of-Book and compact modes."""
+    dict_bytes = measure_record_memory(False, num_books, num_borrowed)
+    compact_bytes = measure_record_memory(True, num_books, num_borrowed)
+
+    print(f"\nRecord memory ({num_books} books, {num_borrowed} borrowed):")
+    print(f"  Book objects:        {dict_bytes / num_books:9.1f} bytes/book")
+    print(f"  Compact store:       {compact_bytes / num_books:9.1f} bytes/book  ({dict_bytes / compact_bytes:.1f}x)")
+
+def run_borrow_load(library: LibrarySystem, num_threads: int, ops_per_thread: int,
+                    num_books: int) -> float:
+    """Hammer the library with borrow/return pairs from several threads; returns elapsed seconds."""
+    barrier = threading.Barrier(num_threads + 1)
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        user_id = f"user{seed}"
+        barrier.wait()
+        for _ in range(ops_per_thread):
+            book_id = f"B{rng.randrange(num_books)}"
+            if library.borrow_book(book_id, user_id):
+                library.return_book(book_id)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def benchmark_concurrency(num_books: int, ops_per_thread: int, stripes: List[int]) -> None:
+    """Report borrow throughput and lock contention from 1 to 64 threads."""
+    records = [(f"B{i}", f"Title {i}", f"Author {i % 1000}") for i in range(num_books)]
+    print(f"\nConcurrent borrows ({num_books} books, {ops_per_thread} borrows/thread):")
+
+    # The unlocked LibrarySystem on one thread is the cost floor for the locking.
+    library = LibrarySystem()
+    library.add_books(records)
+    rate = ops_per_thread / run_borrow_load(library, 1, ops_per_thread, num_books)
+    print(f"  unlocked, 1 thread: {rate:,.0f} borrows/sec")
+
+    print(f"  {'stripes':>7} {'threads':>7} {'borrows/sec':>12} {'contention':>10}")
+    for num_stripes in stripes:
+        for num_threads in (1, 2, 4, 8, 16, 32, 64):
+            library = ConcurrentLibrarySystem(num_stripes=num_stripes)
+            library.add_books(records)
+            elapsed = run_borrow_load(library, num_threads, ops_per_thread, num_books)
+            stats = library.lock_stats()
+            rate = num_threads * ops_per_thread / elapsed
+            contention = stats['contended'] / stats['acquisitions'] if stats['acquisitions'] else 0.0
+            print(f"  {num_stripes:>7} {num_threads:>7} {rate:>12,.0f} {contention:>10.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for LibrarySystem")
+    parser.add_argument("--books", type=int, default=200_000, help="Number of books in the catalog")
+    parser.add_argument("--borrowed", type=int, default=20_000, help="Number of borrowed books")
+    parser.add_argument("--overdue", type=int, default=100, help="Number of overdue books")
+    parser.add_argument("--repeats", type=int, default=20, help="Timing repetitions per query")
+    parser.add_argument("--threaded-books", type=int, default=1000,
+                        help="Catalog size for the concurrent borrow benchmark")
+    parser.add_argument("--ops-per-thread", type=int, default=2000, help="Borrows issued by each thread")
+    args = parser.parse_args()
+
+    benchmark_overdue(args.books, args.borrowed, args.overdue, args.repeats)
+    benchmark_memory(args.books, args.borrowed)
+    # A single stripe is the global-lock baseline.
+    benchmark_concurrency(args.threaded_books, args.ops_per_thread, stripes=[1, 64])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# library_persistence.py
+
+import os
+import json
+import pickle
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from library_system import LibrarySystem
+
+class WriteAheadLog:
+    """
+    Append-only log of library mutations with group commit.
+
+    `append` only buffers the record; a background thread writes and fsyncs
+    everything buffered at most every `commit_interval` seconds (or as soon
+    as `max_batch` records are pending), so callers never wait on the disk.
+    Call `sync` when a record must be durable before continuing.
+    """
+
+    def __init__(self, path: str, next_lsn: int = 1, commit_interval: float = 0.01,
+                 max_batch: int = 4096, fsync: bool = True):
+        self.path = path
+        self.next_lsn = next_lsn
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._file = open(path, 'a', encoding='utf-8')
+        self._pending: List[str] = []
+        self._durable_lsn = next_lsn - 1
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def append(self, *record: Any) -> int:
+        """Buffer a record and return the log sequence number assigned to it."""
+        with self._cond:
+            lsn = self.next_lsn
+            self.next_lsn += 1
+            self._pending.append(json.dumps([lsn, *record], separators=(',', ':')))
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+        return lsn
+
+    def _flush_loop(self) -> None:
+        with self._cond:
+            while not self._closed:
+                self._cond.wait(self.commit_interval)
+                self._commit()
+
+    def _commit(self) -> None:
+        # Called with the condition held; one write and fsync per group of records.
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._file.write('\n'.join(batch) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._durable_lsn = self.next_lsn - 1
+        self._cond.notify_all()
+
+    def sync(self) -> None:
+        """Block until every appended record is on disk."""
+        with self._cond:
+            self._commit()
+
+    def close(self) -> None:
+        """Commit anything still buffered and stop the flusher thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._commit()
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+    @staticmethod
+    def read(path: str) -> List[List[Any]]:
+        """Read the records in a log file, ignoring a torn final line."""
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Only the last write can be incomplete after a crash.
+                    break
+        return records
+
+class PersistentLibrarySystem(LibrarySystem):
+    """
+    LibrarySystem whose state survives restarts.
+
+    Every mutation is appended to a write-ahead log in `data_dir`. A
+    checkpoint writes a binary snapshot of the whole library and starts a new
+    log segment, so recovery loads the latest snapshot and replays only the
+    records logged after it. A checkpoint is taken automatically every
+    `snapshot_every` mutations: the mutation that triggers it only starts a
+    new log segment, and a background thread folds the closed segments into
+    the previous snapshot, so the library is never pickled on the caller's
+    thread.
+    """
+
+    SNAPSHOT_FILE = "snapshot.pkl"
+    SEGMENT_PREFIX = "wal."
+
+    def __init__(self, data_dir: str, compact: bool = False, snapshot_every: int = 100_000,
+                 commit_interval: float = 0.01, fsync: bool = True):
+        super().__init__(compact=compact)
+        self.data_dir = data_dir
+        self.snapshot_every = snapshot_every
+        self._commit_interval = commit_interval
+        self._fsync = fsync
+        self._replaying = True
+        os.makedirs(data_dir, exist_ok=True)
+        last_lsn = self._recover()
+        self._replaying = False
+        self._since_snapshot = 0
+        self._checkpointer = None
+        self._checkpoint_error = None
+        self.wal = self._open_segment(last_lsn + 1)
+
+    def _segment_path(self, first_lsn: int) -> str:
+        return os.path.join(self.data_dir, f"{self.SEGMENT_PREFIX}{first_lsn:020d}.log")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(".log"):
+                first_lsn = int(name[len(self.SEGMENT_PREFIX):-len(".log")])
+                segments.append((first_lsn, os.path.join(self.data_dir, name)))
+        return sorted(segments)
+
+    def _open_segment(self, first_lsn: int) -> WriteAheadLog:
+        return WriteAheadLog(self._segment_path(first_lsn), next_lsn=first_lsn,
+                             commit_interval=self._commit_interval, fsync=self._fsync)
+
+    def _recover(self) -> int:
+        """Load the latest snapshot, replay the log tail and return the last applied LSN."""
+        last_lsn = 0
+        snapshot_path = os.path.join(self.data_dir, self.SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+            self._restore(snapshot)
+            last_lsn = snapshot['lsn']
+
+        for _, path in self._segments():
+            for lsn, op, *args in WriteAheadLog.read(path):
+                if lsn <= last_lsn:
+                    continue
+                self._apply(op, args)
+                last_lsn = lsn
+        return last_lsn
+
+    def _restore(self, snapshot: Dict[str, Any]) -> None:
+        records = snapshot['books']
+        for book_id, title, author, _, _ in records:
+            self._store(book_id, title, author)
+        self.search_index.add_many((book_id, title, author) for book_id, title, author, _, _ in records)
+        for book_id, _, _, borrower, due_ts in records:
+            if borrower is not None:
+                self._lend(self.books[book_id], borrower, datetime.fromtimestamp(due_ts))
+
+    def _apply(self, op: str, args: List[Any]) -> None:
+        if op == "add":
+            self._insert(*args)
+        elif op == "remove":
+            self._delete(args[0])
+        elif op == "lend":
+            book_id, user_id, due_ts = args
+            self._lend(self.books[book_id], user_id, datetime.fromtimestamp(due_ts))
+        elif op == "release":
+            self._release(self.books[args[0]])
+        else:
+            raise ValueError(f"Unknown WAL operation: {op}")
+
+    def _log(self, *record: Any) -> None:
+        if self._replaying:
+            return
+        self.wal.append(*record)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every and not self._checkpointing():
+            lsn = self._rotate()
+            self._checkpointer = threading.Thread(target=self._background_checkpoint, args=(lsn,),
+                                                  name="checkpointer", daemon=True)
+            self._checkpointer.start()
+
+    def _store(self, book_id: str, title: str, author: str) -> None:
+        super()._store(book_id, title, author)
+        self._log("add", book_id, title, author)
+
+    def _delete(self, book_id: str) -> None:
+        super()._delete(book_id)
+        self._log("remove", book_id)
+
+    def _lend(self, book, user_id: str, due_date: datetime) -> None:
+        super()._lend(book, user_id, due_date)
+        self._log("lend", book.book_id, user_id, due_date.timestamp())
+
+    def _release(self, book) -> None:
+        super()._release(book)
+        self._log("release", book.book_id)
+
+    def _checkpointing(self) -> bool:
+        return self._checkpointer is not None and self._checkpointer.is_alive()
+
+    def _rotate(self) -> int:
+        """Start a new log segment and return the last LSN of the closed ones."""
+        self.wal.close()
+        lsn = self.wal.next_lsn - 1
+        self._since_snapshot = 0
+        self.wal = self._open_segment(lsn + 1)
+        return lsn
+
+    def _background_checkpoint(self, lsn: int) -> None:
+        try:
+            self._write_snapshot(lsn)
+        except BaseException as e:
+            self._checkpoint_error = e
+
+    def _fsync_dir(self) -> None:
+        """Make renames and deletions in the data directory durable."""
+        if not self._fsync:
+            return
+        fd = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _fold(books: Dict[str, list], op: str, args: List[Any]) -> None:
+        """Apply one log record to snapshot records keyed by book id."""
+        if op == "add":
+            book_id, title, author = args
+            books[book_id] = [book_id, title, author, None, None]
+        elif op == "remove":
+            books.pop(args[0], None)
+        elif op == "lend":
+            book_id, user_id, due_ts = args
+            books[book_id][3:] = [user_id, due_ts]
+        elif op == "release":
+            books[args[0]][3:] = [None, None]
+        else:
+            raise ValueError(f"Unknown WAL operation: {op}")
+
+    def _write_snapshot(self, lsn: int) -> None:
+        """
+        Fold the closed log segments into the snapshot, up to and including `lsn`.
+
+        Only reads files the library no longer writes to (the previous
+        snapshot and the segments before the current one), so it can run
+        while the library keeps logging to the current segment.
+        """
+        snapshot_path = os.path.join(self.data_dir, self.SNAPSHOT_FILE)
+        books: Dict[str, list] = {}
+        last_lsn = 0
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+            last_lsn = snapshot['lsn']
+            books = {record[0]: list(record) for record in snapshot['books']}
+
+        segments = [path for first_lsn, path in self._segments() if first_lsn <= lsn]
+        for path in segments:
+            for record_lsn, op, *args in WriteAheadLog.read(path):
+                if last_lsn < record_lsn <= lsn:
+                    self._fold(books, op, args)
+
+        snapshot = {'lsn': lsn, 'books': [tuple(record) for record in books.values()]}
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            if self._fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+        self._fsync_dir()
+
+        for path in segments:
+            os.remove(path)
+        self._fsync_dir()
+
+    def wait_for_checkpoint(self) -> None:
+        """Block until a background checkpoint finishes, re-raising its error if it failed."""
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+            self._checkpointer = None
+        error, self._checkpoint_error = self._checkpoint_error, None
+        if error is not None:
+            raise error
+
+    def checkpoint(self) -> None:
+        """Write a snapshot covering every mutation so far and drop the log it supersedes."""
+        self.wait_for_checkpoint()
+        self._write_snapshot(self._rotate())
+
+    def sync(self) -> None:
+        """Block until every mutation so far is durable."""
+        self.wal.sync()
+
+    def close(self) -> None:
+        """Finish any background checkpoint, flush the log and release its file."""
+        try:
+            self.wait_for_checkpoint()
+        finally:
+            self.wal.close()
@@ -1,37 +1,655 @@
 # library_system.py
 
-from typing import Dict, List, Optional
+import csv
+import sys
+import json
+import heapq
+import threading
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from datetime import datetime, timedelta
 
 class Book:
+    __slots__ = ('book_id', 'title', 'author', 'is_available', '_due_index', '_due_date', 'borrower')
+
     def __init__(self, book_id: str, title: str, author: str):
         self.book_id = book_id
         self.title = title
         self.author = author
         self.is_available = True
-        self.due_date: Optional[datetime] = None
+        self._due_index: Optional["DueDateIndex"] = None
+        self._due_date: Optional[datetime] = None
         self.borrower: Optional[str] = None
+
+    @property
+    def due_date(self) -> Optional[datetime]:
+        return self._due_date
+
+    @due_date.setter
+    def due_date(self, value: Optional[datetime]) -> None:
+        self._due_date = value
+        if self._due_index is not None:
+            self._due_index.set(self.book_id, value)
     
     def __str__(self) -> str:
         return f"{self.title} by {self.author} (ID: {self.book_id})"
 
-class LibrarySystem:
+class BookView:
+    """Lightweight handle onto one book of a CompactBookStore.
+
+    Reads and writes go straight to the store's columns, so a view behaves
+    like a Book without owning any per-book state of its own. Every access
+    checks that the book is still in the store and follows it if compaction
+    moved it to another row, so a view kept after its book was removed
+    raises KeyError instead of reading another book.
+    """
+
+    __slots__ = ('_store', '_row', '_epoch', 'book_id')
+
+    def __init__(self, store: "CompactBookStore", row: int, book_id: str):
+        self._store = store
+        self._row = row
+        self._epoch = store.epoch
+        self.book_id = book_id
+
+    def _checked_row(self) -> int:
+        store = self._store
+        if self._epoch != store.epoch or not store.is_live(self._row):
+            self._row = store.row_of(self.book_id)
+            self._epoch = store.epoch
+        return self._row
+
+    @property
+    def title(self) -> str:
+        return self._store.title(self._checked_row())
+
+    @property
+    def author(self) -> str:
+        return self._store.author(self._checked_row())
+
+    @property
+    def is_available(self) -> bool:
+        return self._store.is_available(self._checked_row())
+
+    @is_available.setter
+    def is_available(self, value: bool) -> None:
+        self._store.set_available(self._checked_row(), value)
+
+    @property
+    def borrower(self) -> Optional[str]:
+        return self._store.borrower(self._checked_row())
+
+    @borrower.setter
+    def borrower(self, value: Optional[str]) -> None:
+        self._store.set_borrower(self._checked_row(), value)
+
+    @property
+    def due_date(self) -> Optional[datetime]:
+        return self._store.due_date(self._checked_row())
+
+    @due_date.setter
+    def due_date(self, value: Optional[datetime]) -> None:
+        self._store.set_due_date(self._checked_row(), value)
+
+    def __str__(self) -> str:
+        return f"{self.title} by {self.author} (ID: {self.book_id})"
+
+class CompactBookStore(MutableMapping):
+    """Columnar book storage exposing a book_id -> BookView mapping.
+
+    Each row's id and title are UTF-8 encoded back to back into one shared
+    buffer. Books are found through an open-addressing hash table of row
+    numbers rather than a dict, so no per-book Python object is kept.
+    Authors and borrowers are stored as codes into tables of distinct names,
+    due dates as epoch seconds in a float array (NaN when not borrowed), and
+    availability as a bitmap.
+
+    Rows are only appended, so iteration follows insertion order like a
+    dict. Removing a book marks its row dead; once dead rows outnumber live
+    ones the columns are compacted, which reclaims their bytes and
+    renumbers the rows (views follow their book to its new row). The name
+    tables only grow, by one entry per distinct author or borrower.
+    """
+
+    EMPTY = -1
+    DELETED = -2
+    MIN_SLOTS = 8
+
+    def __init__(self, due_index: Optional["DueDateIndex"] = None):
+        self.due_index = due_index
+        # Bumped whenever compaction renumbers rows
+        self.epoch = 0
+        self.count = 0
+        self.records = bytearray()
+        self.starts = array('Q')
+        self.id_lengths = array('H')
+        self.title_lengths = array('I')
+        self.author_codes = array('I')
+        self.borrower_codes = array('I')
+        self.due = array('d')
+        self.available = bytearray()
+        self.live = bytearray()
+        self.slots = array('i', [self.EMPTY]) * self.MIN_SLOTS
+        self._used_slots = 0
+        self.author_names: List[str] = []
+        self._author_index: Dict[str, int] = {}
+        # Code 0 is "no borrower"
+        self.borrower_names: List[Optional[str]] = [None]
+        self._borrower_index: Dict[str, int] = {}
+
+    @staticmethod
+    def _intern(name: str, names: List[Optional[str]], index: Dict[str, int]) -> int:
+        code = index.get(name)
+        if code is None:
+            code = index[name] = len(names)
+            names.append(sys.intern(name))
+        return code
+
+    @staticmethod
+    def _get_bit(bits: bytearray, row: int) -> bool:
+        return bool(bits[row >> 3] & (1 << (row & 7)))
+
+    @staticmethod
+    def _set_bit(bits: bytearray, row: int, value: bool) -> None:
+        if value:
+            bits[row >> 3] |= 1 << (row & 7)
+        else:
+            bits[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+    def _probe(self, book_id: str) -> Tuple[int, int]:
+        """Return (row or -1, slot holding the book or the slot to insert it into)."""
+        key = book_id.encode('utf-8')
+        size = len(key)
+        slots, starts, id_lengths, records = self.slots, self.starts, self.id_lengths, self.records
+        mask = len(slots) - 1
+        i = hash(book_id) & mask
+        free = -1
+        while True:
+            row = slots[i]
+            if row == self.EMPTY:
+                return -1, (i if free < 0 else free)
+            if row == self.DELETED:
+                if free < 0:
+                    free = i
+            elif id_lengths[row] == size and records[starts[row]:starts[row] + size] == key:
+                return row, i
+            i = (i + 1) & mask
+
+    def _resize_slots(self, count: int) -> None:
+        """Rebuild the hash table for `count` live rows, dropping deleted markers."""
+        size = self.MIN_SLOTS
+        while size * 2 < count * 3:
+            size *= 2
+        size *= 2
+        self.slots = slots = array('i', [self.EMPTY]) * size
+        mask = size - 1
+        for row in range(len(self.starts)):
+            if self.is_live(row):
+                i = hash(self.book_id(row)) & mask
+                while slots[i] != self.EMPTY:
+                    i = (i + 1) & mask
+                slots[i] = row
+        self._used_slots = count
+
+    def row_of(self, book_id: str) -> int:
+        """Return the row holding a book, or raise KeyError."""
+        row, _ = self._probe(book_id)
+        if row < 0:
+            raise KeyError(book_id)
+        return row
+
+    def add(self, book_id: str, title: str, author: str) -> BookView:
+        """Store a new, available book and return a view onto it."""
+        if book_id in self:
+            del self[book_id]
+        if (self._used_slots + 1) * 3 > len(self.slots) * 2:
+            self._resize_slots(self.count + 1)
+        key = book_id.encode('utf-8')
+        if len(key) > 0xFFFF:
+            raise ValueError(f"book_id is too long: {len(key)} bytes")
+        encoded = title.encode('utf-8')
+        row = len(self.starts)
+        self.starts.append(len(self.records))
+        self.records += key
+        self.records += encoded
+        self.id_lengths.append(len(key))
+        self.title_lengths.append(len(encoded))
+        self.author_codes.append(self._intern(author, self.author_names, self._author_index))
+        self.borrower_codes.append(0)
+        self.due.append(float('nan'))
+        if row >> 3 >= len(self.live):
+            self.live.append(0)
+            self.available.append(0)
+        self._set_bit(self.live, row, True)
+        self._set_bit(self.available, row, True)
+
+        _, slot = self._probe(book_id)
+        if self.slots[slot] == self.EMPTY:
+            self._used_slots += 1
+        self.slots[slot] = row
+        self.count += 1
+        return BookView(self, row, book_id)
+
+    def book_id(self, row: int) -> str:
+        start = self.starts[row]
+        return self.records[start:start + self.id_lengths[row]].decode('utf-8')
+
+    def title(self, row: int) -> str:
+        start = self.starts[row] + self.id_lengths[row]
+        return self.records[start:start + self.title_lengths[row]].decode('utf-8')
+
+    def author(self, row: int) -> str:
+        return self.author_names[self.author_codes[row]]
+
+    def borrower(self, row: int) -> Optional[str]:
+        return self.borrower_names[self.borrower_codes[row]]
+
+    def set_borrower(self, row: int, value: Optional[str]) -> None:
+        code = 0 if value is None else self._intern(value, self.borrower_names, self._borrower_index)
+        self.borrower_codes[row] = code
+
+    def is_live(self, row: int) -> bool:
+        return row < len(self.starts) and self._get_bit(self.live, row)
+
+    def is_available(self, row: int) -> bool:
+        return self._get_bit(self.available, row)
+
+    def set_available(self, row: int, value: bool) -> None:
+        self._set_bit(self.available, row, value)
+
+    def due_date(self, row: int) -> Optional[datetime]:
+        seconds = self.due[row]
+        if seconds != seconds:  # NaN: not borrowed
+            return None
+        return datetime.fromtimestamp(seconds)
+
+    def set_due_date(self, row: int, value: Optional[datetime]) -> None:
+        self.due[row] = float('nan') if value is None else value.timestamp()
+        if self.due_index is not None:
+            self.due_index.set(self.book_id(row), value)
+
+    def _compact(self) -> None:
+        """Drop dead rows and their bytes, renumbering the live rows in order."""
+        keep = [row for row in range(len(self.starts)) if self._get_bit(self.live, row)]
+        records = bytearray()
+        starts = array('Q')
+        for row in keep:
+            start = self.starts[row]
+            starts.append(len(records))
+            records += self.records[start:start + self.id_lengths[row] + self.title_lengths[row]]
+        self.records = records
+        self.starts = starts
+        self.id_lengths = array('H', (self.id_lengths[row] for row in keep))
+        self.title_lengths = array('I', (self.title_lengths[row] for row in keep))
+        self.author_codes = array('I', (self.author_codes[row] for row in keep))
+        self.borrower_codes = array('I', (self.borrower_codes[row] for row in keep))
+        self.due = array('d', (self.due[row] for row in keep))
+        available = bytearray((len(keep) + 7) >> 3)
+        for new_row, row in enumerate(keep):
+            if self._get_bit(self.available, row):
+                self._set_bit(available, new_row, True)
+        self.available = available
+        self.live = bytearray(b'\xff' * (len(keep) >> 3))
+        if len(keep) & 7:
+            self.live.append((1 << (len(keep) & 7)) - 1)
+        self.epoch += 1
+        self._resize_slots(len(keep))
+
+    def __getitem__(self, book_id: str) -> BookView:
+        return BookView(self, self.row_of(book_id), book_id)
+
+    def __setitem__(self, book_id: str, book: Union[Book, BookView]) -> None:
+        view = self.add(book_id, book.title, book.author)
+        view.is_available = book.is_available
+        view.borrower = book.borrower
+        view.due_date = book.due_date
+
+    def __delitem__(self, book_id: str) -> None:
+        row, slot = self._probe(book_id)
+        if row < 0:
+            raise KeyError(book_id)
+        self.slots[slot] = self.DELETED
+        self._set_bit(self.live, row, False)
+        self.count -= 1
+        dead = len(self.starts) - self.count
+        if dead >= 64 and dead > self.count:
+            self._compact()
+
+    def __contains__(self, book_id: object) -> bool:
+        return isinstance(book_id, str) and self._probe(book_id)[0] >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        epoch = self.epoch
+        for row in range(len(self.starts)):
+            if epoch != self.epoch:
+                raise RuntimeError("CompactBookStore changed size during iteration")
+            if self.is_live(row):
+                yield self.book_id(row)
+
+    def __len__(self) -> int:
+        return self.count
+
+class DueDateIndex:
+    """Due dates of borrowed books in two min-heaps of (due_date, generation, book_id).
+
+    `past` holds entries due before `boundary` and `upcoming` the rest.
+    Queries move the boundary forward to their reference time, which moves
+    each entry from `upcoming` to `past` at most once. An overdue query then
+    reads only `past`, and a next-due query walks only entries due at or
+    after its start, however large the overdue backlog is. Superseded
+    entries stay in the heaps until they surface or the heaps are
+    compacted; an entry is live only while it is the one recorded in `live`.
+    """
+
     def __init__(self):
-        self.books: Dict[str, Book] = {}
+        self.past: List[Tuple[datetime, int, str]] = []
+        self.upcoming: List[Tuple[datetime, int, str]] = []
+        self.boundary: Optional[datetime] = None
+        self.live: Dict[str, Tuple[datetime, int, str]] = {}
+        self._generation = 0
+
+    def set(self, book_id: str, due_date: Optional[datetime]) -> None:
+        """Record (or clear, when due_date is None) the due date of a book."""
+        if due_date is None:
+            self.discard(book_id)
+            return
+        self._generation += 1
+        entry = (due_date, self._generation, book_id)
+        self.live[book_id] = entry
+        if self.boundary is not None and due_date < self.boundary:
+            heapq.heappush(self.past, entry)
+        else:
+            heapq.heappush(self.upcoming, entry)
+        self._maybe_compact()
+
+    def discard(self, book_id: str) -> None:
+        """Forget a book's due date."""
+        if self.live.pop(book_id, None) is not None:
+            self._maybe_compact()
+
+    def _is_live(self, entry: Tuple[datetime, int, str]) -> bool:
+        return self.live.get(entry[2]) is entry
+
+    def _drop_stale_tops(self) -> None:
+        for heap in (self.past, self.upcoming):
+            while heap and not self._is_live(heap[0]):
+                heapq.heappop(heap)
+
+    def _maybe_compact(self) -> None:
+        self._drop_stale_tops()
+        if len(self.past) + len(self.upcoming) > 2 * len(self.live) + 64:
+            entries = self.live.values()
+            if self.boundary is None:
+                self.past, self.upcoming = [], list(entries)
+            else:
+                self.past = [entry for entry in entries if entry[0] < self.boundary]
+                self.upcoming = [entry for entry in entries if entry[0] >= self.boundary]
+            heapq.heapify(self.past)
+            heapq.heapify(self.upcoming)
+
+    def _advance(self, when: datetime) -> None:
+        """Move the boundary forward to `when`, moving entries now due before it into `past`."""
+        if self.boundary is not None and when <= self.boundary:
+            return
+        self.boundary = when
+        past, upcoming = self.past, self.upcoming
+        while upcoming and upcoming[0][0] < when:
+            entry = heapq.heappop(upcoming)
+            if self._is_live(entry):
+                heapq.heappush(past, entry)
+
+    def due_before(self, when: datetime) -> List[str]:
+        """Return ids of books due strictly before `when`, earliest first."""
+        self._advance(when)
+        if when == self.boundary:
+            live = self.live
+            found = [entry for entry in self.past if live.get(entry[2]) is entry]
+        else:
+            # Asked about an earlier time than a previous query: heap order
+            # means a subtree can be skipped as soon as its root is not
+            # before `when`, so only matching (or stale) entries are visited.
+            past = self.past
+            found = []
+            stack = [0] if past else []
+            while stack:
+                i = stack.pop()
+                entry = past[i]
+                if entry[0] >= when:
+                    continue
+                if self._is_live(entry):
+                    found.append(entry)
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < len(past):
+                        stack.append(child)
+        found.sort()
+        return [book_id for _, _, book_id in found]
+
+    def next_due(self, count: int, after: datetime) -> List[str]:
+        """Return ids of the `count` books coming due soonest at or after `after`."""
+        self._advance(after)
+        # Superseded entries that surfaced are dropped for good rather than
+        # walked past on every query
+        self._drop_stale_tops()
+        found: List[Tuple[datetime, int, str]] = []
+        if after < self.boundary:
+            # Asked about an earlier time than a previous query; entries due
+            # between then and the boundary are in `past`, which has to be scanned.
+            found = heapq.nsmallest(count, (entry for entry in self.past
+                                            if entry[0] >= after and self._is_live(entry)))
+        # Everything in `upcoming` is due at or after the boundary, so the
+        # frontier walk only visits the entries it returns (and stale ones).
+        upcoming = self.upcoming
+        frontier = [(upcoming[0], 0)] if upcoming else []
+        taken = 0
+        while frontier and taken < count:
+            entry, i = heapq.heappop(frontier)
+            if self._is_live(entry):
+                found.append(entry)
+                taken += 1
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(upcoming):
+                    heapq.heappush(frontier, (upcoming[child], child))
+        found.sort()
+        return [book_id for _, _, book_id in found[:count]]
+
+class SynchronizedDueDateIndex(DueDateIndex):
+    """DueDateIndex whose operations are serialized by an internal lock."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.RLock()
+
+    def set(self, book_id: str, due_date: Optional[datetime]) -> None:
+        with self._lock:
+            super().set(book_id, due_date)
+
+    def discard(self, book_id: str) -> None:
+        with self._lock:
+            super().discard(book_id)
+
+    def due_before(self, when: datetime) -> List[str]:
+        with self._lock:
+            return super().due_before(when)
+
+    def next_due(self, count: int, after: datetime) -> List[str]:
+        with self._lock:
+            return super().next_due(count, after)
+
+class SearchIndex:
+    """Trigram inverted index over the lower-cased title and author of each book.
+
+    With copy_on_write=True posting sets are frozensets that are replaced
+    rather than mutated, so readers can search without locking while a
+    single writer updates the index.
+    """
+
+    GRAM = 3
+
+    def __init__(self, copy_on_write: bool = False):
+        self.copy_on_write = copy_on_write
+        self.postings: Dict[str, Set[str]] = {}
+        # book_id -> (insertion sequence, lower-cased title, lower-cased author)
+        self.fields: Dict[str, Tuple[int, str, str]] = {}
+        self._next_seq = 0
+
+    @classmethod
+    def grams(cls, text: str) -> Set[str]:
+        return {text[i:i + cls.GRAM] for i in range(len(text) - cls.GRAM + 1)}
+
+    def add(self, book_id: str, title: str, author: str) -> None:
+        """Index a book's title and author."""
+        self.add_many([(book_id, title, author)])
+
+    def add_many(self, records: Iterable[Tuple[str, str, str]]) -> None:
+        """Index a batch of (book_id, title, author) records, touching each posting once."""
+        touched: Dict[str, List[str]] = {}
+        for book_id, title, author in records:
+            title, author = title.lower(), author.lower()
+            # Fields go in before postings so a reader never finds an id it cannot verify.
+            self.fields[book_id] = (self._next_seq, title, author)
+            self._next_seq += 1
+            for gram in self.grams(title) | self.grams(author):
+                touched.setdefault(gram, []).append(book_id)
+
+        postings = self.postings
+        for gram, book_ids in touched.items():
+            if self.copy_on_write:
+                postings[gram] = postings.get(gram, frozenset()).union(book_ids)
+            else:
+                postings.setdefault(gram, set()).update(book_ids)
+
+    def remove(self, book_id: str) -> None:
+        """Drop a book from the index."""
+        entry = self.fields.pop(book_id, None)
+        if entry is None:
+            return
+        _, title, author = entry
+        postings = self.postings
+        for gram in self.grams(title) | self.grams(author):
+            posting = postings.get(gram)
+            if posting is None:
+                continue
+            if self.copy_on_write:
+                posting = posting - {book_id}
+            else:
+                posting.discard(book_id)
+            if posting:
+                postings[gram] = posting
+            else:
+                del postings[gram]
+
+    def search(self, query: str) -> List[str]:
+        """Return ids of books whose title or author contains query, in insertion order."""
+        query = query.lower()
+        if len(query) < self.GRAM:
+            # Too short to use the postings; scan the pre-lower-cased fields.
+            fields = list(self.fields.items()) if self.copy_on_write else self.fields.items()
+            return [
+                book_id for book_id, (_, title, author) in fields
+                if query in title or query in author
+            ]
+
+        postings = []
+        for gram in self.grams(query):
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return []
+
+        # Every trigram matching does not imply a substring match, so verify.
+        matches = []
+        for book_id in candidates:
+            entry = self.fields.get(book_id)
+            if entry is None:
+                continue
+            seq, title, author = entry
+            if query in title or query in author:
+                matches.append((seq, book_id))
+        matches.sort()
+        return [book_id for _, book_id in matches]
+
+def iter_catalog_records(path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Lazily read (book_id, title, author) records from a catalog file.
+
+    `.jsonl` files hold one JSON object per line; anything else is read as
+    CSV with a `book_id,title,author` header.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record['book_id'], record['title'], record['author']
+        else:
+            for record in csv.DictReader(f):
+                yield record['book_id'], record['title'], record['author']
+
+class LibrarySystem:
+    def __init__(self, compact: bool = False):
+        """
+        Args:
+            compact: Keep book records in a columnar CompactBookStore and hand
+                out BookView objects instead of allocating a Book per record.
+        """
+        self.compact = compact
         self.loan_period = timedelta(days=14)
+        self.search_index = SearchIndex()
+        self.due_index = DueDateIndex()
+        self.books: Union[Dict[str, Book], CompactBookStore] = (
+            CompactBookStore(self.due_index) if compact else {}
+        )
     
+    def _store(self, book_id: str, title: str, author: str) -> None:
+        if self.compact:
+            self.books.add(book_id, title, author)
+        else:
+            book = Book(book_id, title, author)
+            book._due_index = self.due_index
+            self.books[book_id] = book
+
+    def _insert(self, book_id: str, title: str, author: str) -> None:
+        self._store(book_id, title, author)
+        self.search_index.add(book_id, title, author)
+
+    def _delete(self, book_id: str) -> None:
+        if self.compact:
+            del self.books[book_id]
+        else:
+            self.books.pop(book_id)._due_index = None
+        self.search_index.remove(book_id)
+        self.due_index.discard(book_id)
+
+    def _lend(self, book: Book, user_id: str, due_date: datetime) -> None:
+        book.is_available = False
+        book.borrower = user_id
+        book.due_date = due_date
+
+    def _release(self, book: Book) -> None:
+        book.is_available = True
+        book.borrower = None
+        book.due_date = None
+
     def add_book(self, book_id: str, title: str, author: str) -> bool:
         """Add a new book to the library."""
         if book_id in self.books:
             return False
-        self.books[book_id] = Book(book_id, title, author)
+        self._insert(book_id, title, author)
         return True
     
     def remove_book(self, book_id: str) -> bool:
         """Remove a book from the library."""
         if book_id not in self.books:
             return False
-        del self.books[book_id]
+        self._delete(book_id)
         return True
     
     def borrow_book(self, book_id: str, user_id: str) -> bool:
@@ -43,9 +661,7 @@ class LibrarySystem:
         if not book.is_available:
             return False
         
-        book.is_available = False
-        book.borrower = user_id
-        book.due_date = datetime.now() + self.loan_period
+        self._lend(book, user_id, datetime.now() + self.loan_period)
         return True
     
     def return_book(self, book_id: str) -> bool:
@@ -57,23 +673,250 @@ class LibrarySystem:
         if book.is_available:
             return False
         
-        book.is_available = True
-        book.borrower = None
-        book.due_date = None
+        self._release(book)
         return True
+
+    def add_books(self, records: Iterable[Tuple[str, str, str]]) -> List[bool]:
+        """
+        Add many books in one call.
+
+        Args:
+            records: Iterable of (book_id, title, author) tuples
+
+        Returns:
+            One flag per record, False where the id already exists (including
+            earlier in the same batch)
+
+        If reading or indexing the records fails, the books this call stored
+        are removed again before the exception propagates, so no book is left
+        in the catalog that search_books cannot find.
+        """
+        books = self.books
+        store = self._store
+        added = []
+        statuses = []
+        try:
+            for record in records:
+                book_id, title, author = record
+                if book_id in books:
+                    statuses.append(False)
+                else:
+                    store(book_id, title, author)
+                    added.append(record)
+                    statuses.append(True)
+            self.search_index.add_many(added)
+        except BaseException:
+            for book_id, _, _ in added:
+                if book_id in books:
+                    self._delete(book_id)
+            raise
+        return statuses
+
+    def borrow_books(self, requests: Iterable[Tuple[str, str]]) -> List[bool]:
+        """
+        Borrow many books in one call, all due one loan period from now.
+
+        Args:
+            requests: Iterable of (book_id, user_id) tuples
+
+        Returns:
+            One flag per request, False where the book is unknown or already out
+        """
+        due_date = datetime.now() + self.loan_period
+        books = self.books
+        lend = self._lend
+        statuses = []
+        for book_id, user_id in requests:
+            book = books.get(book_id)
+            if book is None or not book.is_available:
+                statuses.append(False)
+            else:
+                lend(book, user_id, due_date)
+                statuses.append(True)
+        return statuses
+
+    def return_books(self, book_ids: Iterable[str]) -> List[bool]:
+        """
+        Return many books in one call.
+
+        Args:
+            book_ids: Iterable of book ids
+
+        Returns:
+            One flag per id, False where the book is unknown or not borrowed
+        """
+        books = self.books
+        release = self._release
+        statuses = []
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None or book.is_available:
+                statuses.append(False)
+            else:
+                release(book)
+                statuses.append(True)
+        return statuses
+
+    def load_catalog(self, path: str, batch_size: int = 10000) -> int:
+        """
+        Stream a CSV or JSONL catalog file into the library.
+
+        Args:
+            path: File with book_id, title and author per record
+            batch_size: Number of records handed to add_books at a time
+
+        Returns:
+            Number of books added
+        """
+        added = 0
+        batch = []
+        for record in iter_catalog_records(path):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                added += sum(self.add_books(batch))
+                batch.clear()
+        if batch:
+            added += sum(self.add_books(batch))
+        return added
     
+    def _catalog_order(self, book_ids: List[str]) -> List[str]:
+        """Sort book ids into the order the books were added to the catalog."""
+        fields = self.search_index.fields
+        unknown = (-1,)
+        return sorted(book_ids, key=lambda book_id: fields.get(book_id, unknown)[0])
+
     def get_overdue_books(self) -> List[Book]:
-        """Get a list of overdue books."""
+        """Get a list of overdue books, in catalog order."""
         now = datetime.now()
-        return [
-            book for book in self.books.values()
-            if not book.is_available and book.due_date and book.due_date < now
-        ]
+        book_ids = self._catalog_order(self.due_index.due_before(now))
+        books = (self.books[book_id] for book_id in book_ids)
+        return [book for book in books if not book.is_available]
+
+    def get_next_due_books(self, count: int) -> List[Book]:
+        """Get the next `count` borrowed books coming due, soonest first."""
+        now = datetime.now()
+        books = (self.books[book_id] for book_id in self.due_index.next_due(count, now))
+        return [book for book in books if not book.is_available]
     
     def search_books(self, query: str) -> List[Book]:
         """Search for books by title or author."""
-        query = query.lower()
-        return [
-            book for book in self.books.values()
-            if query in book.title.lower() or query in book.author.lower()
-        ]
\ No newline at end of file
+        return [self.books[book_id] for book_id in self.search_index.search(query)]
+
+class ConcurrentLibrarySystem(LibrarySystem):
+    """
+    LibrarySystem that is safe to share between threads.
+
+    Loans are serialized per book through a fixed set of striped locks, so
+    borrows of different books rarely wait on each other; the due-date
+    index they share keeps its own lock. Under the GIL a loan's critical
+    section is too short for stripes to run in parallel, but they keep
+    borrows of different books apart on free-threaded builds
+    (benchmark_concurrency compares one stripe with many). Catalog changes
+    (adding and removing books) take a single catalog lock and publish to a
+    copy-on-write search index, which lets search_books run without locking
+    and see each book either fully indexed or not at all.
+    """
+
+    def __init__(self, num_stripes: int = 64):
+        super().__init__()
+        self.search_index = SearchIndex(copy_on_write=True)
+        self.due_index = SynchronizedDueDateIndex()
+        self._catalog_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(num_stripes)]
+        # Per-stripe counters, only updated while holding that stripe's lock.
+        self._acquisitions = [0] * num_stripes
+        self._contended = [0] * num_stripes
+
+    def _lock_stripe(self, book_id: str) -> threading.Lock:
+        stripe = hash(book_id) % len(self._stripes)
+        lock = self._stripes[stripe]
+        if not lock.acquire(blocking=False):
+            lock.acquire()
+            self._contended[stripe] += 1
+        self._acquisitions[stripe] += 1
+        return lock
+
+    def lock_stats(self) -> Dict[str, int]:
+        """Return how many stripe acquisitions there were and how many had to wait."""
+        return {
+            'acquisitions': sum(self._acquisitions),
+            'contended': sum(self._contended),
+        }
+
+    def add_book(self, book_id: str, title: str, author: str) -> bool:
+        with self._catalog_lock:
+            return super().add_book(book_id, title, author)
+
+    def add_books(self, records: Iterable[Tuple[str, str, str]]) -> List[bool]:
+        with self._catalog_lock:
+            return super().add_books(records)
+
+    def remove_book(self, book_id: str) -> bool:
+        with self._catalog_lock:
+            lock = self._lock_stripe(book_id)
+            try:
+                return super().remove_book(book_id)
+            finally:
+                lock.release()
+
+    def borrow_book(self, book_id: str, user_id: str) -> bool:
+        lock = self._lock_stripe(book_id)
+        try:
+            return super().borrow_book(book_id, user_id)
+        finally:
+            lock.release()
+
+    def return_book(self, book_id: str) -> bool:
+        lock = self._lock_stripe(book_id)
+        try:
+            return super().return_book(book_id)
+        finally:
+            lock.release()
+
+    def borrow_books(self, requests: Iterable[Tuple[str, str]]) -> List[bool]:
+        due_date = datetime.now() + self.loan_period
+        books = self.books
+        statuses = []
+        for book_id, user_id in requests:
+            lock = self._lock_stripe(book_id)
+            try:
+                book = books.get(book_id)
+                if book is None or not book.is_available:
+                    statuses.append(False)
+                else:
+                    self._lend(book, user_id, due_date)
+                    statuses.append(True)
+            finally:
+                lock.release()
+        return statuses
+
+    def return_books(self, book_ids: Iterable[str]) -> List[bool]:
+        books = self.books
+        statuses = []
+        for book_id in book_ids:
+            lock = self._lock_stripe(book_id)
+            try:
+                book = books.get(book_id)
+                if book is None or book.is_available:
+                    statuses.append(False)
+                else:
+                    self._release(book)
+                    statuses.append(True)
+            finally:
+                lock.release()
+        return statuses
+
+    def get_overdue_books(self) -> List[Book]:
+        now = datetime.now()
+        book_ids = self._catalog_order(self.due_index.due_before(now))
+        books = (self.books.get(book_id) for book_id in book_ids)
+        return [book for book in books if book is not None and not book.is_available]
+
+    def get_next_due_books(self, count: int) -> List[Book]:
+        now = datetime.now()
+        books = (self.books.get(book_id) for book_id in self.due_index.next_due(count, now))
+        return [book for book in books if book is not None and not book.is_available]
+
+    def search_books(self, query: str) -> List[Book]:
+        books = (self.books.get(book_id) for book_id in self.search_index.search(query))
+        return [book for book in books if book is not None]
@@ -1,20 +1,31 @@
 # experiment_runner.py
 
 import inspect
-from typing import List, Dict
+import argparse
+from typing import List, Dict, Optional, Set
 import matplotlib.pyplot as plt
 from test_prioritization import (
     TestCase, TestPrioritization,
     CoverageBasedFunction, DiversityBasedFunction, CombinedFunction,
-    extract_coverage, evaluate_prioritization
+    extract_coverage, evaluate_prioritization, apply_stored_coverage
 )
 from test_library import TestLibrarySystem
 import pickle
 
 class ExperimentRunner:
-    def __init__(self):
+    def __init__(self, coverage_sets: Optional[Dict[str, Set[str]]] = None):
+        """
+        Args:
+            coverage_sets: Measured coverage keyed by 'Class::method', e.g.
+                from CoverageSnapshot.coverage_sets(); replaces the coverage
+                extracted from the test code when given
+        """
         # Extract test cases from TestLibrarySystem
         self.test_cases = self._extract_test_cases()
+        # Prefer measured coverage when it is available
+        if coverage_sets is not None:
+            applied = apply_stored_coverage(self.test_cases, coverage_sets, TestLibrarySystem.__name__)
+            print(f"Loaded stored coverage for {applied}/{len(self.test_cases)} tests")
         # Simulate some faults that certain tests can detect
         self.faults = self._create_fault_matrix()
         
@@ -105,8 +116,25 @@ class ExperimentRunner:
             print(f"{name}: {result['metrics']['APFD']:.3f}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Run test prioritization experiments")
+    parser.add_argument("--coverage-store",
+                        help="Coverage store directory with measured per-test coverage "
+                             "(defaults to coverage extracted from the test code); needs the "
+                             "prioritization package on PYTHONPATH")
+    args = parser.parse_args()
+
+    coverage_sets = None
+    if args.coverage_store:
+        try:
+            from prioritization.coverage_store import CoverageStore
+        except ImportError:
+            parser.error("--coverage-store needs the prioritization package on PYTHONPATH")
+        snapshot = CoverageStore(args.coverage_store).open(kind="function")
+        print(f"Using stored coverage from {snapshot.path}")
+        coverage_sets = snapshot.coverage_sets()
+
     # Run experiments
-    runner = ExperimentRunner()
+    runner = ExperimentRunner(coverage_sets=coverage_sets)
     results = runner.run_experiments()
     
     # Plot and display results
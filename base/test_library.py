@@ -1,9 +1,13 @@
 # test_library.py
 
+import os
+import tempfile
+import threading
 import unittest
 from datetime import datetime, timedelta
 from unittest.mock import patch
-from library_system import LibrarySystem, Book
+from library_system import LibrarySystem, ConcurrentLibrarySystem, Book, BookView
+from library_persistence import PersistentLibrarySystem
 
 class TestLibrarySystem(unittest.TestCase):
     def setUp(self):
@@ -79,6 +83,123 @@ class TestLibrarySystem(unittest.TestCase):
         self.assertEqual(len(overdue_books), 1)
         self.assertEqual(overdue_books[0].book_id, "B1")
 
+    @patch('library_system.datetime')
+    def test_get_overdue_books_excludes_returned(self, mock_datetime):
+        """Test that returned and removed books are not reported as overdue."""
+        current_time = datetime.now()
+        mock_datetime.now.return_value = current_time
+
+        for book_id in ("B1", "B2", "B3"):
+            self.library.borrow_book(book_id, "user1")
+            self.library.books[book_id].due_date = current_time - timedelta(days=1)
+        self.library.books["B3"].due_date = current_time - timedelta(days=2)
+
+        self.library.return_book("B1")
+        self.library.remove_book("B2")
+
+        overdue_books = self.library.get_overdue_books()
+        self.assertEqual([book.book_id for book in overdue_books], ["B3"])
+
+    @patch('library_system.datetime')
+    def test_get_overdue_books_catalog_order(self, mock_datetime):
+        """Test that overdue books come back in the order they were added."""
+        current_time = datetime.now()
+        mock_datetime.now.return_value = current_time
+
+        for days, book_id in ((1, "B1"), (3, "B2"), (2, "B3")):
+            self.library.borrow_book(book_id, "user1")
+            self.library.books[book_id].due_date = current_time - timedelta(days=days)
+
+        overdue_books = self.library.get_overdue_books()
+        self.assertEqual([book.book_id for book in overdue_books], ["B1", "B2", "B3"])
+
+    @patch('library_system.datetime')
+    def test_get_next_due_books_earlier_query(self, mock_datetime):
+        """Test that a query for an earlier time than a previous one still sees every book."""
+        current_time = datetime.now()
+        mock_datetime.now.return_value = current_time
+
+        for book_id in ("B1", "B2", "B3"):
+            self.library.borrow_book(book_id, "user1")
+        self.library.books["B1"].due_date = current_time + timedelta(days=3)
+        self.library.books["B2"].due_date = current_time + timedelta(days=1)
+        self.library.books["B3"].due_date = current_time - timedelta(days=1)
+
+        mock_datetime.now.return_value = current_time + timedelta(days=2)
+        self.assertEqual([book.book_id for book in self.library.get_overdue_books()], ["B2", "B3"])
+
+        mock_datetime.now.return_value = current_time
+        next_due = self.library.get_next_due_books(5)
+        self.assertEqual([book.book_id for book in next_due], ["B2", "B1"])
+        self.assertEqual([book.book_id for book in self.library.get_overdue_books()], ["B3"])
+
+    @patch('library_system.datetime')
+    def test_get_next_due_books(self, mock_datetime):
+        """Test getting the books coming due soonest."""
+        current_time = datetime.now()
+        mock_datetime.now.return_value = current_time
+
+        for book_id in ("B1", "B2", "B3"):
+            self.library.borrow_book(book_id, "user1")
+        self.library.books["B1"].due_date = current_time + timedelta(days=3)
+        self.library.books["B2"].due_date = current_time - timedelta(days=1)
+        self.library.books["B3"].due_date = current_time + timedelta(days=1)
+
+        next_due = self.library.get_next_due_books(5)
+        self.assertEqual([book.book_id for book in next_due], ["B3", "B1"])
+
+    def test_add_books_bulk(self):
+        """Test bulk adding reports per-record status, including in-batch duplicates."""
+        statuses = self.library.add_books([
+            ("B4", "Emma", "Jane Austen"),
+            ("B1", "Duplicate", "Author"),
+            ("B4", "Emma Again", "Jane Austen"),
+        ])
+        self.assertEqual(statuses, [True, False, False])
+        self.assertEqual([b.book_id for b in self.library.search_books("austen")], ["B3", "B4"])
+
+    def test_add_books_rolls_back_on_failure(self):
+        """Test that a failing bulk add leaves neither unindexed nor partial books behind."""
+        def records():
+            yield ("B4", "Emma", "Jane Austen")
+            yield ("B5", "Persuasion", "Jane Austen")
+            raise ValueError("malformed record")
+
+        with self.assertRaises(ValueError):
+            self.library.add_books(records())
+        self.assertNotIn("B4", self.library.books)
+        self.assertNotIn("B5", self.library.books)
+        self.assertEqual([b.book_id for b in self.library.search_books("austen")], ["B3"])
+        self.assertEqual(self.library.add_books([("B4", "Emma", "Jane Austen")]), [True])
+
+    def test_borrow_and_return_books_bulk(self):
+        """Test bulk borrowing and returning share one due date and report status."""
+        statuses = self.library.borrow_books([("B1", "user1"), ("B2", "user2"), ("B1", "user3"), ("XX", "user4")])
+        self.assertEqual(statuses, [True, True, False, False])
+        self.assertEqual(self.library.books["B1"].due_date, self.library.books["B2"].due_date)
+        self.assertEqual(self.library.books["B1"].borrower, "user1")
+
+        statuses = self.library.return_books(["B1", "B3", "B1"])
+        self.assertEqual(statuses, [True, False, False])
+        self.assertTrue(self.library.books["B1"].is_available)
+        self.assertFalse(self.library.books["B2"].is_available)
+
+    def test_load_catalog(self):
+        """Test streaming catalog imports from CSV and JSONL files."""
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "catalog.csv")
+            with open(csv_path, "w") as f:
+                f.write('book_id,title,author\nB4,"Emma, Volume I",Jane Austen\nB1,Duplicate,Author\n')
+            jsonl_path = os.path.join(tmp, "catalog.jsonl")
+            with open(jsonl_path, "w") as f:
+                f.write('{"book_id": "B5", "title": "Animal Farm", "author": "George Orwell"}\n\n')
+
+            self.assertEqual(self.library.load_catalog(csv_path, batch_size=1), 1)
+            self.assertEqual(self.library.load_catalog(jsonl_path), 1)
+
+        self.assertEqual(self.library.books["B4"].title, "Emma, Volume I")
+        self.assertEqual([b.book_id for b in self.library.search_books("orwell")], ["B2", "B5"])
+
     def test_search_books_by_title(self):
         """Test searching books by title."""
         results = self.library.search_books("great")
@@ -96,5 +217,207 @@ class TestLibrarySystem(unittest.TestCase):
         results = self.library.search_books("xyz123")
         self.assertEqual(len(results), 0)
 
+    def test_search_books_substring_across_words(self):
+        """Test that search keeps substring semantics across word boundaries."""
+        results = self.library.search_books("E AND p")
+        self.assertEqual([book.book_id for book in results], ["B3"])
+
+    def test_search_books_short_query(self):
+        """Test searching with a query shorter than an index gram."""
+        results = self.library.search_books("or")
+        self.assertEqual([book.book_id for book in results], ["B2"])
+
+    def test_search_books_insertion_order(self):
+        """Test that matches are returned in the order books were added."""
+        self.library.add_book("B4", "Animal Farm", "George Orwell")
+        results = self.library.search_books("george")
+        self.assertEqual([book.book_id for book in results], ["B2", "B4"])
+
+    def test_search_books_after_remove(self):
+        """Test that removed books no longer appear in search results."""
+        self.library.remove_book("B2")
+        results = self.library.search_books("orwell")
+        self.assertEqual(len(results), 0)
+
+class TestCompactLibrarySystem(TestLibrarySystem):
+    """Run the full LibrarySystem suite against the columnar storage mode."""
+
+    def setUp(self):
+        self.library = LibrarySystem(compact=True)
+        self.library.add_book("B1", "The Great Gatsby", "F. Scott Fitzgerald")
+        self.library.add_book("B2", "1984", "George Orwell")
+        self.library.add_book("B3", "Pride and Prejudice", "Jane Austen")
+
+    def test_books_are_views(self):
+        """Test that compact mode hands out views instead of Book objects."""
+        book = self.library.books["B1"]
+        self.assertIsInstance(book, BookView)
+        self.assertEqual(str(book), "The Great Gatsby by F. Scott Fitzgerald (ID: B1)")
+
+    def test_borrow_round_trips_due_date(self):
+        """Test that due dates survive the epoch-second column."""
+        self.library.borrow_book("B2", "user1")
+        book = self.library.books["B2"]
+        self.assertEqual(book.borrower, "user1")
+        self.assertAlmostEqual(
+            (book.due_date - datetime.now()).total_seconds(),
+            self.library.loan_period.total_seconds(),
+            delta=5,
+        )
+        self.library.return_book("B2")
+        self.assertIsNone(self.library.books["B2"].due_date)
+
+    def test_removed_book_leaves_no_state(self):
+        """Test that a removed book's state does not leak into new books or stale views."""
+        self.library.borrow_book("B1", "user1")
+        stale = self.library.books["B1"]
+        self.library.remove_book("B1")
+        self.library.add_book("B4", "New Book", "New Author")
+        book = self.library.books["B4"]
+        self.assertTrue(book.is_available)
+        self.assertIsNone(book.borrower)
+        self.assertIsNone(book.due_date)
+        with self.assertRaises(KeyError):
+            stale.is_available = True
+        with self.assertRaises(KeyError):
+            stale.title
+
+    def test_compaction_reclaims_removed_books(self):
+        """Test that removing most books compacts the store and views follow their book."""
+        kept = self.library.books["B3"]
+        self.library.borrow_book("B3", "user1")
+        for i in range(200):
+            self.library.add_book(f"X{i}", f"Title {i}", "Author")
+        for i in range(200):
+            self.library.remove_book(f"X{i}")
+        store = self.library.books
+        self.assertEqual(len(store), 3)
+        self.assertLess(len(store.starts), 100)
+        self.assertEqual(list(store), ["B1", "B2", "B3"])
+        self.assertEqual(kept.title, "Pride and Prejudice")
+        self.assertEqual(kept.borrower, "user1")
+        self.assertFalse(kept.is_available)
+        self.assertEqual([book.book_id for book in self.library.search_books("Pride")], ["B3"])
+
+class TestConcurrentLibrarySystem(TestLibrarySystem):
+    """Run the full LibrarySystem suite against the thread-safe variant."""
+
+    def setUp(self):
+        self.library = ConcurrentLibrarySystem(num_stripes=4)
+        self.library.add_book("B1", "The Great Gatsby", "F. Scott Fitzgerald")
+        self.library.add_book("B2", "1984", "George Orwell")
+        self.library.add_book("B3", "Pride and Prejudice", "Jane Austen")
+
+    def test_concurrent_borrow_lends_once(self):
+        """Test that racing borrowers cannot both take the same book."""
+        successes = []
+        barrier = threading.Barrier(16)
+
+        def borrower(user_id):
+            barrier.wait()
+            successes.append(self.library.borrow_book("B1", user_id))
+
+        threads = [threading.Thread(target=borrower, args=(f"user{i}",)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(successes.count(True), 1)
+        self.assertEqual(self.library.lock_stats()['acquisitions'], 16)
+
+    def test_search_during_catalog_changes(self):
+        """Test that searches stay consistent while books are added and removed."""
+        errors = []
+        stop = threading.Event()
+
+        def searcher():
+            while not stop.is_set():
+                for book in self.library.search_books("orwell"):
+                    if "orwell" not in book.author.lower():
+                        errors.append(book.book_id)
+
+        thread = threading.Thread(target=searcher)
+        thread.start()
+        for i in range(200):
+            self.library.add_book(f"X{i}", f"Essay {i}", "George Orwell")
+            if i % 2:
+                self.library.remove_book(f"X{i}")
+        stop.set()
+        thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.library.search_books("orwell")), 101)
+
+class TestPersistentLibrarySystem(TestLibrarySystem):
+    """Run the full LibrarySystem suite with write-ahead logging enabled."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.library = PersistentLibrarySystem(self.tmp.name, fsync=False)
+        self.library.add_book("B1", "The Great Gatsby", "F. Scott Fitzgerald")
+        self.library.add_book("B2", "1984", "George Orwell")
+        self.library.add_book("B3", "Pride and Prejudice", "Jane Austen")
+
+    def tearDown(self):
+        self.library.close()
+        self.tmp.cleanup()
+
+    def reopen(self):
+        self.library.close()
+        self.library = PersistentLibrarySystem(self.tmp.name, fsync=False)
+
+    def test_recover_from_log(self):
+        """Test that state is rebuilt by replaying the log after a restart."""
+        self.library.borrow_book("B1", "user1")
+        due_date = self.library.books["B1"].due_date
+        self.library.remove_book("B3")
+        self.reopen()
+
+        self.assertEqual(sorted(self.library.books), ["B1", "B2"])
+        self.assertFalse(self.library.books["B1"].is_available)
+        self.assertEqual(self.library.books["B1"].borrower, "user1")
+        self.assertEqual(self.library.books["B1"].due_date, due_date)
+        self.assertEqual([b.book_id for b in self.library.search_books("gatsby")], ["B1"])
+
+    def test_recover_from_snapshot_and_tail(self):
+        """Test that recovery loads the snapshot and replays only later records."""
+        self.library.borrow_books([("B1", "user1"), ("B2", "user2")])
+        self.library.checkpoint()
+        self.library.return_book("B2")
+        self.library.add_book("B4", "Emma", "Jane Austen")
+        self.reopen()
+
+        self.assertFalse(self.library.books["B1"].is_available)
+        self.assertTrue(self.library.books["B2"].is_available)
+        self.assertEqual([b.book_id for b in self.library.search_books("austen")], ["B3", "B4"])
+        self.assertEqual(len(self.library.get_next_due_books(10)), 1)
+
+    def test_automatic_checkpoint_runs_in_background(self):
+        """Test that automatic checkpoints fold closed segments while logging continues."""
+        self.library.close()
+        self.library = PersistentLibrarySystem(self.tmp.name, snapshot_every=4, fsync=False)
+        self.library.borrow_book("B1", "user1")
+        self.library.add_book("B4", "Emma", "Jane Austen")
+        self.library.remove_book("B2")
+        self.library.borrow_book("B3", "user3")
+        self.library.return_book("B3")
+        self.library.wait_for_checkpoint()
+
+        segments = [name for name in os.listdir(self.tmp.name) if name.startswith("wal.")]
+        self.assertEqual(segments, [os.path.basename(self.library.wal.path)])
+        self.reopen()
+        self.assertEqual(sorted(self.library.books), ["B1", "B3", "B4"])
+        self.assertEqual(self.library.books["B1"].borrower, "user1")
+        self.assertTrue(self.library.books["B3"].is_available)
+
+    def test_torn_log_tail_is_ignored(self):
+        """Test that a partially written final record does not break recovery."""
+        self.library.sync()
+        with open(self.library.wal.path, "a") as f:
+            f.write('[99,"add","B9"')
+        self.reopen()
+        self.assertEqual(sorted(self.library.books), ["B1", "B2", "B3"])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,7 @@
 # test_prioritization.py
 
 from abc import ABC, abstractmethod
-from typing import List, Set, Dict, Tuple
+from typing import List, Set, Dict, Optional, Tuple
 import inspect
 import numpy as np
 from itertools import combinations
@@ -114,6 +114,32 @@ def extract_coverage(test_case: TestCase) -> None:
     visitor.visit(tree)
     test_case.coverage = visitor.covered
 
+def apply_stored_coverage(test_cases: List[TestCase], coverage_sets: Dict[str, Set[str]],
+                          class_name: Optional[str] = None) -> int:
+    """
+    Replace extracted coverage with coverage measured by running the tests.
+    
+    Args:
+        test_cases: Test cases to update
+        coverage_sets: Covered elements keyed by test name, e.g. from
+            CoverageSnapshot.coverage_sets() in the prioritization package:
+            'Class::method' for test methods, the bare name for functions
+        class_name: Class the test cases are methods of, so they are
+            matched as 'Class::method' (None for module-level functions)
+    
+    Returns:
+        Number of test cases that received stored coverage. The others get
+        empty coverage rather than keeping extracted names, so every test's
+        coverage is drawn from the same element universe.
+    """
+    applied = 0
+    for test_case in test_cases:
+        key = f"{class_name}::{test_case.name}" if class_name else test_case.name
+        elements = coverage_sets.get(key)
+        test_case.coverage = set(elements) if elements is not None else set()
+        applied += elements is not None
+    return applied
+
 def evaluate_prioritization(original_order: List[TestCase], 
                           prioritized_order: List[TestCase],
                           faults: Dict[str, Set[str]]) -> Dict[str, float]:
@@ -13,27 +13,50 @@ Where:
 - TFᵢ = position of the first test that reveals fault i
 - m = number of faults
 - n = number of test cases
+
+When per-test durations are known, the cost-cognizant APFDc weighs each
+test by how long it takes (and each fault by its severity fᵢ):
+
+APFDc = Σᵢ fᵢ × (Σⱼ₌TFᵢ..ₙ tⱼ - ½ t_TFᵢ) / (Σⱼ tⱼ × Σᵢ fᵢ)
+
+Where tⱼ is the duration of the test at position j.
+
+Flaky failures (tests that passed on a rerun, or tests listed as known to be
+flaky) are reported as FLAKY and never count as faults.
 """
 
+import io
 import re
 import json
+from collections import deque
 import matplotlib.pyplot as plt
 import numpy as np
-from typing import Dict, List, Tuple, Optional, Any, Set
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional, Any, Set
+
+from prioritization.nodeids import method_name, param_id
+from prioritization.parallel_executor import sequence_results
+from prioritization.result_events import iter_result_events
 
 class APFDCalculator:
     """
     A class for calculating APFD and related metrics from test execution results.
     """
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, fault_severity: Optional[Dict[str, float]] = None,
+                 flaky_tests: Optional[Iterable[str]] = None):
         """
         Initialize the APFD calculator.
         
         Args:
             logger: Optional logger for tracking execution
+            fault_severity: Optional severity per fault name for APFDc
+                (faults not listed have severity 1)
+            flaky_tests: Optional names of tests known to be flaky; their
+                failures are not counted as faults
         """
         self.logger = logger
+        self.fault_severity = fault_severity or {}
+        self.flaky_tests = {method_name(name) for name in flaky_tests or ()}
         self.fault_mapping = {
             "negative_gcd": ["test_gcd"],
             "negative_exponent": ["test_power"],
@@ -45,6 +68,13 @@ class APFDCalculator:
             "subtraction_negative": ["test_subtract"]
         }
     
+    # A verbose result line, e.g. 'tests/test_calculator.py::TestCalculator::test_add[v1] PASSED  [ 8%]'
+    RESULT_LINE = re.compile(r"^(\S+\.py::\S+) (PASSED|FAILED|ERROR|FLAKY)\b")
+    # A failure section header, e.g. '_____ TestCalculator.test_gcd[v1] _____'
+    SECTION_HEADER = re.compile(r"^_{3,} (?:ERROR at \w+ of )?(\S+) _{3,}$")
+    # Any '=====' banner ends a failure section
+    BANNER = re.compile(r"^={3,}")
+    
     def parse_test_output(self, output_text: str) -> List[Dict[str, Any]]:
         """
         Parse pytest output text and extract test results in execution order.
@@ -52,50 +82,149 @@ class APFDCalculator:
         Args:
             output_text: Raw text output from pytest
             
+        Returns:
+            List of test result dictionaries with test name, status, and fault info
+        """
+        return self.parse_test_stream(io.StringIO(output_text))
+    
+    def parse_test_stream(self, stream: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Parse pytest output from a file handle (or any iterable of lines).
+        
+        Args:
+            stream: Lines of verbose pytest output
+            
         Returns:
             List of test result dictionaries with test name, status, and fault info
         """
         if self.logger:
             self.logger.info("Parsing test output...")
             
-        test_pattern = r"tests/test_calculator\.py::TestCalculator::(\w+)\[v1\] (PASSED|FAILED)"
+        test_results = list(self.iter_test_output(stream))
         
-        test_matches = re.finditer(test_pattern, output_text)
-        test_results = []
+        if self.logger:
+            self.logger.info(f"Parsed {len(test_results)} test results")
+            
+        return test_results
+    
+    def iter_test_output(self, stream: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Stream test results out of verbose pytest output in a single pass.
         
-        for match in test_matches:
-            test_name = match.group(1)
-            status = match.group(2)
+        Each line is looked at once. Passing tests are yielded as soon as
+        their result line is read; a failing test is held back until its
+        section under FAILURES has been read (or the output ends), so its
+        result carries the failure text. Results are always yielded in
+        execution order.
+        
+        Args:
+            stream: Lines of verbose pytest output
             
-            # Find the test section in the output
-            test_section_match = re.search(
-                rf"{re.escape(match.group(0))}.*?(===+|$)", 
-                output_text[match.start():], 
-                re.DOTALL
-            )
+        Yields:
+            Test result dictionaries with test name, status, output and fault info
+        """
+        pending = deque()          # results not yet yielded, in execution order
+        waiting = {}               # (test name, param) -> failed result awaiting its section
+        section = None             # result whose failure section is being read
+        section_lines: List[str] = []
+        
+        def close_section():
+            if section is not None:
+                section["output"] += "".join(section_lines)
+                section_lines.clear()
+        
+        def ready():
+            # Yieldable once passed, or failed with its section already read
+            while pending and pending[0]["_complete"]:
+                result = pending.popleft()
+                del result["_complete"]
+                self._classify(result)
+                yield result
+        
+        for line in stream:
+            match = self.RESULT_LINE.match(line)
+            if match:
+                close_section()
+                section = None
+                nodeid, status = match.groups()
+                if param_id(nodeid) not in (None, "v1"):
+                    continue
+                result = {
+                    "test_name": method_name(nodeid),
+                    "status": status,
+                    "output": line,
+                    "duration": None,
+                    "detected_fault": None,
+                    "_complete": status in ("PASSED", "FLAKY"),
+                }
+                pending.append(result)
+                if not result["_complete"]:
+                    waiting[(result["test_name"], param_id(nodeid))] = result
+                yield from ready()
+                continue
             
-            test_output = ""
-            if test_section_match:
-                test_output = test_section_match.group(0)
+            match = self.SECTION_HEADER.match(line)
+            if match:
+                close_section()
+                base, bracket, params = match.group(1).partition("[")
+                name = base.replace(".", "::") + bracket + params
+                section = waiting.pop((method_name(name), param_id(name)), None)
+                if section is not None:
+                    section["_complete"] = True
+                    section_lines.append(line)
+                continue
+            
+            if section is not None:
+                if self.BANNER.match(line):
+                    close_section()
+                    section = None
+                    yield from ready()
+                else:
+                    section_lines.append(line)
+        
+        close_section()
+        # Failures whose sections never appeared (e.g. --tb=no) keep just their result line
+        for result in pending:
+            result["_complete"] = True
+        yield from ready()
+    
+    def parse_outcomes(self, outcomes: List[Dict[str, Any]], sequence: str = "priority") -> List[Dict[str, Any]]:
+        """
+        Convert results produced by the test runners into test result dictionaries.
+        
+        Args:
+            outcomes: Result dictionaries from runner.run_tests or ParallelExecutor.run
+            sequence: 'priority' to score tests in their planned order, or
+                'completion' to score them in the order they finished
             
+        Returns:
+            List of test result dictionaries with test name, status, and fault info
+        """
+        test_results = []
+        for outcome in sequence_results(outcomes, sequence):
+            test_name = method_name(outcome["nodeid"])
             result = {
                 "test_name": test_name,
-                "status": status,
-                "output": test_output,
+                # A test that only passed on a rerun is flaky, not a fault
+                "status": "FLAKY" if outcome.get("flaky") else outcome["status"],
+                "output": outcome.get("output", ""),
+                "duration": outcome.get("duration"),
                 "detected_fault": None
             }
-            
-            # If test failed, determine which fault it detected
-            if status == "FAILED":
-                result["detected_fault"] = self._identify_fault(test_name, test_output)
-                
+            self._classify(result)
             test_results.append(result)
             
-        if self.logger:
-            self.logger.info(f"Parsed {len(test_results)} test results")
-            
         return test_results
     
+    def _classify(self, result: Dict[str, Any]) -> None:
+        """Attribute a failed result to a fault, or mark it FLAKY if the test is known to be flaky."""
+        if result["status"] != "FAILED":
+            return
+        if result["test_name"] in self.flaky_tests:
+            result["status"] = "FLAKY"
+        else:
+            result["detected_fault"] = self._identify_fault(result["test_name"], result["output"])
+    
     def _identify_fault(self, test_name: str, test_output: str) -> str:
         """
         Identify the specific fault detected by a failed test.
@@ -168,7 +297,8 @@ class APFDCalculator:
                 "detected_faults": [],
                 "avg_position": 0,
                 "tests_needed_percentage": 0,
-                "error_detection": []
+                "error_detection": [],
+                **self._time_metrics(test_results, {})
             }
         
         # Calculate APFD using the formula
@@ -206,22 +336,72 @@ class APFDCalculator:
             "detected_faults": list(detected_faults),
             "avg_position": avg_position,
             "tests_needed_percentage": tests_needed_percentage,
-            "error_detection": error_detection
+            "error_detection": error_detection,
+            **self._time_metrics(test_results, fault_detection_positions)
         }
         
         if self.logger:
             self.logger.info(f"APFD score: {apfd:.4f}")
+            if metrics["apfdc"] is not None:
+                self.logger.info(f"APFDc score: {metrics['apfdc']:.4f}")
             self.logger.info(f"Average fault detection position: {avg_position:.2f}")
             self.logger.info(f"Percentage of tests needed to find all faults: {tests_needed_percentage:.2f}%")
             
         return metrics
     
+    def _time_metrics(self, test_results: List[Dict[str, Any]],
+                      fault_detection_positions: Dict[str, int]) -> Dict[str, Any]:
+        """
+        Calculate the duration-based metrics.
+        
+        Args:
+            test_results: List of test result dictionaries in execution order
+            fault_detection_positions: Position (1-based) at which each fault was first detected
+            
+        Returns:
+            Dictionary with apfdc, total_duration, time_to_first_failure and
+            time_to_all_faults (all None when durations were not recorded)
+        """
+        durations = [test.get("duration") for test in test_results]
+        if not durations or any(duration is None for duration in durations):
+            return {"apfdc": None, "total_duration": None,
+                    "time_to_first_failure": None, "time_to_all_faults": None}
+        
+        # cumulative[i] is the time spent once the test at position i has finished
+        cumulative = [0.0]
+        for duration in durations:
+            cumulative.append(cumulative[-1] + duration)
+        total_duration = cumulative[-1]
+        
+        first_failure = next((i for i, test in enumerate(test_results, 1) if test["status"] == "FAILED"), None)
+        time_to_first_failure = cumulative[first_failure] if first_failure else None
+        time_to_all_faults = (cumulative[max(fault_detection_positions.values())]
+                              if fault_detection_positions else None)
+        
+        apfdc = 0.0 if fault_detection_positions else None
+        total_severity = sum(self.fault_severity.get(fault, 1.0) for fault in fault_detection_positions)
+        if fault_detection_positions and total_duration > 0 and total_severity > 0:
+            weighted = 0.0
+            for fault, position in fault_detection_positions.items():
+                # Time from the detecting test to the end, counting half of the detecting test
+                remaining = total_duration - cumulative[position - 1] - durations[position - 1] / 2
+                weighted += self.fault_severity.get(fault, 1.0) * remaining
+            apfdc = weighted / (total_duration * total_severity)
+        
+        return {
+            "apfdc": apfdc,
+            "total_duration": total_duration,
+            "time_to_first_failure": time_to_first_failure,
+            "time_to_all_faults": time_to_all_faults,
+        }
+    
     def process_test_output_file(self, file_path: str) -> Dict[str, Any]:
         """
         Process a test output file to calculate APFD metrics.
         
         Args:
-            file_path: Path to test output file
+            file_path: Path to test output file, either pytest console output
+                or a '.jsonl' result events file (see prioritization.result_events)
             
         Returns:
             Dictionary with APFD metrics
@@ -229,16 +409,19 @@ class APFDCalculator:
         if self.logger:
             self.logger.info(f"Processing test output file: {file_path}")
             
+        if file_path.endswith(".jsonl"):
+            return self.process_result_events(file_path)
+            
         try:
-            with open(file_path, 'r') as f:
-                output_text = f.read()
-                
-            test_results = self.parse_test_output(output_text)
+            # Stream the log line by line rather than reading it all into memory
+            with open(file_path, 'r', errors='replace') as f:
+                test_results = self.parse_test_stream(f)
             metrics = self.calculate_apfd(test_results)
             
             # Add test execution order and results to the metrics
             metrics["test_execution"] = [
-                {"position": i, "test_name": test["test_name"], "status": test["status"]}
+                {"position": i, "test_name": test["test_name"], "status": test["status"],
+                 "duration": test.get("duration")}
                 for i, test in enumerate(test_results, 1)
             ]
             
@@ -249,6 +432,40 @@ class APFDCalculator:
                 self.logger.error(f"Error processing test output file: {str(e)}")
             raise
     
+    def process_outcomes(self, outcomes: List[Dict[str, Any]], sequence: str = "priority") -> Dict[str, Any]:
+        """
+        Calculate APFD metrics directly from test runner results.
+        
+        Args:
+            outcomes: Result dictionaries from runner.run_tests or ParallelExecutor.run
+            sequence: 'priority' or 'completion' (see parse_outcomes)
+            
+        Returns:
+            Dictionary with APFD metrics
+        """
+        test_results = self.parse_outcomes(outcomes, sequence)
+        metrics = self.calculate_apfd(test_results)
+        metrics["test_execution"] = [
+            {"position": i, "test_name": test["test_name"], "status": test["status"],
+             "duration": test.get("duration")}
+            for i, test in enumerate(test_results, 1)
+        ]
+        return metrics
+    
+    def process_result_events(self, file_path: str, sequence: str = "priority") -> Dict[str, Any]:
+        """
+        Calculate APFD metrics from a result events file.
+        
+        Args:
+            file_path: JSONL file written by the result_events pytest plugin
+            sequence: 'priority' or 'completion' (see parse_outcomes)
+            
+        Returns:
+            Dictionary with APFD metrics
+        """
+        # Events carry the same keys as runner results
+        return self.process_outcomes(list(iter_result_events(file_path)), sequence)
+    
     def plot_fault_detection(self, metrics: Dict[str, Any], method_name: str = "", 
                            output_path: Optional[str] = None, display: bool = True) -> None:
         """
@@ -357,6 +574,22 @@ class APFDCalculator:
             f"- **Total Faults**: {metrics['total_faults']}",
             f"- **Average Position of Fault Detection**: {metrics['avg_position']:.2f}",
             f"- **Percentage of Tests Needed to Find All Faults**: {metrics['tests_needed_percentage']:.2f}%",
+        ]
+        
+        if metrics.get("apfdc") is not None:
+            report.append(f"- **APFDc Score (cost-cognizant)**: {metrics['apfdc']:.4f}")
+        if metrics.get("total_duration") is not None:
+            report.append(f"- **Total Duration**: {metrics['total_duration']:.3f}s")
+        if metrics.get("time_to_first_failure") is not None:
+            report.append(f"- **Time to First Failure**: {metrics['time_to_first_failure']:.3f}s")
+        if metrics.get("time_to_all_faults") is not None:
+            report.append(f"- **Time to Detect All Faults**: {metrics['time_to_all_faults']:.3f}s")
+        
+        if metrics.get("stop_reason"):
+            report.append(f"- **Stopped Early**: {metrics['stop_reason']} "
+                          f"({len(metrics.get('skipped_tests', []))} tests not run)")
+        
+        report += [
             "",
             f"## Fault Detection Positions",
             ""
@@ -381,12 +614,20 @@ class APFDCalculator:
         report.append("")
         report.append("## Test Execution Order")
         report.append("")
-        report.append("| # | Test Name | Status |")
-        report.append("|---|-----------|--------|")
+        timed = metrics.get("total_duration") is not None
+        if timed:
+            report.append("| # | Test Name | Status | Duration (s) |")
+            report.append("|---|-----------|--------|--------------|")
+        else:
+            report.append("| # | Test Name | Status |")
+            report.append("|---|-----------|--------|")
         
         for test in metrics["test_execution"]:
-            status_emoji = "✅" if test["status"] == "PASSED" else "❌"
-            report.append(f"| {test['position']} | {test['test_name']} | {status_emoji} {test['status']} |")
+            status_emoji = {"PASSED": "✅", "FLAKY": "⚠️"}.get(test["status"], "❌")
+            row = f"| {test['position']} | {test['test_name']} | {status_emoji} {test['status']} |"
+            if timed:
+                row += f" {test['duration']:.3f} |"
+            report.append(row)
         
         report_text = "\n".join(report)
         
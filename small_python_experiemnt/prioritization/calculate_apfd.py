@@ -3,17 +3,19 @@
 Command-line script for calculating APFD metrics from test output files.
 
 Usage:
-    python -m prioritization.calculate_apfd <test_output_file> [--method <method_name>] [--output <output_dir>] [--plot]
+    python -m prioritization.calculate_apfd <test_output_file> [--method <method_name>] [--output <output_dir>] [--plot] [--severity <severity_file>]
 
 Arguments:
-    test_output_file         Path to the test output file to analyze
+    test_output_file         Path to the test output file (or result events .jsonl) to analyze
     --method                 Name of the prioritization method used
     --output                 Directory to save the results to
     --plot                   Generate and save detection curve plots
+    --severity               JSON file mapping fault names to severities for APFDc
 """
 
 import os
 import sys
+import json
 import argparse
 from prioritization.apfd_calculator import APFDCalculator
 from prioritization.logging_utils import setup_logger
@@ -24,6 +26,7 @@ def main():
     parser.add_argument("--method", default="unknown", help="Name of the prioritization method used")
     parser.add_argument("--output", default=".", help="Directory to save the results to")
     parser.add_argument("--plot", action="store_true", help="Generate and save detection curve plots")
+    parser.add_argument("--severity", help="JSON file mapping fault names to severities for APFDc")
     
     args = parser.parse_args()
     
@@ -34,7 +37,11 @@ def main():
     os.makedirs(args.output, exist_ok=True)
     
     # Process the test output file
-    calculator = APFDCalculator(logger)
+    fault_severity = None
+    if args.severity:
+        with open(args.severity, 'r') as f:
+            fault_severity = json.load(f)
+    calculator = APFDCalculator(logger, fault_severity)
     metrics = calculator.process_test_output_file(args.test_output_file)
     
     # Generate summary report
@@ -49,10 +56,16 @@ def main():
     # Print summary to console
     print(f"\nAPFD Metrics for {args.method}:")
     print(f"  APFD Score: {metrics['apfd']:.4f}")
+    if metrics['apfdc'] is not None:
+        print(f"  APFDc Score: {metrics['apfdc']:.4f}")
     print(f"  Total Tests: {metrics['total_tests']}")
     print(f"  Total Faults: {metrics['total_faults']}")
     print(f"  Average Fault Detection Position: {metrics['avg_position']:.2f}")
     print(f"  Percentage of Tests Needed to Find All Faults: {metrics['tests_needed_percentage']:.2f}%")
+    if metrics['time_to_first_failure'] is not None:
+        print(f"  Time to First Failure: {metrics['time_to_first_failure']:.3f}s")
+    if metrics['time_to_all_faults'] is not None:
+        print(f"  Time to Detect All Faults: {metrics['time_to_all_faults']:.3f}s")
     print(f"\nDetailed results saved to {summary_file}")
     
     if args.plot:
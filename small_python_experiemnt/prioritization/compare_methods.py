@@ -10,43 +10,91 @@ This script:
 
 Usage:
     python -m prioritization.compare_methods [--methods METHOD1,METHOD2,...] [--output DIR] [--no-execute]
+                                             [--workers N | --fork] [--sequence priority|completion]
+                                             [--reruns N [--rerun-budget SECONDS]]
+                                             [--fail-fast | --max-failures K] [--time-budget SECONDS]
+                                             [--min-failure-probability P --failure-history FILE]
 """
 
 import os
 import sys
 import time
 import argparse
-import subprocess
 import tempfile
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from prioritization.order import prioritize_tests
+from prioritization.runner import run_tests
+from prioritization.parallel_executor import ParallelExecutor
+from prioritization.stopping import StoppingPolicy, build_stopping_policy
+from prioritization.result_events import ResultEventWriter
 from prioritization.apfd_calculator import APFDCalculator
 from prioritization.logging_utils import setup_logger
 
-def run_tests_in_order(tests: List[Dict[str, Any]], output_file: str) -> None:
+def run_tests_in_order(tests: List[Dict[str, Any]], output_file: str, workers: int = 1,
+                       stop_policy: Optional[StoppingPolicy] = None,
+                       events_file: Optional[str] = None, fork: bool = False,
+                       reruns: int = 0, rerun_budget: Optional[float] = None) -> List[Dict[str, Any]]:
     """
     Run tests in the specified order and save the output to a file.
     
     Args:
         tests: List of test dictionaries in prioritized order
-        output_file: File to save the test output to
+        output_file: File to save the (quiet) test console output to
+        workers: Number of worker processes; more than one runs tests in
+            parallel, still dispatched in priority order
+        stop_policy: Policy that may end the run early; afterwards its
+            reason and skipped attributes describe what was not run
+        events_file: Optional JSONL file to write one result event per test to
+        fork: Run each test in its own forked child (serial runs only)
+        reruns: Rerun failing tests up to this many times; tests that then
+            pass are flaky and not counted as faults
+        rerun_budget: Maximum seconds spent on reruns (per worker when parallel)
+        
+    Returns:
+        List of runner result dictionaries (see prioritization.runner)
     """
-    with open(output_file, 'w') as f:
-        for test in tests:
-            test_name = test['full_name']
-            command = f"pytest tests/test_v1.py::{test_name} -v"
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            
-            # Write the output to the file
-            f.write(result.stdout)
-            if result.stderr:
-                f.write(result.stderr)
-            
-            # Ensure output is flushed in case of interruption
+    node_ids = [f"tests/test_v1.py::{test['full_name']}" for test in tests]
+    
+    if workers <= 1:
+        plugins = [ResultEventWriter(events_file)] if events_file else []
+        with open(output_file, 'w') as f:
+            # One pytest session for the whole order; flush after every test in
+            # case of interruption
+            return run_tests(node_ids, callback=lambda result: f.flush(), output=f,
+                             plugins=plugins, verbose=False, stop_policy=stop_policy, fork=fork,
+                             reruns=reruns, rerun_budget=rerun_budget)
+    
+    extra_args = []
+    if reruns:
+        # Each worker reruns its own failures while it is still warm
+        extra_args = ["-p", "prioritization.flakiness", f"--flaky-reruns={reruns}"]
+        if rerun_budget is not None:
+            extra_args.append(f"--flaky-rerun-budget={rerun_budget}")
+    events = ResultEventWriter(events_file) if events_file else None
+    with open(output_file, 'w') as f, ParallelExecutor(["tests/test_v1.py"], num_workers=workers,
+                                                       extra_args=extra_args) as executor:
+        def write_result(result):
+            status = "FLAKY" if result['flaky'] else result['status']
+            f.write(f"{result['nodeid']} {status} "
+                    f"(rank {result['rank']}, worker {result['worker']}, {result['completed_at']:.3f}s)\n")
+            if result['output']:
+                f.write(result['output'] + "\n")
             f.flush()
+            if events:
+                events.write({key: value for key, value in result.items() if value != ""})
+        
+        outcomes = executor.run(node_ids, callback=write_result, stop_policy=stop_policy)
+        if stop_policy is not None and stop_policy.reason:
+            f.write(f"Stopped early: {stop_policy.reason}; {len(stop_policy.skipped)} test(s) not run\n")
+    if events:
+        events.close()
+    return outcomes
 
-def compare_methods(methods: List[str], output_dir: str, execute_tests: bool) -> None:
+def compare_methods(methods: List[str], output_dir: str, execute_tests: bool,
+                    workers: int = 1, sequence: str = "priority",
+                    stop_policy: Optional[StoppingPolicy] = None, fork: bool = False,
+                    reruns: int = 0, rerun_budget: Optional[float] = None) -> None:
     """
     Compare different test prioritization methods.
     
@@ -54,6 +102,12 @@ def compare_methods(methods: List[str], output_dir: str, execute_tests: bool) ->
         methods: List of method names to compare
         output_dir: Directory to save the results to
         execute_tests: Whether to execute tests or use existing output files
+        workers: Number of worker processes used to execute tests
+        sequence: Score executed tests in 'priority' order or in 'completion' order
+        stop_policy: Policy that may end each method's run early
+        fork: Run each test in its own child forked from a collected session
+        reruns: Rerun failing tests up to this many times to detect flaky tests
+        rerun_budget: Maximum seconds spent on reruns
     """
     logger = setup_logger("compare_methods")
     logger.info(f"Comparing methods: {', '.join(methods)}")
@@ -72,21 +126,36 @@ def compare_methods(methods: List[str], output_dir: str, execute_tests: bool) ->
         # Get prioritized tests
         tests = prioritize_tests(method=method, logger=logger)
         
+        calculator = APFDCalculator(logger)
+        
+        output_file = os.path.join(method_output_dir, f"{method}_test_output.txt")
+        events_file = os.path.join(method_output_dir, f"{method}_events.jsonl")
+        
         # Execute tests if requested
         if execute_tests:
-            output_file = os.path.join(method_output_dir, f"{method}_test_output.txt")
-            logger.info(f"Running tests in prioritized order, saving output to {output_file}")
-            run_tests_in_order(tests, output_file)
+            logger.info(f"Running tests in prioritized order with {workers} worker(s), "
+                        f"saving results to {events_file}")
+            outcomes = run_tests_in_order(tests, output_file, workers, stop_policy, events_file, fork,
+                                          reruns, rerun_budget)
+            
+            # Calculate APFD metrics from the runner results
+            metrics = calculator.process_outcomes(outcomes, sequence)
+            if stop_policy is not None and stop_policy.reason:
+                logger.info(f"Stopped early: {stop_policy.reason}; "
+                            f"{len(stop_policy.skipped)} test(s) not run: {', '.join(stop_policy.skipped)}")
+                metrics["stop_reason"] = stop_policy.reason
+                metrics["skipped_tests"] = list(stop_policy.skipped)
+        elif os.path.exists(events_file):
+            # Use the result events from a previous run
+            metrics = calculator.process_result_events(events_file, sequence)
         else:
-            # Use existing output file
-            output_file = os.path.join(method_output_dir, f"{method}_test_output.txt")
+            # Fall back to verbose console output from older runs
             if not os.path.exists(output_file):
                 logger.warning(f"Output file {output_file} does not exist, skipping {method}")
                 continue
                 
-        # Calculate APFD metrics
-        calculator = APFDCalculator(logger)
-        metrics = calculator.process_test_output_file(output_file)
+            # Calculate APFD metrics
+            metrics = calculator.process_test_output_file(output_file)
         
         # Save summary report
         summary_file = os.path.join(method_output_dir, f"{method}_apfd_summary.md")
@@ -100,6 +169,8 @@ def compare_methods(methods: List[str], output_dir: str, execute_tests: bool) ->
         method_metrics[method] = metrics
         
         logger.info(f"APFD for {method}: {metrics['apfd']:.4f}")
+        if metrics.get("apfdc") is not None:
+            logger.info(f"APFDc for {method}: {metrics['apfdc']:.4f}")
         
     # Compare methods
     if len(method_metrics) > 1:
@@ -115,14 +186,23 @@ def compare_methods(methods: List[str], output_dir: str, execute_tests: bool) ->
         with open(comparison_file, 'w') as f:
             f.write("# Test Prioritization Method Comparison\n\n")
             f.write("## APFD Scores\n\n")
-            f.write("| Method | APFD | Total Faults | Avg. Detection Position |\n")
-            f.write("|--------|------|--------------|-------------------------|\n")
+            f.write("| Method | APFD | APFDc | Total Faults | Avg. Detection Position | "
+                    "Time to First Failure | Time to All Faults |\n")
+            f.write("|--------|------|-------|--------------|-------------------------|"
+                    "-----------------------|--------------------|\n")
             
             # Sort methods by APFD score
             sorted_methods = sorted(method_metrics.items(), key=lambda x: x[1]['apfd'], reverse=True)
             
+            def fmt(value, spec):
+                # Duration-based metrics are None when no durations were recorded
+                return "n/a" if value is None else format(value, spec)
+            
             for method, metrics in sorted_methods:
-                f.write(f"| {method} | {metrics['apfd']:.4f} | {metrics['total_faults']} | {metrics['avg_position']:.2f} |\n")
+                f.write(f"| {method} | {metrics['apfd']:.4f} | {fmt(metrics.get('apfdc'), '.4f')} | "
+                        f"{metrics['total_faults']} | {metrics['avg_position']:.2f} | "
+                        f"{fmt(metrics.get('time_to_first_failure'), '.3f')}s | "
+                        f"{fmt(metrics.get('time_to_all_faults'), '.3f')}s |\n")
             
             f.write("\n## Fault Detection Analysis\n\n")
             f.write("| Fault | Best Method | Position | Worst Method | Position |\n")
@@ -159,11 +239,40 @@ def main():
                         help="Directory to save the results to")
     parser.add_argument("--no-execute", action="store_true",
                         help="Don't execute tests, use existing output files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes used to execute tests")
+    parser.add_argument("--fork", action="store_true",
+                        help="Run each test in a child forked from one collected session (serial runs)")
+    parser.add_argument("--reruns", type=int, default=0,
+                        help="Rerun failing tests up to N times; tests that then pass are flaky, not faults")
+    parser.add_argument("--rerun-budget", type=float,
+                        help="Maximum seconds spent on reruns (per worker with --workers)")
+    parser.add_argument("--sequence", choices=["priority", "completion"], default="priority",
+                        help="Score tests in priority order or in the order they completed")
+    
+    parser.add_argument("--fail-fast", action="store_true",
+                        help="Stop each run at the first failing test")
+    parser.add_argument("--max-failures", type=int,
+                        help="Stop each run after this many distinct failing tests")
+    parser.add_argument("--time-budget", type=float,
+                        help="Stop each run after this many seconds")
+    parser.add_argument("--min-failure-probability", type=float,
+                        help="Stop once no remaining test has at least this historical failure probability")
+    parser.add_argument("--failure-history", default="test_results.json",
+                        help="Failure history used by --min-failure-probability")
     
     args = parser.parse_args()
     
+    stop_policy = build_stopping_policy(
+        max_failures=1 if args.fail_fast else args.max_failures,
+        time_budget=args.time_budget,
+        min_failure_probability=args.min_failure_probability,
+        failure_history=args.failure_history,
+    )
+    
     methods = args.methods.split(',')
-    compare_methods(methods, args.output, not args.no_execute)
+    compare_methods(methods, args.output, not args.no_execute, args.workers, args.sequence, stop_policy,
+                    args.fork, args.reruns, args.rerun_budget)
     
     return 0
 
@@ -0,0 +1,263 @@
+"""
+Per-test coverage from a single coverage run.
+
+The whole suite runs once in one pytest session under ``coverage``. A small
+plugin switches coverage's dynamic context to the node ID of each test as it
+starts, so every covered line is attributed to the tests that executed it.
+The result is exported as a sparse test x line matrix and a test x function
+matrix (lines are mapped to the innermost enclosing function with ``ast``).
+
+The exported JSON looks like:
+
+    {
+        "source_dir": "v1",
+        "tests": ["tests/test_v1.py::TestCalculator::test_add", ...],
+        "lines": ["v1/calculator.py:12", ...],
+        "functions": ["v1/calculator.py::Calculator.add", ...],
+        "line_rows": [[0, 1, 5], ...],      # element indices covered by each test
+        "function_rows": [[0], ...]
+    }
+
+Usage:
+    python -m prioritization.coverage_matrix tests/test_v1.py --source-dir v1 --output coverage_matrix.json
+    python -m prioritization.coverage_matrix tests/test_v1.py --store coverage_store
+"""
+
+import io
+import os
+import ast
+import sys
+import json
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import pytest
+
+from prioritization.git_utils import current_commit
+from prioritization.nodeids import full_name
+from prioritization.runner import run_tests
+
+
+class CoverageContextPlugin:
+    """Pytest plugin that attributes coverage to the running test's node ID."""
+
+    def __init__(self, cov):
+        self.cov = cov
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        # Setup, call and teardown all count towards the test
+        self.cov.switch_context(item.nodeid)
+        try:
+            return (yield)
+        finally:
+            self.cov.switch_context("")
+
+
+def function_spans(file_path: str) -> Dict[int, str]:
+    """
+    Map each line of a Python file to the innermost function containing it.
+
+    Args:
+        file_path: Path to a Python source file
+
+    Returns:
+        Dictionary mapping line numbers to qualified function names
+        (e.g. 'Calculator.divide'); lines outside any function are absent
+    """
+    with open(file_path, 'r') as f:
+        tree = ast.parse(f.read())
+
+    spans = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = f"{prefix}{child.name}"
+                spans.append((child.lineno, child.end_lineno, name))
+                visit(child, f"{name}.")
+            elif isinstance(child, ast.ClassDef):
+                visit(child, f"{prefix}{child.name}.")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+
+    # Outer functions first, so nested ones overwrite their lines
+    line_to_function = {}
+    for start, end, name in sorted(spans):
+        for line in range(start, end + 1):
+            line_to_function[line] = name
+    return line_to_function
+
+
+class CoverageMatrix:
+    """
+    Sparse test x element coverage, one sorted list of element indices per test.
+
+    Tests are identified by pytest node ID; ``line_rows[i]`` and
+    ``function_rows[i]`` hold the indices into ``lines`` and ``functions``
+    covered by ``tests[i]``.
+    """
+
+    def __init__(self, tests: List[str], lines: List[str], functions: List[str],
+                 line_rows: List[List[int]], function_rows: List[List[int]], source_dir: str = ""):
+        self.tests = tests
+        self.lines = lines
+        self.functions = functions
+        self.line_rows = line_rows
+        self.function_rows = function_rows
+        self.source_dir = source_dir
+
+    @classmethod
+    def from_coverage_data(cls, data, source_dir: str) -> "CoverageMatrix":
+        """
+        Build the matrix from a coverage.CoverageData with per-test contexts.
+
+        Args:
+            data: CoverageData whose contexts are test node IDs
+            source_dir: Directory the measured source files live in
+
+        Returns:
+            CoverageMatrix
+        """
+        line_ids: Dict[str, int] = {}
+        function_ids: Dict[str, int] = {}
+        test_ids: Dict[str, int] = {}
+        line_rows: List[Set[int]] = []
+        function_rows: List[Set[int]] = []
+
+        def intern(table, name):
+            if name not in table:
+                table[name] = len(table)
+            return table[name]
+
+        for file_path in sorted(data.measured_files()):
+            rel_path = os.path.relpath(file_path)
+            functions = function_spans(file_path)
+            for lineno, contexts in sorted(data.contexts_by_lineno(file_path).items()):
+                line_id = intern(line_ids, f"{rel_path}:{lineno}")
+                function = functions.get(lineno)
+                function_id = intern(function_ids, f"{rel_path}::{function}") if function else None
+                for context in contexts:
+                    if not context:
+                        # Lines run at import time, outside any test
+                        continue
+                    test_id = intern(test_ids, context)
+                    if test_id == len(line_rows):
+                        line_rows.append(set())
+                        function_rows.append(set())
+                    line_rows[test_id].add(line_id)
+                    if function_id is not None:
+                        function_rows[test_id].add(function_id)
+
+        return cls(
+            tests=list(test_ids),
+            lines=list(line_ids),
+            functions=list(function_ids),
+            line_rows=[sorted(row) for row in line_rows],
+            function_rows=[sorted(row) for row in function_rows],
+            source_dir=source_dir,
+        )
+
+    def covered(self, kind: str = "function") -> Dict[str, Set[str]]:
+        """
+        Return the elements each test covers.
+
+        Args:
+            kind: 'function' or 'line'
+
+        Returns:
+            Dictionary mapping test node IDs to sets of element names
+        """
+        names, rows = (self.functions, self.function_rows) if kind == "function" else (self.lines, self.line_rows)
+        return {test: {names[i] for i in row} for test, row in zip(self.tests, rows)}
+
+    def covered_by_name(self, kind: str = "function") -> Dict[str, Set[str]]:
+        """
+        Like covered, keyed by the 'Class::method' full_name the prioritizers
+        use; parametrized instances of a test are merged.
+        """
+        by_name: Dict[str, Set[str]] = {}
+        for test, elements in self.covered(kind).items():
+            by_name.setdefault(full_name(test), set()).update(elements)
+        return by_name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source_dir": self.source_dir,
+            "tests": self.tests,
+            "lines": self.lines,
+            "functions": self.functions,
+            "line_rows": self.line_rows,
+            "function_rows": self.function_rows,
+        }
+
+    def save(self, path: str) -> None:
+        """Write the matrix as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> "CoverageMatrix":
+        """Read a matrix written by save."""
+        with open(path, 'r') as f:
+            return cls(**json.load(f))
+
+
+def collect_coverage_matrix(node_ids: Iterable[str], source_dir: str = "v1",
+                            extra_args: Optional[List[str]] = None, logger=None) -> CoverageMatrix:
+    """
+    Run tests once under coverage with one dynamic context per test.
+
+    Args:
+        node_ids: Test files or node IDs to run
+        source_dir: Directory containing the source code to measure
+        extra_args: Additional pytest command-line arguments
+        logger: Optional logger instance
+
+    Returns:
+        CoverageMatrix with one row per test that ran
+    """
+    import coverage
+
+    # No data file: the matrix is the only output
+    cov = coverage.Coverage(source=[source_dir], data_file=None)
+    cov.start()
+    try:
+        results = run_tests(node_ids, extra_args=extra_args, plugins=[CoverageContextPlugin(cov)],
+                            output=io.StringIO(), verbose=False)
+    finally:
+        cov.stop()
+
+    matrix = CoverageMatrix.from_coverage_data(cov.get_data(), source_dir)
+    if logger:
+        logger.info(f"Collected coverage for {len(matrix.tests)} of {len(results)} tests: "
+                    f"{len(matrix.lines)} lines, {len(matrix.functions)} functions")
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect a per-test coverage matrix in one run")
+    parser.add_argument("tests", nargs="*", default=["tests/test_v1.py"],
+                        help="Test files or node IDs to run (default: tests/test_v1.py)")
+    parser.add_argument("--source-dir", default="v1", help="Directory containing the source code to measure")
+    parser.add_argument("--output", default="coverage_matrix.json", help="File to write the matrix to")
+    parser.add_argument("--store", help="Also save the matrix in this coverage store under the current commit")
+
+    args = parser.parse_args()
+
+    matrix = collect_coverage_matrix(args.tests, args.source_dir)
+    matrix.save(args.output)
+    print(f"Coverage for {len(matrix.tests)} tests ({len(matrix.lines)} lines, "
+          f"{len(matrix.functions)} functions) saved to {args.output}")
+    if args.store:
+        from prioritization.coverage_store import CoverageStore
+        commit = current_commit()
+        CoverageStore(args.store).write_matrix(commit, matrix)
+        print(f"Stored in {args.store} for commit {commit}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Sparse on-disk coverage store.
+
+Test -> code relationships are kept as a CSR (compressed sparse row) matrix
+per commit, so every prioritizer can reuse coverage collected once instead
+of re-collecting it. Each row is a test; each column an interned element
+name (a source line like 'v1/calculator.py:42' or a function like
+'v1/calculator.py::Calculator.divide'). Layout on disk:
+
+    <root>/<commit>/<kind>/indptr.npy    int64, one entry per test plus one
+    <root>/<commit>/<kind>/indices.npy   int32, element ids of every row back to back
+    <root>/<commit>/<kind>/tests.json    row names (pytest node IDs)
+    <root>/<commit>/<kind>/elements.json column names
+
+``kind`` is 'line' or 'function'. The arrays are opened with ``mmap_mode='r'``,
+so opening a snapshot costs almost nothing and only the rows actually
+queried are read from disk.
+
+Usage:
+    store = CoverageStore("coverage_store")
+    store.write_matrix(current_commit(), CoverageMatrix.load("coverage_matrix.json"))
+    snapshot = store.open()                  # checked-out commit (or nearest stored ancestor)
+    snapshot.row_names("tests/test_v1.py::TestCalculator::test_divide")
+    snapshot.union_size(["...::test_add", "...::test_divide"])
+"""
+
+import os
+import json
+import time
+import shutil
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from prioritization.git_utils import ancestors, current_commit
+from prioritization.nodeids import full_name
+
+
+class CoverageSnapshot:
+    """Read-only CSR coverage matrix for one commit and element kind."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode='r')
+        self.indices = np.load(os.path.join(path, "indices.npy"), mmap_mode='r')
+        with open(os.path.join(path, "tests.json"), 'r') as f:
+            self.tests: List[str] = json.load(f)
+        with open(os.path.join(path, "elements.json"), 'r') as f:
+            self.elements: List[str] = json.load(f)
+        self.test_ids = {test: i for i, test in enumerate(self.tests)}
+        self.element_ids = {element: i for i, element in enumerate(self.elements)}
+        self._columns = None
+
+    @property
+    def shape(self):
+        return len(self.tests), len(self.elements)
+
+    def row(self, test: str) -> np.ndarray:
+        """Return the sorted element ids covered by a test (empty if unknown)."""
+        i = self.test_ids.get(test)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def row_names(self, test: str) -> Set[str]:
+        """Return the names of the elements covered by a test."""
+        return {self.elements[i] for i in self.row(test)}
+
+    def column(self, element: str) -> List[str]:
+        """Return the tests that cover an element."""
+        j = self.element_ids.get(element)
+        if j is None:
+            return []
+        if self._columns is None:
+            # Transpose once: row ids sorted by element id
+            row_of = np.repeat(np.arange(len(self.tests)), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind="stable")
+            col_ptr = np.zeros(len(self.elements) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=len(self.elements)), out=col_ptr[1:])
+            self._columns = (col_ptr, row_of[order])
+        col_ptr, rows = self._columns
+        return [self.tests[i] for i in rows[col_ptr[j]:col_ptr[j + 1]]]
+
+    def union_size(self, tests: Iterable[str]) -> int:
+        """Return the number of distinct elements covered by a set of tests."""
+        covered = np.zeros(len(self.elements), dtype=bool)
+        for test in tests:
+            covered[self.row(test)] = True
+        return int(covered.sum())
+
+    def rows_by_name(self) -> Dict[str, np.ndarray]:
+        """
+        Return element ids keyed by the 'Class::method' full_name the
+        prioritizers use; parametrized instances of a test are merged.
+        """
+        merged: Dict[str, List[np.ndarray]] = {}
+        for test in self.tests:
+            merged.setdefault(full_name(test), []).append(self.row(test))
+        return {name: np.unique(np.concatenate(rows)) for name, rows in merged.items()}
+
+    def coverage_sets(self) -> Dict[str, Set[str]]:
+        """Return element names keyed by full_name, e.g. to fill TestCase.coverage."""
+        return {name: {self.elements[i] for i in row} for name, row in self.rows_by_name().items()}
+
+
+class CoverageStore:
+    """Directory of coverage snapshots, one per commit."""
+
+    KINDS = ("line", "function")
+
+    def __init__(self, root: str = "coverage_store"):
+        self.root = root
+
+    def _path(self, commit: str, kind: str) -> str:
+        return os.path.join(self.root, commit, kind)
+
+    def versions(self) -> List[str]:
+        """Return the stored commits, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        commits = [name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))]
+        return sorted(commits, key=lambda commit: os.path.getmtime(os.path.join(self.root, commit)))
+
+    def has(self, commit: str, kind: str = "function") -> bool:
+        return os.path.exists(os.path.join(self._path(commit, kind), "indptr.npy"))
+
+    def write(self, commit: str, rows: Dict[str, Iterable[str]], kind: str = "function") -> CoverageSnapshot:
+        """
+        Store coverage for a commit, replacing any existing snapshot.
+
+        Args:
+            commit: Commit the coverage was collected at
+            rows: Dictionary mapping test node IDs to the element names they cover
+            kind: 'line' or 'function'
+
+        Returns:
+            The written snapshot, opened for reading
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown coverage kind: {kind}")
+
+        element_ids: Dict[str, int] = {}
+        tests = list(rows)
+        indptr = np.zeros(len(tests) + 1, dtype=np.int64)
+        indices = []
+        for i, test in enumerate(tests):
+            row = sorted({element_ids.setdefault(element, len(element_ids)) for element in rows[test]})
+            indices.extend(row)
+            indptr[i + 1] = len(indices)
+
+        path = self._path(commit, kind)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "indptr.npy"), indptr)
+        np.save(os.path.join(tmp_path, "indices.npy"), np.asarray(indices, dtype=np.int32))
+        with open(os.path.join(tmp_path, "tests.json"), 'w') as f:
+            json.dump(tests, f)
+        with open(os.path.join(tmp_path, "elements.json"), 'w') as f:
+            json.dump(list(element_ids), f)
+
+        # Swap the finished snapshot in so readers never see a partial one,
+        # and only delete the old one once the new one is in place
+        if os.path.exists(path):
+            old_path = f"{path}.old{os.getpid()}"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path)
+        else:
+            os.replace(tmp_path, path)
+        os.utime(os.path.dirname(path), (time.time(), time.time()))
+        return CoverageSnapshot(path)
+
+    def write_matrix(self, commit: str, matrix) -> None:
+        """Store both kinds of a coverage_matrix.CoverageMatrix for a commit."""
+        for kind in self.KINDS:
+            self.write(commit, matrix.covered(kind), kind)
+
+    def nearest(self, commit: str, kind: str = "function", repo_dir: str = ".") -> Optional[str]:
+        """Return the commit itself if stored, else its nearest ancestor with stored coverage."""
+        if self.has(commit, kind):
+            return commit
+        for ancestor in ancestors(commit, repo_dir):
+            if self.has(ancestor, kind):
+                return ancestor
+        return None
+
+    def open(self, commit: Optional[str] = None, kind: str = "function", repo_dir: str = ".") -> CoverageSnapshot:
+        """
+        Open a stored snapshot.
+
+        Args:
+            commit: Commit to open (defaults to the one checked out in
+                repo_dir); without stored coverage for it, its nearest
+                ancestor that has some is opened
+            kind: 'line' or 'function'
+            repo_dir: Git repository to resolve commits in
+
+        Returns:
+            CoverageSnapshot
+        """
+        commit = commit or current_commit(repo_dir)
+        stored = self.nearest(commit, kind, repo_dir)
+        if stored is None:
+            raise FileNotFoundError(f"No {kind} coverage stored in {self.root} for commit {commit} "
+                                    f"or any of its ancestors")
+        return CoverageSnapshot(self._path(stored, kind))
@@ -0,0 +1,899 @@
+"""
+Static test discovery that matches pytest's collection.
+
+Test files are found the way pytest finds them: directories are walked
+recursively in name order, skipping pytest's default ``norecursedirs``, and
+files matching ``test_*.py`` or ``*_test.py`` are collected. Each file is
+parsed once (across a process pool when many files need parsing, and only
+when it changed since the last discovery, see
+prioritization.discovery_cache) into plain data: its test classes and
+functions, fixtures, parametrize and usefixtures marks and imports.
+
+Discovery then resolves what pytest would collect from every file:
+
+- test classes and functions bound in the module, in definition order,
+  including ones imported from other modules (``tests/test_v1.py`` collects
+  ``TestCalculator`` imported from ``test_calculator``) and test methods
+  inherited from base classes;
+- each test's fixture closure, with fixtures looked up in its class, its
+  module, then the ``conftest.py`` files from its directory up to rootdir;
+- one item per parametrization: parametrized fixtures first (higher scopes
+  first), then ``@pytest.mark.parametrize`` marks (closest decorator first,
+  then class and module marks), with IDs built like pytest's.
+
+So ``tests/test_calculator.py::TestCalculator::test_add[v0]`` and ``[v1]``
+are distinct items, and ordering and execution work on exactly the items
+pytest runs. Parameter IDs that depend on runtime values (names,
+expressions, ``ids`` callables, ``pytest_generate_tests`` hooks) cannot be
+known statically; such a test gets a single item with its unparametrized
+node ID and ``expanded`` False, which the order plugin applies to every
+instance. pytest's reordering of items by higher-scoped parametrized
+fixtures is not reproduced.
+
+Usage:
+    python -m prioritization.discovery tests/
+"""
+
+import gc
+import os
+import ast
+import sys
+import fnmatch
+import argparse
+import itertools
+import collections
+import concurrent.futures
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from prioritization.discovery_cache import DiscoveryCache, CACHE_FILE
+
+# pytest's defaults for python_files and norecursedirs
+PYTHON_FILES = ("test_*.py", "*_test.py")
+NORECURSE_DIRS = ("*.egg", ".*", "_darcs", "build", "CVS", "dist", "node_modules", "venv", "{arch}",
+                  "__pycache__")
+SCOPES = ("function", "class", "module", "package", "session")
+# Below this many files to parse, a process pool costs more than it saves
+MIN_PARALLEL_FILES = 16
+
+
+class Unresolved(Exception):
+    """A parametrization whose IDs are only known at runtime."""
+
+
+class CollectionError(Exception):
+    """A test pytest fails to collect, which fails its whole class or module."""
+
+
+def _dotted_name(node: ast.AST) -> str:
+    """Return 'pytest.mark.parametrize' for a decorator such as @pytest.mark.parametrize(...)."""
+    if isinstance(node, ast.Call):
+        node = node.func
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _keywords(call: ast.AST) -> Dict[str, ast.AST]:
+    return {kw.arg: kw.value for kw in call.keywords if kw.arg} if isinstance(call, ast.Call) else {}
+
+
+def _ascii_escaped(value: str) -> str:
+    """Escape a string ID the way pytest does (non-ASCII and control characters)."""
+    return value.encode("unicode_escape").decode("ascii")
+
+
+def _idval(node: ast.AST, argname: str, index: int) -> str:
+    """Return pytest's ID for one parameter value, e.g. 'v1', '1.5' or 'calculator0'."""
+    try:
+        value = ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        # A name or an expression: its ID depends on its runtime value
+        raise Unresolved(ast.unparse(node))
+    if isinstance(value, str):
+        return _ascii_escaped(value)
+    if isinstance(value, bytes):
+        return value.decode("ascii", "backslashreplace")
+    if value is None or isinstance(value, (bool, int, float, complex)):
+        return str(value)
+    return f"{argname}{index}"
+
+
+def _unique_ids(ids: List[str]) -> List[str]:
+    """Suffix duplicate IDs the way pytest does: 'a', 'a' -> 'a0', 'a1'; '1', '1' -> '1_0', '1_1'."""
+    counts = collections.Counter(ids)
+    if len(counts) == len(ids):
+        return ids
+    suffixes: Dict[str, int] = collections.defaultdict(int)
+    resolved = list(ids)
+    for index, value in enumerate(ids):
+        if counts[value] > 1:
+            separator = "_" if value and value[-1].isdigit() else ""
+            new_id = f"{value}{separator}{suffixes[value]}"
+            while new_id in resolved:
+                suffixes[value] += 1
+                new_id = f"{value}{separator}{suffixes[value]}"
+            resolved[index] = new_id
+            suffixes[value] += 1
+    return resolved
+
+
+def parameter_ids(argnames: List[str], argvalues: ast.AST, ids: Optional[ast.AST] = None) -> List[str]:
+    """
+    Work out pytest's IDs for a parametrization.
+
+    Args:
+        argnames: Parametrized argument names
+        argvalues: AST of the list of values (or of value tuples)
+        ids: AST of the ids argument, if given
+
+    Returns:
+        One ID per parameter set
+
+    Raises:
+        Unresolved: If an ID depends on runtime values
+    """
+    if not isinstance(argvalues, (ast.List, ast.Tuple)):
+        raise Unresolved("argvalues are not a literal list")
+    explicit: List[Optional[str]] = []
+    if ids is not None:
+        if not isinstance(ids, (ast.List, ast.Tuple)):
+            raise Unresolved("ids are not a literal list")
+        for node in ids.elts:
+            value = ast.literal_eval(node) if isinstance(node, ast.Constant) else Unresolved
+            if value is Unresolved:
+                raise Unresolved("ids are not literal")
+            explicit.append(None if value is None else _ascii_escaped(str(value)))
+    if not argvalues.elts:
+        # pytest runs (and skips) a single instance of an empty parametrization
+        return ["NOTSET"]
+
+    result = []
+    for index, element in enumerate(argvalues.elts):
+        given = None
+        if isinstance(element, ast.Call) and _dotted_name(element).split(".")[-1] == "param":
+            keywords = _keywords(element)
+            if "id" in keywords:
+                given = ast.literal_eval(keywords["id"]) if isinstance(keywords["id"], ast.Constant) else Unresolved
+                if given is Unresolved:
+                    raise Unresolved("pytest.param id is not literal")
+            values = element.args
+        elif len(argnames) == 1:
+            values = [element]
+        elif isinstance(element, (ast.List, ast.Tuple)):
+            values = element.elts
+        else:
+            raise Unresolved(ast.unparse(element))
+
+        if given is not None:
+            result.append(_ascii_escaped(str(given)))
+        elif index < len(explicit) and explicit[index] is not None:
+            result.append(explicit[index])
+        else:
+            result.append("-".join(_idval(value, argname, index) for argname, value in zip(argnames, values)))
+    return _unique_ids(result)
+
+
+def _argnames(function: ast.AST, is_method: bool) -> List[str]:
+    """Return the arguments pytest fills with fixtures (no self, none with defaults)."""
+    args = function.args
+    positional = args.posonlyargs + args.args
+    if is_method and not any(_dotted_name(d) == "staticmethod" for d in function.decorator_list):
+        positional = positional[1:]
+    if args.defaults:
+        positional = positional[:-len(args.defaults)]
+    keyword_only = [arg for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is None]
+    return [arg.arg for arg in positional + keyword_only]
+
+
+def _parse_mark(node: ast.AST) -> Optional[Dict[str, Any]]:
+    """Parse a parametrize or usefixtures mark, or return None for any other decorator."""
+    name = _dotted_name(node).split(".")
+    if len(name) < 2 or name[-2] != "mark" or not isinstance(node, ast.Call):
+        return None
+    keywords = _keywords(node)
+    if name[-1] == "usefixtures":
+        return {"kind": "usefixtures",
+                "names": [arg.value for arg in node.args
+                          if isinstance(arg, ast.Constant) and isinstance(arg.value, str)]}
+    if name[-1] != "parametrize":
+        return None
+
+    argnames_node = node.args[0] if node.args else keywords.get("argnames")
+    argvalues = node.args[1] if len(node.args) > 1 else keywords.get("argvalues")
+    if isinstance(argnames_node, ast.Constant) and isinstance(argnames_node.value, str):
+        argnames = [name.strip() for name in argnames_node.value.split(",") if name.strip()]
+    elif isinstance(argnames_node, (ast.List, ast.Tuple)) and all(
+            isinstance(elt, ast.Constant) and isinstance(elt.value, str) for elt in argnames_node.elts):
+        argnames = [elt.value for elt in argnames_node.elts]
+    else:
+        return {"kind": "parametrize", "argnames": [], "indirect": [], "ids": None}
+    indirect = keywords.get("indirect")
+    if isinstance(indirect, ast.Constant):
+        indirect = argnames if indirect.value else []
+    elif isinstance(indirect, (ast.List, ast.Tuple)):
+        indirect = [elt.value for elt in indirect.elts if isinstance(elt, ast.Constant)]
+    else:
+        indirect = []
+    try:
+        ids = parameter_ids(argnames, argvalues, keywords.get("ids"))
+    except Unresolved:
+        ids = None
+    return {"kind": "parametrize", "argnames": argnames, "indirect": indirect, "ids": ids}
+
+
+def _marks(decorators: Iterable[ast.AST]) -> List[Dict[str, Any]]:
+    """Parse a definition's marks, closest decorator first (the order pytest applies them)."""
+    return [mark for mark in map(_parse_mark, reversed(list(decorators))) if mark is not None]
+
+
+def _pytestmark(node: ast.AST) -> List[Dict[str, Any]]:
+    """Parse a ``pytestmark = ...`` assignment's marks."""
+    values = node.value.elts if isinstance(node.value, (ast.List, ast.Tuple)) else [node.value]
+    return [mark for mark in map(_parse_mark, values) if mark is not None]
+
+
+def _is_pytestmark(node: ast.AST) -> bool:
+    return (isinstance(node, ast.Assign) and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name) and node.targets[0].id == "pytestmark")
+
+
+def _parse_fixture(node: ast.AST, is_method: bool) -> Optional[Dict[str, Any]]:
+    """Parse a function decorated with @pytest.fixture, or return None for any other function."""
+    for decorator in node.decorator_list:
+        if _dotted_name(decorator).split(".")[-1] != "fixture":
+            continue
+        keywords = _keywords(decorator)
+        name = node.name
+        if isinstance(keywords.get("name"), ast.Constant):
+            name = keywords["name"].value
+        scope = "function"
+        if isinstance(keywords.get("scope"), ast.Constant) and keywords["scope"].value in SCOPES:
+            scope = keywords["scope"].value
+        autouse = isinstance(keywords.get("autouse"), ast.Constant) and bool(keywords["autouse"].value)
+
+        params: Any = None
+        if "params" in keywords:
+            try:
+                params = parameter_ids([name], keywords["params"], keywords.get("ids"))
+            except Unresolved:
+                params = "unresolved"
+        return {"name": name, "argnames": _argnames(node, is_method), "params": params,
+                "scope": scope, "autouse": autouse, "lineno": node.lineno}
+    return None
+
+
+def _test_record(node: ast.AST, is_method: bool, features: Optional[Callable]) -> Dict[str, Any]:
+    """Parse a test function: what expansion needs, and the fields its records share."""
+    record = {
+        "lineno": node.lineno,
+        "code": ast.unparse(node),
+        "assertions": len([n for n in ast.walk(node) if isinstance(n, ast.Assert)]),
+    }
+    if features is not None:
+        record["semantic_features"] = features(dict(record, method_name=node.name))
+    return {"name": node.name, "argnames": _argnames(node, is_method), "marks": _marks(node.decorator_list),
+            "record": record}
+
+
+def _parse_class(node: ast.ClassDef, features: Optional[Callable]) -> Dict[str, Any]:
+    info = {"name": node.name, "lineno": node.lineno, "bases": [_dotted_name(base) for base in node.bases],
+            "marks": _marks(node.decorator_list), "tests": {}, "fixtures": {},
+            "defined": [], "collect": True, "generate_tests": False}
+    for item in node.body:
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            info["defined"].append(item.name)
+            fixture = _parse_fixture(item, is_method=True)
+            if fixture is not None:
+                info["fixtures"][fixture["name"]] = fixture
+            elif item.name == "__init__":
+                # pytest does not collect classes with a constructor
+                info["collect"] = False
+            elif item.name == "pytest_generate_tests":
+                info["generate_tests"] = True
+            elif item.name.startswith("test"):
+                info["tests"][item.name] = _test_record(item, True, features)
+        elif _is_pytestmark(item):
+            info["marks"].extend(_pytestmark(item))
+        elif isinstance(item, ast.Assign):
+            for target in item.targets:
+                if isinstance(target, ast.Name):
+                    info["defined"].append(target.id)
+                    if target.id == "__test__" and isinstance(item.value, ast.Constant) and not item.value.value:
+                        info["collect"] = False
+    return info
+
+
+def parse_module(source: str, features: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    Parse a test module or conftest.py into plain (JSON-serializable) data.
+
+    Args:
+        source: The module's source code
+        features: Optional function computing semantic features of a test
+            record (see utils.extract_semantic_features)
+
+    Returns:
+        Dictionary with bindings (module-level names in definition order:
+        classes, test functions and imports), fixtures, marks (pytestmark)
+        and generate_tests (whether it defines pytest_generate_tests)
+    """
+    tree = ast.parse(source)
+    module = {"bindings": {}, "fixtures": {}, "marks": [], "generate_tests": False,
+              "features": _callable_name(features)}
+    bindings = module["bindings"]
+
+    def bind(name, binding):
+        # Rebinding a name keeps its position in the module namespace
+        if name in bindings:
+            bindings[name] = binding
+        else:
+            bindings.setdefault(name, binding)
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bind(node.name, dict(_parse_class(node, features), kind="class"))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            fixture = _parse_fixture(node, is_method=False)
+            if fixture is not None:
+                module["fixtures"][fixture["name"]] = fixture
+                bind(node.name, {"kind": "fixture", "name": fixture["name"]})
+            elif node.name == "pytest_generate_tests":
+                module["generate_tests"] = True
+            else:
+                bind(node.name, dict(_test_record(node, False, features), kind="function"))
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name != "*":
+                    bind(alias.asname or alias.name,
+                         {"kind": "import", "module": node.module or "", "name": alias.name, "level": node.level})
+        elif _is_pytestmark(node):
+            module["marks"].extend(_pytestmark(node))
+    return module
+
+
+def _callable_name(function: Optional[Callable]) -> Optional[str]:
+    return None if function is None else f"{function.__module__}.{function.__qualname__}"
+
+
+def _parse_path(path: str, features: Optional[Callable] = None) -> Dict[str, Any]:
+    """Parse a file, recording a syntax or decoding error instead of raising it."""
+    try:
+        with open(path, 'r') as f:
+            return parse_module(f.read(), features)
+    except (SyntaxError, ValueError) as e:
+        return {"error": f"{type(e).__name__}: {e}", "features": _callable_name(features)}
+
+
+def find_test_files(paths: Iterable[str], patterns: Iterable[str] = PYTHON_FILES) -> List[str]:
+    """
+    Find test files the way pytest does.
+
+    Directories are walked recursively in name order, skipping pytest's
+    default norecursedirs; files given explicitly are always included.
+
+    Returns:
+        Absolute paths of the test files, in collection order
+    """
+    patterns = tuple(patterns)
+    files: List[str] = []
+
+    def walk(directory):
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.is_dir():
+                if not any(fnmatch.fnmatch(entry.name, pattern) for pattern in NORECURSE_DIRS):
+                    walk(entry.path)
+            elif entry.is_file() and any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns):
+                files.append(entry.path)
+
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            walk(path)
+        elif path.endswith(".py"):
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def default_rootdir(paths: Iterable[str]) -> str:
+    """
+    Return the rootdir pytest uses without an ini file, as its determine_setup does.
+
+    That is the common ancestor of the paths (of the cwd if none of them
+    exists) together with the cwd, unless only the filesystem root is
+    common to both: then the paths' common ancestor alone.
+    """
+    cwd = os.getcwd()
+    paths = [os.path.abspath(path.split("::")[0]) for path in paths]
+    directories = [path if os.path.isdir(path) else os.path.dirname(path) for path in paths if os.path.exists(path)]
+    ancestor = os.path.commonpath(directories) if directories else cwd
+    try:
+        rootdir = os.path.commonpath([cwd, ancestor])
+    except ValueError:
+        # On different drives
+        return ancestor
+    return ancestor if os.path.dirname(rootdir) == rootdir else rootdir
+
+
+class _Resolver:
+    """Resolves parsed modules into pytest items."""
+
+    def __init__(self, modules: Dict[str, Dict[str, Any]], rootdir: str, load: Callable[[str], Dict[str, Any]]):
+        self.modules = modules
+        self.rootdir = rootdir
+        self.load = load
+        self._relative_paths: Dict[str, str] = {}
+        self._conftests: Dict[str, List[Dict[str, Any]]] = {}
+        self._parametrized: Dict[Any, Any] = {}
+
+    def module(self, path: str) -> Dict[str, Any]:
+        if path not in self.modules:
+            self.modules[path] = self.load(path)
+        return self.modules[path]
+
+    def _module_file(self, importer: str, module: str, level: int) -> Optional[str]:
+        """Find the file an import refers to, relative to the importer's directory or rootdir."""
+        if level:
+            bases = [os.path.dirname(importer)]
+            for _ in range(level - 1):
+                bases[0] = os.path.dirname(bases[0])
+        else:
+            # pytest's default import mode puts the test file's directory on sys.path
+            bases = [os.path.dirname(importer), self.rootdir]
+        relative = module.replace(".", os.sep)
+        for base in bases:
+            for candidate in (os.path.join(base, relative + ".py"), os.path.join(base, relative, "__init__.py")):
+                if module and os.path.isfile(candidate):
+                    return candidate
+        return None
+
+    def definition(self, path: str, name: str, seen=None):
+        """
+        Follow imports to where a module-level name is defined.
+
+        Returns:
+            Tuple of (defining file, binding), or (None, None) if it is not
+            defined in a file that can be found
+        """
+        seen = seen or set()
+        if (path, name) in seen:
+            return None, None
+        seen.add((path, name))
+        binding = self.module(path).get("bindings", {}).get(name)
+        if binding is None or binding["kind"] != "import":
+            return (path, binding) if binding is not None else (None, None)
+        source = self._module_file(path, binding["module"], binding["level"])
+        if source is None:
+            return None, None
+        return self.definition(source, binding["name"], seen)
+
+    def class_chain(self, path: str, name: str) -> List[Any]:
+        """Return (defining file, class info) for a class and its resolvable bases, in MRO-like order."""
+        chain = []
+        pending = [(path, name)]
+        while pending:
+            module_path, class_name = pending.pop(0)
+            source, binding = self.definition(module_path, class_name.split(".")[-1])
+            if binding is None or binding["kind"] != "class" or any(binding is info for _, info in chain):
+                continue
+            chain.append((source, binding))
+            pending.extend((source, base) for base in binding["bases"])
+        return chain
+
+    def module_fixtures(self, path: str) -> Dict[str, Dict[str, Any]]:
+        """Fixtures visible in a module: its own plus imported ones."""
+        module = self.module(path)
+        fixtures = dict(module.get("fixtures", {}))
+        for name, binding in module.get("bindings", {}).items():
+            if binding["kind"] == "import" and name not in fixtures:
+                source, found = self.definition(path, name)
+                if found is not None and found["kind"] == "fixture":
+                    fixtures[name] = self.module(source)["fixtures"][found["name"]]
+        return fixtures
+
+    def conftests(self, path: str) -> List[Dict[str, Any]]:
+        """Parsed conftest.py files from a test file's directory up to rootdir, closest first."""
+        directory = os.path.dirname(path)
+        if directory not in self._conftests:
+            self._conftests[directory] = [self.module(os.path.join(ancestor, "conftest.py"))
+                                          for ancestor in _ancestors(directory, self.rootdir)
+                                          if os.path.isfile(os.path.join(ancestor, "conftest.py"))]
+        return self._conftests[directory]
+
+    def items(self, path: str) -> List[Dict[str, Any]]:
+        """Return the items pytest collects from a test file, in collection order."""
+        module = self.module(path)
+        if "error" in module:
+            return []
+        nodeid_path = self._relative(path)
+        conftests = self.conftests(path)
+        levels = [self.module_fixtures(path)] + [conftest.get("fixtures", {}) for conftest in conftests]
+        module_fixtures = _fixture_lookup(levels)
+        generate_tests = module["generate_tests"] or any(conftest.get("generate_tests") for conftest in conftests)
+
+        items = []
+        for name in module["bindings"]:
+            if not name.startswith(("Test", "test")):
+                continue
+            source, definition = self.definition(path, name)
+            if definition is None:
+                continue
+            if definition["kind"] == "class" and name.startswith("Test") and definition["collect"]:
+                chain = self.class_chain(path, name)
+                class_fixtures: Dict[str, Dict[str, Any]] = {}
+                class_marks: List[Dict[str, Any]] = []
+                for _, info in reversed(chain):
+                    class_fixtures.update(info["fixtures"])
+                for _, info in chain:
+                    class_marks.extend(info["marks"])
+                class_generate = generate_tests or any(info["generate_tests"] for _, info in chain)
+                fixtures = _fixture_lookup([class_fixtures] + levels) if class_fixtures else module_fixtures
+                class_items = []
+                try:
+                    for method_source, defining_class, method in self._class_tests(chain):
+                        class_items.extend(self._expand(
+                            nodeid_path, name, method, f"{self._relative(method_source)}::{defining_class}",
+                            fixtures, method["marks"] + class_marks + module["marks"],
+                            class_generate))
+                except CollectionError:
+                    continue
+                items.extend(class_items)
+            elif definition["kind"] == "function" and name.startswith("test"):
+                try:
+                    items.extend(self._expand(nodeid_path, None, definition, self._relative(source), module_fixtures,
+                                              definition["marks"] + module["marks"], generate_tests))
+                except CollectionError:
+                    return []
+        return items
+
+    def _relative(self, path: str) -> str:
+        if path not in self._relative_paths:
+            self._relative_paths[path] = os.path.relpath(path, self.rootdir).replace(os.sep, "/")
+        return self._relative_paths[path]
+
+    @staticmethod
+    def _class_tests(chain: List[Any]) -> List[Any]:
+        """(defining file, defining class, test) for a class's test methods, inherited ones first, as pytest orders them."""
+        seen = set()
+        per_class = []
+        for source, info in chain:
+            names = [name for name in dict.fromkeys(info["defined"]) if name in info["tests"] and name not in seen]
+            per_class.append([(source, info["name"], info["tests"][name]) for name in names])
+            seen.update(info["defined"])
+        return [test for tests in reversed(per_class) for test in tests]
+
+    def _expand(self, nodeid_path: str, class_name: Optional[str], test: Dict[str, Any], owner: str,
+                fixtures: Dict[str, Any], marks: List[Dict[str, Any]],
+                generate_tests: bool) -> List[Dict[str, Any]]:
+        """
+        Expand a test into one item per parametrization.
+
+        Args:
+            owner: Where the test is defined: 'path' for a function,
+                'path::Class' for a method
+        """
+        full_name = f"{class_name}::{test['name']}" if class_name else test["name"]
+        base = dict(test["record"])
+        base.update(class_name=class_name, method_name=test["name"], full_name=full_name,
+                    file=nodeid_path, definition=f"{owner}::{test['name']}")
+        nodeid = f"{nodeid_path}::{full_name}"
+
+        try:
+            if generate_tests:
+                raise Unresolved("pytest_generate_tests")
+            # Tests with the same arguments, marks and visible fixtures (most
+            # tests of a class) expand alike
+            key = (id(fixtures), tuple(test["argnames"]), tuple(map(id, marks)))
+            if key not in self._parametrized:
+                try:
+                    result = self._parametrizations(test, fixtures, marks)
+                except (Unresolved, CollectionError) as e:
+                    result = e
+                # Holding on to fixtures keeps its id from being reused
+                self._parametrized[key] = (fixtures, result)
+            id_lists = self._parametrized[key][1]
+            if isinstance(id_lists, Exception):
+                raise id_lists
+        except Unresolved:
+            return [dict(base, nodeid=nodeid, param_id=None, expanded=False)]
+        if not id_lists:
+            return [dict(base, nodeid=nodeid, param_id=None, expanded=True)]
+        return [dict(base, nodeid=f"{nodeid}[{'-'.join(ids)}]", param_id="-".join(ids), expanded=True)
+                for ids in itertools.product(*id_lists)]
+
+    @staticmethod
+    def _parametrizations(test: Dict[str, Any], fixtures: Dict[str, Any],
+                          marks: List[Dict[str, Any]]) -> List[List[str]]:
+        """
+        Return the ID lists of a test's parametrizations, in the order pytest applies them.
+
+        Raises:
+            Unresolved: If any parametrization's IDs depend on runtime values
+            CollectionError: If a parametrized name is not an argument or fixture of the test
+        """
+        parametrize = [mark for mark in marks if mark["kind"] == "parametrize"]
+        parametrized = {name for mark in parametrize for name in mark["argnames"]}
+        # Indirectly parametrized names are still fixtures, with their own dependencies
+        direct = {name for mark in parametrize for name in mark["argnames"] if name not in mark["indirect"]}
+
+        definitions = fixtures["definitions"]
+        autouse = fixtures["autouse"]
+        closure = list(dict.fromkeys(autouse + _requested(test, marks)))
+        resolved: Dict[str, List[Dict[str, Any]]] = {}
+        length = -1
+        while length != len(closure):
+            length = len(closure)
+            for name in list(closure):
+                if name in resolved or name in direct:
+                    continue
+                resolved[name] = definitions.get(name, [])
+                # An overriding fixture that requests its own name also needs the one it overrides
+                for fixture in resolved[name]:
+                    for argname in fixture["argnames"]:
+                        if argname not in closure:
+                            closure.append(argname)
+                    if name not in fixture["argnames"]:
+                        break
+
+        def scope(name):
+            fixtures = resolved.get(name)
+            return SCOPES.index(fixtures[0]["scope"]) if fixtures else 0
+        closure.sort(key=scope, reverse=True)
+
+        id_lists = []
+        for name in closure:
+            if name in parametrized:
+                continue
+            for fixture in resolved.get(name, []):
+                if fixture["params"] is not None:
+                    if fixture["params"] == "unresolved":
+                        raise Unresolved(name)
+                    id_lists.append(fixture["params"])
+                    break
+                if name not in fixture["argnames"]:
+                    break
+        for mark in parametrize:
+            if any(name not in closure for name in mark["argnames"]):
+                raise CollectionError(",".join(mark["argnames"]))
+            if mark["ids"] is None:
+                raise Unresolved(",".join(mark["argnames"]))
+            id_lists.append(mark["ids"])
+        return id_lists
+
+
+def discover_tests(paths: Iterable[str], rootdir: Optional[str] = None, patterns: Iterable[str] = PYTHON_FILES,
+                   workers: Optional[int] = None, use_cache: bool = True, cache_file: Optional[str] = None,
+                   features: Optional[Callable] = None, logger=None) -> Dict[str, Any]:
+    """
+    Discover the tests under some paths and the pytest items they expand to.
+
+    Args:
+        paths: Test directories or files
+        rootdir: Directory node IDs are relative to (defaults to pytest's
+            rootdir without an ini file, see default_rootdir)
+        patterns: Test file name patterns
+        workers: Processes used to parse changed files (defaults to the
+            number of CPUs; 1 parses in this process)
+        use_cache: Whether to reuse parses of unchanged files
+        cache_file: Cache file (defaults to __pycache__/discovery_cache.json
+            in the first path)
+        features: Optional function computing each test's semantic features
+        logger: Optional logger object for logging information
+
+    Returns:
+        Dictionary with tests (one record per test function defined in the
+        discovered files, with the node IDs of its items under 'nodeids')
+        and items (one record per pytest item, with 'nodeid', 'param_id'
+        and 'expanded')
+    """
+    # Discovery creates no reference cycles, but many objects; with a large
+    # cache loaded, each full collection would scan all of them
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _discover_tests(list(paths), rootdir, patterns, workers, use_cache, cache_file, features, logger)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _discover_tests(paths, rootdir, patterns, workers, use_cache, cache_file, features, logger):
+    rootdir = os.path.abspath(rootdir) if rootdir else default_rootdir(paths)
+    test_files = find_test_files(paths, patterns)
+    directories = {directory for path in {os.path.dirname(path) for path in test_files}
+                   for directory in _ancestors(path, rootdir)}
+    conftests = sorted(os.path.join(directory, "conftest.py") for directory in directories
+                       if os.path.isfile(os.path.join(directory, "conftest.py")))
+
+    cache = None
+    if use_cache:
+        first = paths[0] if paths else "."
+        default = os.path.join(first if os.path.isdir(first) else os.path.dirname(os.path.abspath(first)),
+                               CACHE_FILE)
+        cache = DiscoveryCache(cache_file or default, logger)
+    features_name = _callable_name(features)
+
+    modules: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for path in test_files + conftests:
+        cached = cache.get(path) if cache is not None else None
+        if cached is not None and cached.get("features") == features_name:
+            modules[path] = cached
+        else:
+            pending.append(path)
+
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(pending) >= MIN_PARALLEL_FILES:
+            chunksize = max(1, len(pending) // (workers * 4))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(_parse_path, pending, itertools.repeat(features), chunksize=chunksize))
+        else:
+            parsed = [_parse_path(path, features) for path in pending]
+        for path, module in zip(pending, parsed):
+            modules[path] = module
+            if cache is not None:
+                cache.put(path, module)
+        if logger:
+            logger.debug(f"Parsed {len(pending)} of {len(test_files) + len(conftests)} files")
+
+    def load(path):
+        # Modules reached only through imports, e.g. a helper module outside the test paths
+        module = cache.get(path) if cache is not None else None
+        if module is None or module.get("features") != features_name:
+            module = _parse_path(path, features)
+            if cache is not None:
+                cache.put(path, module)
+        return module
+
+    resolver = _Resolver(modules, rootdir, load)
+    items = []
+    for path in test_files:
+        if "error" in resolver.module(path) and logger:
+            logger.warning(f"Could not parse {path}: {resolver.module(path)['error']}")
+        items.extend(resolver.items(path))
+    if cache is not None:
+        cache.save()
+
+    nodeids: Dict[str, List[str]] = collections.defaultdict(list)
+    for item in items:
+        nodeids[item["definition"]].append(item["nodeid"])
+    tests = []
+    for path in test_files:
+        relative = os.path.relpath(path, rootdir).replace(os.sep, "/")
+        for name, binding in modules[path].get("bindings", {}).items():
+            if binding["kind"] == "class" and name.startswith("Test") and binding["collect"]:
+                definitions = [(name, test) for test in binding["tests"].values()]
+            elif binding["kind"] == "function" and name.startswith("test"):
+                definitions = [(None, binding)]
+            else:
+                continue
+            for class_name, test in definitions:
+                full_name = f"{class_name}::{test['name']}" if class_name else test["name"]
+                record = dict(test["record"])
+                record.update(class_name=class_name, method_name=test["name"], full_name=full_name,
+                              file=relative, nodeids=nodeids[f"{relative}::{full_name}"])
+                tests.append(record)
+
+    if logger:
+        logger.info(f"Discovered {len(tests)} tests ({len(items)} pytest items) in {len(test_files)} files")
+    return {"tests": tests, "items": items, "rootdir": rootdir}
+
+
+def _fixture_lookup(levels: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Index the fixtures visible to a test, from the closest level (class or module) to the farthest conftest.
+
+    Returns:
+        Dictionary with definitions (name -> definitions, closest first)
+        and autouse (names of autouse fixtures, farthest first)
+    """
+    definitions: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+    for level in levels:
+        for name, fixture in level.items():
+            definitions[name].append(fixture)
+    autouse = [name for level in reversed(levels) for name, fixture in level.items() if fixture["autouse"]]
+    return {"definitions": dict(definitions), "autouse": autouse}
+
+
+def _requested(test: Dict[str, Any], marks: List[Dict[str, Any]]) -> List[str]:
+    """Return the fixtures a test requests itself: its usefixtures marks, then its arguments."""
+    usefixtures = [name for mark in marks if mark["kind"] == "usefixtures" for name in mark["names"]]
+    return list(dict.fromkeys(usefixtures + test["argnames"]))
+
+
+def visible_fixtures(path: str, rootdir: Optional[str] = None,
+                     cache: Optional[DiscoveryCache] = None) -> Dict[str, Any]:
+    """
+    Resolve the fixtures of a test module the way discovery does, without expanding its items.
+
+    Files are parsed as discover_tests parses them, and its cached parse is
+    reused whatever semantic features it holds, since fixtures do not
+    depend on them.
+
+    Args:
+        path: Test module
+        rootdir: Directory to look for conftest.py files up to and to
+            resolve imports from (defaults as in discover_tests)
+        cache: Optional discovery cache
+
+    Returns:
+        Dictionary with levels (the fixtures of the module, including
+        imported ones, then of each conftest.py, closest first), classes
+        (the fixtures of each collected test class and its bases, closest
+        first), tests (the fixtures each test requests through usefixtures
+        marks and its arguments, by 'Class::method' or 'function') and
+        sources (every file read)
+
+    Raises:
+        ValueError: If the module cannot be parsed
+    """
+    def load(file_path):
+        module = cache.get(file_path) if cache is not None else None
+        if module is None:
+            module = _parse_path(file_path)
+            if cache is not None:
+                cache.put(file_path, module)
+        return module
+
+    path = os.path.abspath(path)
+    resolver = _Resolver({}, os.path.abspath(rootdir) if rootdir else default_rootdir([path]), load)
+    module = resolver.module(path)
+    if "error" in module:
+        raise ValueError(module["error"])
+    levels = [resolver.module_fixtures(path)] + [conftest.get("fixtures", {}) for conftest in resolver.conftests(path)]
+
+    classes: Dict[str, List[Dict[str, Any]]] = {}
+    tests: Dict[str, List[str]] = {}
+    for name in module["bindings"]:
+        if not name.startswith(("Test", "test")):
+            continue
+        _, definition = resolver.definition(path, name)
+        if definition is None:
+            continue
+        if definition["kind"] == "class" and name.startswith("Test") and definition["collect"]:
+            # Keyed by the name the class is collected under, which an import may have changed
+            chain = resolver.class_chain(path, name)
+            classes[name] = [info["fixtures"] for _, info in chain]
+            class_marks = [mark for _, info in chain for mark in info["marks"]]
+            for _, _, test in _Resolver._class_tests(chain):
+                tests[f"{name}::{test['name']}"] = _requested(test, test["marks"] + class_marks + module["marks"])
+        elif definition["kind"] == "function" and name.startswith("test"):
+            tests[name] = _requested(definition, definition["marks"] + module["marks"])
+    return {"levels": levels, "classes": classes, "tests": tests, "sources": list(resolver.modules)}
+
+
+def _ancestors(directory: str, rootdir: str) -> List[str]:
+    """Return a directory and its parents up to rootdir."""
+    directories = [directory]
+    while directory != rootdir and directory.startswith(rootdir) and os.path.dirname(directory) != directory:
+        directory = os.path.dirname(directory)
+        directories.append(directory)
+    return directories
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the pytest items under some paths without importing them")
+    parser.add_argument("paths", nargs="*", default=["."], help="Test directories or files")
+    parser.add_argument("--rootdir", help="Directory node IDs are relative to")
+    parser.add_argument("--workers", type=int, help="Processes used to parse files (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file, ignoring the discovery cache")
+    parser.add_argument("--tests", action="store_true",
+                        help="List test functions with their item counts instead of items")
+    args = parser.parse_args()
+
+    discovery = discover_tests(args.paths, rootdir=args.rootdir, workers=args.workers, use_cache=not args.no_cache)
+    if args.tests:
+        for test in discovery["tests"]:
+            print(f"{test['file']}::{test['full_name']} ({len(test['nodeids'])} items)")
+    else:
+        for item in discovery["items"]:
+            print(item["nodeid"] if item["expanded"] else f"{item['nodeid']} (parameters not expanded)")
+    print(f"{len(discovery['items'])} items from {len(discovery['tests'])} tests", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
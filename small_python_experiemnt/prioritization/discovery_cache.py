@@ -0,0 +1,141 @@
+"""
+Persistent cache of discovered tests.
+
+Discovering tests parses every test file, unparses every test method and
+extracts semantic features with regular expressions. The cache keeps the
+resulting records per file, keyed by the file's path, modification time,
+size and content hash, so a file is only parsed again when it changed:
+
+- mtime and size unchanged: the cached data is used without reading the
+  file.
+- mtime or size changed but the content hash is the same (a checkout or
+  ``touch``): the file is read and hashed, but not parsed.
+- otherwise the file is parsed again (see prioritization.discovery) and
+  its data replaced.
+
+Each file's entry holds the data of several consumers in named sections:
+discovery's parse in ``records``, which test_parser also builds on, and
+test_parser's fixture graph in ``fixture_graph``. A section stored for
+different contents replaces the whole entry, so sections never outlive the
+version of the file they were extracted from.
+
+The cache is a JSON file, by default ``__pycache__/discovery_cache.json``
+in the test directory. Cached data is plain JSON (no AST nodes). Bump
+CACHE_VERSION whenever what discovery extracts changes, so that old caches
+are discarded.
+"""
+
+import gc
+import os
+import json
+import hashlib
+from typing import Any, Dict
+
+CACHE_VERSION = 4
+CACHE_FILE = os.path.join("__pycache__", "discovery_cache.json")
+
+
+class DiscoveryCache:
+    """Parsed data of each test file, reused while the file is unchanged."""
+
+    def __init__(self, path: str, logger=None):
+        """
+        Args:
+            path: JSON cache file (need not exist yet)
+            logger: Optional logger object for logging information
+        """
+        self.path = path
+        self.logger = logger
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        # A large cache holds many small objects; don't let the garbage
+        # collector scan them repeatedly while they are being created
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.files = data["files"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            # Missing, unreadable or corrupt: start empty
+            pass
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def get(self, file_path: str, section: str = "records") -> Any:
+        """
+        Return the data cached for a file, or None if it changed since.
+
+        Args:
+            file_path: Test file
+            section: Which consumer's data to return
+        """
+        entry = self._current(file_path)
+        if entry is None or section not in entry:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[section]
+
+    def digest(self, file_path: str) -> str:
+        """Return the SHA-1 of a file's contents, reusing the cached one while the file is unchanged."""
+        entry = self._current(file_path)
+        return entry["sha1"] if entry is not None else self._digest(os.path.abspath(file_path))
+
+    def _current(self, file_path: str) -> Any:
+        """Return the file's entry if it matches the file's current contents."""
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        entry = self.files.get(key)
+        if entry is None:
+            return None
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+        if entry["sha1"] == self._digest(key):
+            # Touched or checked out again, but unchanged
+            entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            self.dirty = True
+            return entry
+        return None
+
+    def put(self, file_path: str, data: Any, section: str = "records") -> None:
+        """Cache the data extracted from a file's current contents."""
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        digest = self._digest(key)
+        entry = self.files.get(key)
+        if entry is None or entry["sha1"] != digest:
+            # Other sections describe the old contents
+            entry = self.files[key] = {"sha1": digest}
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        entry[section] = data
+        self.dirty = True
+
+    @staticmethod
+    def _digest(path: str) -> str:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def save(self) -> None:
+        """Write the cache back if anything changed, dropping files that no longer exist."""
+        if not self.dirty:
+            return
+        files = {path: entry for path, entry in self.files.items() if os.path.exists(path)}
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(temporary, 'w') as f:
+                # dumps() encodes in C; dump() would write chunk by chunk in Python
+                f.write(json.dumps({"version": CACHE_VERSION, "files": files}, separators=(',', ':')))
+            # Atomic, so concurrent discoveries never read a half-written cache
+            os.replace(temporary, self.path)
+            self.dirty = False
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"Could not write discovery cache {self.path}: {e}")
+            if os.path.exists(temporary):
+                os.remove(temporary)
@@ -15,7 +15,8 @@ def save_prioritized_order(tests, output_file, logger=None):
         logger.info(f"Saving prioritized test order to {output_file}")
         
     with open(output_file, 'w') as f:
-        ordered_tests = [test['full_name'] for test in tests]
+        # Pytest items are saved by node ID, so each parametrized instance keeps its own place
+        ordered_tests = [test.get('nodeid', test['full_name']) for test in tests]
         json.dump(ordered_tests, f, indent=2)
     
     if logger:
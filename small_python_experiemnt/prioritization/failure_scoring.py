@@ -0,0 +1,157 @@
+"""
+Decay-weighted failure scoring for history-based prioritization.
+
+History is consumed in one streaming pass, oldest run first. Each test keeps
+four running values that decay exponentially with the number of runs since
+they were last updated, so a failure ``half_life`` runs ago counts half as
+much as one in the latest run:
+
+    failure score     one point per failing run
+    transition score  one point per run whose outcome differs from the
+                      test's previous outcome (pass -> fail or fail -> pass)
+    flaky score       one point per FLAKY run (failed, then passed on a rerun)
+    duration          exponentially weighted mean of recorded durations
+
+Tests are ranked by ``(failure + transition_weight * transition) /
+(1 + flaky_weight * flaky)``, highest first, with shorter tests first among
+equal scores, so tests that keep failing only intermittently stop crowding
+the front of the order. A FLAKY run counts as a pass for the other scores.
+
+History entries are matched to tests through an index built once from the
+discovered tests: by 'Class::method' full name (node IDs and parametrized
+IDs are reduced to it), falling back to the bare method name only when that
+name is unique among the tests.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from prioritization.nodeids import full_name, method_name
+
+FAILED_OUTCOMES = ("FAILED", "ERROR", "FAIL")
+FLAKY_OUTCOME = "FLAKY"
+
+
+class HistoryIndex:
+    """Lookup from history test names to discovered tests' full names."""
+
+    def __init__(self, tests: Iterable[Dict[str, Any]]):
+        self.by_full_name: Dict[str, Dict[str, Any]] = {}
+        by_method: Dict[str, List[str]] = {}
+        for test in tests:
+            self.by_full_name[test['full_name']] = test
+            by_method.setdefault(test['method_name'], []).append(test['full_name'])
+        # Bare method names are only trusted when they identify one test
+        self.by_method = {name: names[0] for name, names in by_method.items() if len(names) == 1}
+        self.ambiguous = {name for name, names in by_method.items() if len(names) > 1}
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Return the full name of the test a history entry refers to, or None."""
+        key = full_name(name)
+        if key in self.by_full_name:
+            return key
+        if "::" not in key:
+            return self.by_method.get(method_name(key))
+        return None
+
+
+class FailureScorer:
+    """Streaming, exponentially decayed failure and transition scores."""
+
+    def __init__(self, half_life: float = 10.0, transition_weight: float = 0.5, flaky_weight: float = 1.0):
+        """
+        Args:
+            half_life: Number of runs after which a failure counts half as much
+            transition_weight: Weight of outcome transitions relative to failures
+            flaky_weight: How strongly FLAKY runs discount a test's score (0 to ignore them)
+        """
+        self.decay = 0.5 ** (1.0 / half_life)
+        self.transition_weight = transition_weight
+        self.flaky_weight = flaky_weight
+        # name -> [failure, transition, duration, last_run, last_failed, flaky]
+        self._state: Dict[str, list] = {}
+        self._latest_run = 0
+
+    def update(self, run: int, test: str, outcome: str, duration: Optional[float] = None) -> None:
+        """
+        Add one history entry. Entries must arrive in non-decreasing run order.
+
+        Args:
+            run: Run number (e.g. run_id from the history store)
+            test: Test name the entry is recorded under
+            outcome: PASSED/FAILED/ERROR/SKIPPED/FLAKY (or PASS/FAIL from JSON snapshots)
+            duration: Recorded duration in seconds, if any
+        """
+        failed = outcome in FAILED_OUTCOMES
+        flaky = 1.0 if outcome == FLAKY_OUTCOME else 0.0
+        state = self._state.get(test)
+        if state is None:
+            self._state[test] = [1.0 if failed else 0.0, 0.0, duration, run, failed, flaky]
+        else:
+            fade = self.decay ** (run - state[3])
+            state[0] = state[0] * fade + (1.0 if failed else 0.0)
+            state[1] = state[1] * fade + (1.0 if failed != state[4] else 0.0)
+            state[5] = state[5] * fade + flaky
+            if duration is not None:
+                state[2] = duration if state[2] is None else 0.7 * state[2] + 0.3 * duration
+            state[3] = run
+            state[4] = failed
+        self._latest_run = max(self._latest_run, run)
+
+    def consume(self, rows: Iterable[Tuple]) -> "FailureScorer":
+        """
+        Add many history entries, e.g. HistoryStore.iter_results().
+
+        Args:
+            rows: (run, test, outcome, duration, ...) tuples in run order
+        """
+        for run, test, outcome, duration, *_ in rows:
+            self.update(run, test, outcome, duration)
+        return self
+
+    def consume_snapshot(self, snapshot: Dict[str, str]) -> "FailureScorer":
+        """Add a legacy {test: 'PASS'|'FAIL'|'FLAKY'} snapshot as the next run."""
+        run = self._latest_run + 1
+        for test, outcome in snapshot.items():
+            self.update(run, test, outcome)
+        return self
+
+    def scores(self, index: HistoryIndex) -> Dict[str, Tuple[float, float]]:
+        """
+        Return (score, duration) for every indexed test that has history.
+
+        Scores are decayed to the latest run; entries recorded under
+        different names for the same test (e.g. several parametrizations)
+        are summed, and their durations averaged.
+        """
+        merged: Dict[str, list] = {}
+        for test, (failure, transition, duration, last_run, _, flaky) in self._state.items():
+            name = index.resolve(test)
+            if name is None:
+                continue
+            fade = self.decay ** (self._latest_run - last_run)
+            score = (failure + self.transition_weight * transition) * fade / (1.0 + self.flaky_weight * flaky * fade)
+            entry = merged.setdefault(name, [0.0, []])
+            entry[0] += score
+            if duration is not None:
+                entry[1].append(duration)
+        return {
+            name: (score, sum(durations) / len(durations) if durations else float('inf'))
+            for name, (score, durations) in merged.items()
+        }
+
+    def rank(self, tests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Order tests by decayed score (highest first), then by duration (shortest first).
+
+        Among equal scores, tests without a recorded duration go last, in
+        their original order.
+        """
+        scores = self.scores(HistoryIndex(tests))
+        no_history = (0.0, float('inf'))
+
+        def key(test):
+            score, duration = scores.get(test['full_name'], no_history)
+            return -score, duration
+
+        # sort() is stable, so equal keys keep the discovered order
+        return sorted(tests, key=key)
@@ -0,0 +1,262 @@
+"""
+Fixture-aware scheduling of a prioritized test order.
+
+pytest sets up a class-, module-, package- or session-scoped fixture once
+and keeps it until the run leaves its scope: the next test is in another
+class or module, or needs another parameter of the fixture. A priority
+order that interleaves tests from different classes and modules therefore
+sets the same expensive fixtures up and tears them down again and again.
+
+The scheduler reorders a prioritized list so that tests sharing a live
+fixture run together, while no test moves more than ``max_displacement``
+positions from its priority rank, which keeps most of the early fault
+detection of the original order:
+
+    tests = previous_failure_prioritization(tests, "test_results.json", logger)
+    fixtures = shared_fixtures(tests, rootdir)
+    costs = measured_setup_costs("test_events.jsonl", tests, fixtures)
+    tests = schedule_by_fixtures(tests, fixtures, costs, max_displacement=10)
+
+At each position, a test that has reached its displacement limit runs
+first. Otherwise the scheduler looks at the remaining tests ranked at most
+max_displacement positions further down and runs the one with the lowest
+setup cost: the cost of the shared fixtures it needs that are not alive,
+plus the cost of live fixtures it would tear down that later tests still
+need. Among equally cheap tests the higher-priority one runs first.
+
+A test's fixtures are its arguments, the autouse fixtures and the fixtures
+those request, transitively, from the fixture graph of its module, its
+class and the conftest.py files above it (see prioritization.test_parser).
+Setup costs come from the ``setup_duration`` of result events (see
+prioritization.result_events); a fixture that was never measured costs
+the mean of the measured ones, or DEFAULT_SETUP_COST without measurements.
+"""
+
+import os
+import collections
+from typing import Any, Dict, List, Optional, Tuple
+
+from prioritization.discovery_cache import DiscoveryCache
+from prioritization.result_events import iter_result_events
+from prioritization.test_parser import FixtureGraph, fixture_graph
+
+DEFAULT_MAX_DISPLACEMENT = 10
+DEFAULT_SETUP_COST = 1.0
+SHARED_SCOPES = ("class", "module", "package", "session")
+
+# A shared fixture instance a test needs: (scope node, fixture name, parameter)
+Requirement = Tuple[str, str, Optional[str]]
+
+
+def _scope_node(scope: str, test: Dict[str, Any]) -> str:
+    """Return the node a fixture of this scope lives on while the test runs."""
+    if scope == "session":
+        return ""
+    if scope == "package":
+        return os.path.dirname(test["file"])
+    if scope == "class" and test.get("class_name"):
+        return f"{test['file']}::{test['class_name']}"
+    # Class-scoped fixtures of test functions live as long as the module
+    return test["file"]
+
+
+def _scope_nodes(test: Dict[str, Any]) -> frozenset:
+    """Return every node the test runs inside: the session, its packages, module and class."""
+    nodes = {"", test["file"]}
+    if test.get("class_name"):
+        nodes.add(f"{test['file']}::{test['class_name']}")
+    directory = os.path.dirname(test["file"])
+    while directory:
+        nodes.add(directory)
+        directory = os.path.dirname(directory)
+    return frozenset(nodes)
+
+
+def shared_fixtures(tests: List[Dict[str, Any]], rootdir: str, cache_file: Optional[str] = None,
+                    logger=None) -> List[List[Requirement]]:
+    """
+    Find the class-, module-, package- and session-scoped fixtures each test needs.
+
+    Args:
+        tests: Test dictionaries from get_all_tests, with file relative to rootdir
+        rootdir: Directory the tests' file paths are relative to
+        cache_file: Optional discovery cache file to keep fixture graphs in,
+            e.g. the one get_all_tests uses
+        logger: Optional logger object for logging information
+
+    Returns:
+        One list per test of (scope node, fixture name, parameter) tuples.
+        The parameter is the test's param_id for a parametrized fixture
+        (None otherwise), so tests with other parameters count as needing
+        another instance.
+    """
+    cache = DiscoveryCache(cache_file, logger) if cache_file else None
+    graphs: Dict[str, Optional[FixtureGraph]] = {}
+
+    def graph_of(relative: str) -> Optional[FixtureGraph]:
+        if relative not in graphs:
+            try:
+                graphs[relative] = fixture_graph(os.path.join(rootdir, relative), rootdir, cache)
+            except (OSError, ValueError) as e:
+                if logger:
+                    logger.warning(f"Could not parse fixtures of {relative}: {e}")
+                graphs[relative] = None
+        return graphs[relative]
+
+    requirements = []
+    for test in tests:
+        graph = graph_of(test["file"])
+        test_id = f"{test['class_name']}::{test['method_name']}" if test.get("class_name") else test["method_name"]
+        needed = []
+        # Classes imported from other modules are resolved where they are collected
+        for name in graph.fixtures_of(test_id) if graph is not None else []:
+            fixture = graph.definition(name, test.get("class_name"))
+            if fixture is None or fixture["scope"] not in SHARED_SCOPES:
+                continue
+            param = test.get("param_id") if fixture["params"] is not None else None
+            needed.append((_scope_node(fixture["scope"], test), name, param))
+        requirements.append(needed)
+
+    if cache is not None:
+        cache.save()
+    return requirements
+
+
+def measured_setup_costs(events_file: str, tests: List[Dict[str, Any]],
+                         fixtures: List[List[Requirement]]) -> Dict[str, float]:
+    """
+    Estimate each shared fixture's setup cost from a previous run's result events.
+
+    A shared fixture is set up by the first test of its scope that needs
+    it, so its cost is the longest setup_duration among the tests needing
+    it.
+
+    Args:
+        events_file: JSONL file written by the result_events plugin
+        tests: Test dictionaries (items with 'nodeid', or functions with 'nodeids')
+        fixtures: Fixtures of each test, from shared_fixtures
+
+    Returns:
+        Dictionary mapping fixture names to setup costs in seconds
+    """
+    by_nodeid = {}
+    for i, test in enumerate(tests):
+        for nodeid in test.get("nodeids") or [test.get("nodeid", f"{test['file']}::{test['full_name']}")]:
+            by_nodeid[nodeid] = i
+
+    costs: Dict[str, float] = {}
+    for event in iter_result_events(events_file):
+        i = by_nodeid.get(event.get("nodeid"))
+        setup = event.get("setup_duration")
+        if i is None or setup is None:
+            continue
+        for _, name, _ in fixtures[i]:
+            costs[name] = max(costs.get(name, 0.0), setup)
+    return costs
+
+
+def _cost_function(setup_costs: Optional[Dict[str, float]]):
+    """Return a function giving a fixture's cost, with unmeasured fixtures at the mean."""
+    setup_costs = setup_costs or {}
+    default = sum(setup_costs.values()) / len(setup_costs) if setup_costs else DEFAULT_SETUP_COST
+    return lambda name: setup_costs.get(name, default)
+
+
+def fixture_setup_cost(tests: List[Dict[str, Any]], fixtures: List[List[Requirement]],
+                       setup_costs: Optional[Dict[str, float]] = None,
+                       order: Optional[List[int]] = None) -> Dict[str, float]:
+    """
+    Count the shared fixture setups a test order causes.
+
+    Args:
+        tests: Test dictionaries
+        fixtures: Fixtures of each test, from shared_fixtures
+        setup_costs: Fixture setup costs (see measured_setup_costs)
+        order: Indices into tests in the order they run (default: as listed)
+
+    Returns:
+        Dictionary with the number of setups and their total cost
+    """
+    cost_of = _cost_function(setup_costs)
+    live: Dict[Tuple[str, str], Optional[str]] = {}
+    setups, total = 0, 0.0
+    for i in order if order is not None else range(len(tests)):
+        scopes = _scope_nodes(tests[i])
+        for key in [key for key in live if key[0] not in scopes]:
+            del live[key]
+        for node, name, param in fixtures[i]:
+            if (node, name) not in live or live[(node, name)] != param:
+                live[(node, name)] = param
+                setups += 1
+                total += cost_of(name)
+    return {"setups": setups, "cost": total}
+
+
+def schedule_by_fixtures(tests: List[Dict[str, Any]], fixtures: List[List[Requirement]],
+                         setup_costs: Optional[Dict[str, float]] = None,
+                         max_displacement: int = DEFAULT_MAX_DISPLACEMENT,
+                         logger=None) -> List[Dict[str, Any]]:
+    """
+    Reorder prioritized tests to share fixture setup, moving each test a bounded distance.
+
+    Args:
+        tests: Test dictionaries in priority order
+        fixtures: Fixtures of each test, from shared_fixtures
+        setup_costs: Fixture setup costs in seconds (see measured_setup_costs)
+        max_displacement: How many positions a test may move from its rank
+            in either direction (0 keeps the priority order)
+        logger: Optional logger object for logging information
+
+    Returns:
+        List of the same test dictionaries in the scheduled order
+    """
+    if max_displacement <= 0 or len(tests) < 2:
+        return list(tests)
+
+    cost_of = _cost_function(setup_costs)
+    required = [[(node, name, param, cost_of(name)) for node, name, param in needed] for needed in fixtures]
+    scopes = [_scope_nodes(test) for test in tests]
+    # How many unscheduled tests still need each fixture instance
+    pending = collections.Counter((node, name, param) for needed in fixtures for node, name, param in needed)
+
+    live: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+    scheduled = [False] * len(tests)
+    order = []
+    low = 0
+    for position in range(len(tests)):
+        while scheduled[low]:
+            low += 1
+        best = low
+        if position - low < max_displacement:
+            best_cost = None
+            for rank in range(low, min(len(tests), position + max_displacement + 1)):
+                if scheduled[rank]:
+                    continue
+                cost = 0.0
+                for node, name, param, setup in required[rank]:
+                    instance = live.get((node, name))
+                    if instance is None or instance[0] != param:
+                        cost += setup
+                for (node, name), (param, setup) in live.items():
+                    if node not in scopes[rank] and pending[(node, name, param)]:
+                        cost += setup
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = rank, cost
+                    if cost == 0:
+                        break
+
+        scheduled[best] = True
+        order.append(best)
+        for key in [key for key in live if key[0] not in scopes[best]]:
+            del live[key]
+        for node, name, param, setup in required[best]:
+            live[(node, name)] = (param, setup)
+            pending[(node, name, param)] -= 1
+
+    if logger:
+        before = fixture_setup_cost(tests, fixtures, setup_costs)
+        after = fixture_setup_cost(tests, fixtures, setup_costs, order)
+        logger.info(f"Fixture-aware scheduling (max displacement {max_displacement}): "
+                    f"{before['setups']} -> {after['setups']} shared fixture setups, "
+                    f"estimated setup cost {before['cost']:.3f} -> {after['cost']:.3f}")
+    return [tests[i] for i in order]
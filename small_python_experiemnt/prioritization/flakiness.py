@@ -0,0 +1,143 @@
+"""
+Flaky-test detection by rerunning failures.
+
+A failing test is rerun straight away in the same pytest session, a warm
+process whose modules are imported and whose module- and class-scoped
+fixtures are usually still set up, so a rerun costs little more than the
+test itself. A test that fails and then passes is flaky: it is reported as
+passed with ``flaky`` and ``reruns`` attributes on its reports, shown as
+FLAKY by pytest, and recorded in the history store with the outcome FLAKY
+instead of FAILED. A test that fails every attempt is a real failure.
+
+Reruns are bounded by a number of reruns per test and by an optional total
+time budget for the whole session.
+
+Usage:
+    python -m pytest -p prioritization.flakiness --flaky-reruns=2 --flaky-rerun-budget=30 tests/test_v1.py
+
+or ``run_tests(node_ids, reruns=2)`` from ``prioritization.runner``.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import pytest
+from _pytest.runner import runtestprotocol
+
+PLUGIN_NAME = "flaky-reruns"
+FLAKY_OUTCOME = "FLAKY"
+
+
+class RerunPlugin:
+    """Pytest plugin that reruns failing tests to tell flaky failures from real ones."""
+
+    def __init__(self, max_reruns: int = 2, budget: Optional[float] = None):
+        """
+        Args:
+            max_reruns: Maximum number of reruns per failing test
+            budget: Maximum total seconds spent on reruns (None for no limit)
+        """
+        self.max_reruns = max_reruns
+        self.budget = budget
+        self.spent = 0.0
+        # nodeid -> number of reruns, for tests that failed and then passed
+        self.flaky: Dict[str, int] = {}
+        # nodeid -> number of reruns, for tests that failed every attempt
+        self.failed: Dict[str, int] = {}
+
+    def _budget_left(self) -> bool:
+        return self.budget is None or self.spent < self.budget
+
+    def run(self, item, nextitem) -> List[pytest.TestReport]:
+        """
+        Run a test, rerunning it while it fails and the budget allows.
+
+        Returns:
+            The reports to log: those of the first passing attempt, or of the
+            first attempt if every attempt failed. Each has ``reruns`` and
+            ``flaky`` attributes.
+        """
+        reports = runtestprotocol(item, log=False, nextitem=nextitem)
+        reruns = 0
+        flaky = False
+        while any(report.failed for report in reports) and reruns < self.max_reruns and self._budget_left():
+            started = time.perf_counter()
+            retry = runtestprotocol(item, log=False, nextitem=nextitem)
+            self.spent += time.perf_counter() - started
+            reruns += 1
+            if not any(report.failed for report in retry):
+                reports, flaky = retry, True
+                break
+
+        for report in reports:
+            report.reruns = reruns
+            report.flaky = flaky
+        return reports
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+        for report in self.run(item, nextitem):
+            item.ihook.pytest_runtest_logreport(report=report)
+        item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+        return True
+
+    def pytest_runtest_logreport(self, report):
+        # Track outcomes here rather than in run(), so reports relayed from
+        # forked children are counted too
+        reruns = getattr(report, "reruns", 0)
+        if report.when != "teardown" or not reruns:
+            return
+        if getattr(report, "flaky", False):
+            self.flaky[report.nodeid] = reruns
+        else:
+            self.failed[report.nodeid] = reruns
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_report_teststatus(self, report, config):
+        if getattr(report, "flaky", False) and report.when == "call" and report.passed:
+            return "flaky", "R", ("FLAKY", {"yellow": True})
+        return None
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.flaky and not self.failed:
+            return
+        terminalreporter.section("flaky tests")
+        for nodeid, reruns in self.flaky.items():
+            terminalreporter.write_line(f"FLAKY {nodeid} (passed after {reruns} rerun{'s' if reruns != 1 else ''})")
+        for nodeid, reruns in self.failed.items():
+            terminalreporter.write_line(f"FAILED {nodeid} (failed {reruns + 1} attempts)")
+        budget = f" of {self.budget:.1f}s" if self.budget is not None else ""
+        terminalreporter.write_line(f"{self.spent:.3f}s{budget} spent on reruns")
+
+
+def find_rerun_plugin(config) -> Optional[RerunPlugin]:
+    """Return the session's RerunPlugin, however it was registered, or None."""
+    for plugin in config.pluginmanager.get_plugins():
+        if isinstance(plugin, RerunPlugin):
+            return plugin
+    return None
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("prioritization")
+    group.addoption(
+        "--flaky-reruns",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Rerun a failing test up to N times; a test that then passes is reported as FLAKY",
+    )
+    group.addoption(
+        "--flaky-rerun-budget",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Stop rerunning failures once reruns have taken SECONDS in total",
+    )
+
+
+def pytest_configure(config):
+    reruns = config.getoption("flaky_reruns")
+    if reruns > 0:
+        config.pluginmanager.register(RerunPlugin(reruns, config.getoption("flaky_rerun_budget")), PLUGIN_NAME)
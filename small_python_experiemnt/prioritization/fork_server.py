@@ -0,0 +1,195 @@
+"""
+Fork-server test execution.
+
+The pytest process imports pytest, the test modules and the system under
+test and collects every test once. It then acts as a fork server: for each
+test (or batch of tests) it ``fork()``s a child that runs only that work and
+exits. Children start from the parent's already-imported state, so a test
+costs a fork instead of an interpreter start, imports and collection, while
+state a test leaves behind (``Calculator.memory``, ``sys.path`` edits,
+monkeypatched modules) dies with its child.
+
+Children send their test reports back through a pipe, serialized with
+pytest's own ``pytest_report_to_serializable`` hook. The parent re-emits them
+through ``pytest_runtest_logreport``, so the terminal output, ``-x``,
+stopping policies, result events and the in-process runner's callbacks all
+behave as in a normal run. A child that dies without reporting (a crash,
+``os._exit`` or a signal) turns its unfinished tests into errors. With the
+flakiness plugin active, failing tests are rerun inside their child.
+
+Usage:
+    python -m pytest -p prioritization.fork_server --fork-server tests/test_v1.py
+    python -m pytest -p prioritization.fork_server --fork-server --fork-batch-size=8 tests/
+
+or ``run_tests(node_ids, fork=True)`` from ``prioritization.runner``.
+"""
+
+import os
+import json
+import signal
+from typing import Any, Dict, List
+
+import pytest
+from _pytest.runner import runtestprotocol
+
+from prioritization import flakiness
+
+
+class ForkServerPlugin:
+    """Pytest plugin that runs every test (or batch of tests) in a forked child."""
+
+    def __init__(self, batch_size: int = 1):
+        """
+        Args:
+            batch_size: Number of consecutive tests each child runs; tests
+                in a batch share module- and class-scoped fixtures
+        """
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The fork server needs os.fork(), which this platform does not provide")
+        self.batch_size = max(1, batch_size)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        # Same checks as pytest's own run loop
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(
+                f"{session.testsfailed} error{'s' if session.testsfailed != 1 else ''} during collection"
+            )
+        if session.config.option.collectonly:
+            return True
+
+        items = session.items
+        for start in range(0, len(items), self.batch_size):
+            self._run_batch(session, items[start:start + self.batch_size])
+            if session.shouldfail:
+                raise session.Failed(session.shouldfail)
+            if session.shouldstop:
+                raise session.Interrupted(session.shouldstop)
+        return True
+
+    def _run_batch(self, session, batch: List[Any]) -> None:
+        """Fork a child for a batch of items and relay its reports."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: never return into the parent's pytest session
+            os.close(read_fd)
+            status = 0
+            try:
+                self._child(batch, write_fd)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+
+        os.close(write_fd)
+        phases = self._relay(session, batch, read_fd, pid)
+        _, wait_status = os.waitpid(pid, 0)
+
+        unfinished = [item for item in batch if "teardown" not in phases.get(item.nodeid, ())]
+        if unfinished and not (session.shouldfail or session.shouldstop):
+            code = os.waitstatus_to_exitcode(wait_status)
+            reason = f"signal {-code}" if code < 0 else f"exit status {code}"
+            for item in unfinished:
+                self._report_crash(item, phases.get(item.nodeid), reason)
+
+    @staticmethod
+    def _child(batch: List[Any], write_fd: int) -> None:
+        """Run a batch and write one JSON line per phase report."""
+        reruns = flakiness.find_rerun_plugin(batch[0].config)
+        with os.fdopen(write_fd, 'w') as pipe:
+            for i, item in enumerate(batch):
+                pipe.write(json.dumps({"start": i}) + "\n")
+                pipe.flush()
+                nextitem = batch[i + 1] if i + 1 < len(batch) else None
+                # log=False: the parent logs the reports, so nothing is printed twice
+                if reruns is not None:
+                    reports = reruns.run(item, nextitem)
+                    # The rerun budget lives in the parent, which forks the next child
+                    pipe.write(json.dumps({"rerun_time": reruns.spent}) + "\n")
+                else:
+                    reports = runtestprotocol(item, log=False, nextitem=nextitem)
+                for report in reports:
+                    data = item.config.hook.pytest_report_to_serializable(config=item.config, report=report)
+                    pipe.write(json.dumps({"report": data}) + "\n")
+                    pipe.flush()
+
+    def _relay(self, session, batch: List[Any], read_fd: int, pid: int) -> Dict[str, set]:
+        """
+        Re-emit a child's reports in the parent as they arrive.
+
+        Returns:
+            Dictionary mapping each started item's node ID to the phases
+            reported for it ('teardown' once it finished)
+        """
+        config = session.config
+        by_id = {item.nodeid: item for item in batch}
+        phases: Dict[str, set] = {}
+        with os.fdopen(read_fd, 'r') as pipe:
+            for line in pipe:
+                message = json.loads(line)
+                if "start" in message:
+                    item = batch[message["start"]]
+                    phases[item.nodeid] = set()
+                    item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+                    continue
+                if "rerun_time" in message:
+                    flakiness.find_rerun_plugin(config).spent = message["rerun_time"]
+                    continue
+
+                report = config.hook.pytest_report_from_serializable(config=config, data=message["report"])
+                item = by_id[report.nodeid]
+                phases[report.nodeid].add(report.when)
+                item.ihook.pytest_runtest_logreport(report=report)
+                if report.when == "teardown":
+                    item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+                    if session.shouldfail or session.shouldstop:
+                        # Don't let the rest of the batch run past a requested stop
+                        os.kill(pid, signal.SIGKILL)
+                        break
+        return phases
+
+    @staticmethod
+    def _report_crash(item, reported, reason: str) -> None:
+        """
+        Report a test whose child died before finishing it as a failure.
+
+        Args:
+            item: The unfinished test item
+            reported: Phases the child reported for it, or None if it never started
+            reason: How the child exited
+        """
+        if reported is None:
+            item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+            reported = set()
+        keywords = {name: 1 for name in item.keywords}
+        when = "call" if "setup" in reported else "setup"
+        for phase, outcome, longrepr in (
+            (when, "failed", f"Fork-server child running {item.nodeid} died ({reason})"),
+            ("teardown", "passed", None),
+        ):
+            report = pytest.TestReport(item.nodeid, item.location, keywords, outcome, longrepr, phase)
+            item.ihook.pytest_runtest_logreport(report=report)
+        item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("prioritization")
+    group.addoption(
+        "--fork-server",
+        action="store_true",
+        default=False,
+        help="Run each test in a child forked from the collected session",
+    )
+    group.addoption(
+        "--fork-batch-size",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of consecutive tests each forked child runs (default: 1)",
+    )
+
+
+def pytest_configure(config):
+    if config.getoption("fork_server"):
+        config.pluginmanager.register(ForkServerPlugin(config.getoption("fork_batch_size")), "fork-server")
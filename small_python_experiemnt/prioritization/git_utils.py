@@ -0,0 +1,86 @@
+"""
+Helpers for asking git about the code under test.
+"""
+
+import re
+import subprocess
+from typing import Any, Dict, List, Optional
+
+# A unified diff hunk header, e.g. '@@ -17,3 +24,3 @@ def divide(self, a, b):'
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+DIFF_HEADER = re.compile(r"^diff --git a/(.*) b/(.*)$")
+
+
+def current_commit(repo_dir: str = ".") -> str:
+    """Return the checked-out git commit, or 'working-tree' outside a git repository."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "working-tree"
+
+
+def ancestors(revision: str = "HEAD", repo_dir: str = ".") -> List[str]:
+    """Return a revision and every commit it descends from, nearest first (empty outside a git repository)."""
+    try:
+        output = subprocess.run(["git", "rev-list", revision], cwd=repo_dir, capture_output=True,
+                                text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    return output.split()
+
+
+def diff_files(base: str, head: Optional[str] = None, repo_dir: str = ".") -> List[Dict[str, Any]]:
+    """
+    List the files changed between two revisions and the lines changed in each.
+
+    Only changes under repo_dir are included, with paths relative to it.
+
+    Args:
+        base: Revision to diff from, e.g. 'HEAD~1' or 'origin/main'
+        head: Revision to diff to (defaults to the working tree)
+        repo_dir: Directory inside the repository to diff
+
+    Returns:
+        One dictionary per changed file with old_path and new_path (None
+        for an added or deleted file), old_lines and new_lines (sets of
+        changed line numbers on each side) and binary
+    """
+    args = ["git", "diff", "--unified=0", "--no-color", "--no-ext-diff", "--relative", "-M", base]
+    if head:
+        args.append(head)
+    output = subprocess.run(args, cwd=repo_dir, capture_output=True, text=True, check=True).stdout
+
+    files = []
+    current = None
+    for line in output.splitlines():
+        header = DIFF_HEADER.match(line)
+        if header:
+            current = {"old_path": header.group(1), "new_path": header.group(2),
+                       "old_lines": set(), "new_lines": set(), "binary": False}
+            files.append(current)
+        elif current is None:
+            continue
+        elif line.startswith("--- "):
+            current["old_path"] = None if line == "--- /dev/null" else line[6:].rstrip("\t")
+        elif line.startswith("+++ "):
+            current["new_path"] = None if line == "+++ /dev/null" else line[6:].rstrip("\t")
+        elif line.startswith("Binary files "):
+            current["binary"] = True
+        else:
+            hunk = HUNK_HEADER.match(line)
+            if hunk:
+                old_start, old_count, new_start, new_count = hunk.groups()
+                old_start, new_start = int(old_start), int(new_start)
+                current["old_lines"].update(range(old_start, old_start + int(old_count or 1)))
+                current["new_lines"].update(range(new_start, new_start + int(new_count or 1)))
+    return files
+
+
+def show_file(revision: str, path: str, repo_dir: str = ".") -> Optional[str]:
+    """Return a file's contents at a revision (path relative to repo_dir), or None if it did not exist."""
+    try:
+        return subprocess.run(["git", "show", f"{revision}:./{path}"], cwd=repo_dir, capture_output=True,
+                              text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,271 @@
+"""
+SQLite-backed test execution history.
+
+Every run appends one row per test to an embedded SQLite database, so
+failure-based prioritization can look back over many runs instead of the
+single snapshot in ``test_results.json``:
+
+    runs(run_id, commit, started_at)
+    results(run_id, test, outcome, duration, timestamp)
+
+``test`` is the pytest node ID and ``outcome`` is PASSED, FAILED, SKIPPED
+or ERROR, as in the runner results, or FLAKY for a test that failed and
+then passed when rerun (see prioritization.flakiness); FLAKY does not count
+as a failure. Inserts are batched into one
+transaction per run, and each statistic is a single grouped query over
+every test at once rather than a query per test.
+
+Usage:
+    history = HistoryStore("test_history.db")
+    history.record_run(results, commit=current_commit())
+    history.failure_rates(last_runs=50)
+    history.last_failure_age()
+    history.mean_durations()
+    history.flip_rates()
+"""
+
+import time
+import bisect
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+FAILED_SQL = "('FAILED', 'ERROR')"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    commit_id TEXT,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    test TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    duration REAL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_test ON results (test, run_id);
+CREATE INDEX IF NOT EXISTS results_by_run ON results (run_id);
+"""
+
+
+def is_history_db(path: str) -> bool:
+    """Return whether a failure history path refers to a SQLite history store."""
+    return path.endswith((".db", ".sqlite", ".sqlite3"))
+
+
+class HistoryStore:
+    """Test outcomes from every recorded run, stored in SQLite."""
+
+    def __init__(self, path: str = "test_history.db", batch_size: int = 5000):
+        """
+        Args:
+            path: Database file (created if missing); ':memory:' for a throwaway store
+            batch_size: Number of rows sent to SQLite per executemany call
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(path)
+        if path != ":memory:":
+            # Readers don't block the writer, and commits need no full fsync
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def record_run(self, results: Iterable[Dict[str, Any]], commit: Optional[str] = None,
+                   timestamp: Optional[float] = None) -> int:
+        """
+        Record the results of one test run.
+
+        Args:
+            results: Runner result dictionaries (nodeid, status, duration and
+                flaky) or dictionaries with test, outcome and duration keys
+            commit: Commit the run tested
+            timestamp: When the run happened (defaults to now)
+
+        Returns:
+            The new run's run_id
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.conn:
+            run_id = self.conn.execute(
+                "INSERT INTO runs (commit_id, started_at) VALUES (?, ?)", (commit, timestamp)
+            ).lastrowid
+            batch = []
+            for result in results:
+                batch.append((
+                    run_id,
+                    result.get("nodeid", result.get("test")),
+                    "FLAKY" if result.get("flaky") else result.get("status", result.get("outcome")),
+                    result.get("duration"),
+                    timestamp,
+                ))
+                if len(batch) >= self.batch_size:
+                    self._insert(batch)
+                    batch = []
+            if batch:
+                self._insert(batch)
+        return run_id
+
+    def _insert(self, rows: List[tuple]) -> None:
+        self.conn.executemany(
+            "INSERT INTO results (run_id, test, outcome, duration, timestamp) VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+    def import_snapshot(self, snapshot: Dict[str, str], commit: Optional[str] = None,
+                        timestamp: Optional[float] = None) -> int:
+        """
+        Record a legacy test_results.json snapshot ({test: 'PASS'|'FAIL'|'FLAKY'}) as a run.
+
+        Returns:
+            The new run's run_id
+        """
+        outcomes = {"FAIL": "FAILED", "FLAKY": "FLAKY"}
+        return self.record_run(
+            ({"test": test, "outcome": outcomes.get(result, "PASSED")}
+             for test, result in snapshot.items()),
+            commit=commit, timestamp=timestamp,
+        )
+
+    def _window(self, last_runs: Optional[int]):
+        """SQL condition and parameters restricting results to the most recent runs."""
+        if not last_runs:
+            return "1", ()
+        return "run_id > (SELECT COALESCE(MAX(run_id), 0) FROM runs) - ?", (last_runs,)
+
+    def run_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def failure_rates(self, last_runs: Optional[int] = None) -> Dict[str, float]:
+        """
+        Return the fraction of runs in which each test failed.
+
+        Args:
+            last_runs: Only consider this many most recent runs (default: all)
+
+        Returns:
+            Dictionary mapping tests to failure rates between 0 and 1
+        """
+        where, params = self._window(last_runs)
+        rows = self.conn.execute(
+            f"SELECT test, AVG(outcome IN {FAILED_SQL}) FROM results WHERE {where} GROUP BY test",
+            params,
+        )
+        return dict(rows)
+
+    def last_failure_age(self, now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Return the seconds since each test last failed (tests that never failed are absent).
+
+        Args:
+            now: Reference time (defaults to now)
+        """
+        now = time.time() if now is None else now
+        rows = self.conn.execute(
+            f"SELECT test, ? - MAX(timestamp) FROM results WHERE outcome IN {FAILED_SQL} GROUP BY test",
+            (now,),
+        )
+        return dict(rows)
+
+    def runs_since_failure(self) -> Dict[str, int]:
+        """Return how many runs ago each test last failed (0 = the latest run)."""
+        run_ids = [run_id for (run_id,) in self.conn.execute("SELECT run_id FROM runs ORDER BY run_id")]
+        rows = self.conn.execute(
+            f"SELECT test, MAX(run_id) FROM results WHERE outcome IN {FAILED_SQL} GROUP BY test"
+        )
+        return {test: len(run_ids) - bisect.bisect_right(run_ids, run_id) for test, run_id in rows}
+
+    def mean_durations(self, last_runs: Optional[int] = None) -> Dict[str, float]:
+        """Return each test's mean recorded duration in seconds."""
+        where, params = self._window(last_runs)
+        rows = self.conn.execute(
+            f"SELECT test, AVG(duration) FROM results WHERE {where} AND duration IS NOT NULL GROUP BY test",
+            params,
+        )
+        return dict(rows)
+
+    def flip_rates(self, last_runs: Optional[int] = None) -> Dict[str, float]:
+        """
+        Return how often each test's result flips, as a fraction of its runs.
+
+        A run counts as a flip when the test was FLAKY in it, or when it
+        failed and the test's previous run passed (or the other way round).
+
+        Args:
+            last_runs: Only consider this many most recent runs (default: all)
+
+        Returns:
+            Dictionary mapping tests to flip rates between 0 and 1
+        """
+        where, params = self._window(last_runs)
+        rows = self.conn.execute(
+            f"""
+            SELECT test,
+                   AVG(outcome = 'FLAKY' OR (previous IS NOT NULL
+                       AND (outcome IN {FAILED_SQL}) != (previous IN {FAILED_SQL})))
+            FROM (
+                SELECT test, outcome, LAG(outcome) OVER (PARTITION BY test ORDER BY run_id) AS previous
+                FROM results WHERE {where}
+            )
+            GROUP BY test
+            """,
+            params,
+        )
+        return dict(rows)
+
+    def flaky_tests(self, last_runs: Optional[int] = None) -> List[str]:
+        """Return the tests that were FLAKY in at least one of the considered runs."""
+        where, params = self._window(last_runs)
+        rows = self.conn.execute(
+            f"SELECT DISTINCT test FROM results WHERE {where} AND outcome = 'FLAKY' ORDER BY test", params
+        )
+        return [test for (test,) in rows]
+
+    def test_stats(self, last_runs: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Return failure rate, failure count, run count, mean duration and the
+        timestamp of the last failure for every test, in one query.
+        """
+        where, params = self._window(last_runs)
+        rows = self.conn.execute(
+            f"""
+            SELECT test,
+                   COUNT(*),
+                   SUM(outcome IN {FAILED_SQL}),
+                   AVG(duration),
+                   MAX(CASE WHEN outcome IN {FAILED_SQL} THEN timestamp END)
+            FROM results WHERE {where} GROUP BY test
+            """,
+            params,
+        )
+        return {
+            test: {
+                "runs": runs,
+                "failures": failures,
+                "failure_rate": failures / runs,
+                "mean_duration": mean_duration,
+                "last_failure": last_failure,
+            }
+            for test, runs, failures, mean_duration, last_failure in rows
+        }
+
+    def iter_results(self, since_run: int = 0) -> Iterable[tuple]:
+        """
+        Stream (run_id, test, outcome, duration, timestamp) rows in run order.
+
+        Args:
+            since_run: Only rows from runs after this run_id
+        """
+        return self.conn.execute(
+            "SELECT run_id, test, outcome, duration, timestamp FROM results "
+            "WHERE run_id > ? ORDER BY run_id", (since_run,)
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "HistoryStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
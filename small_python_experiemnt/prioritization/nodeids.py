@@ -0,0 +1,93 @@
+"""
+Helpers for working with pytest node IDs.
+
+A node ID looks like ``tests/test_calculator.py::TestCalculator::test_add[v1]``:
+the file path, the class and function names, and an optional parametrization
+ID in square brackets. The prioritization methods identify tests by
+``full_name`` (``TestCalculator::test_add``), so these helpers convert between
+the two forms.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+
+def split_nodeid(nodeid: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Split a node ID into its file path, name and parametrization ID.
+
+    Args:
+        nodeid: Node ID such as 'tests/test_calculator.py::TestCalculator::test_add[v1]'
+
+    Returns:
+        Tuple of (path, full_name, param_id), e.g.
+        ('tests/test_calculator.py', 'TestCalculator::test_add', 'v1')
+    """
+    path, _, name = nodeid.partition("::")
+    if not path.endswith(".py"):
+        # Already a bare full name such as 'TestCalculator::test_add'
+        path, name = "", nodeid
+    param_id = None
+    if name.endswith("]") and "[" in name:
+        name, _, param_id = name[:-1].partition("[")
+    return path, name, param_id
+
+
+def strip_params(nodeid: str) -> str:
+    """Return the node ID without its parametrization suffix."""
+    if nodeid.endswith("]") and "[" in nodeid:
+        return nodeid[:nodeid.index("[")]
+    return nodeid
+
+
+def full_name(nodeid: str) -> str:
+    """Return the 'Class::method' name used by the prioritization methods."""
+    return split_nodeid(nodeid)[1]
+
+
+def method_name(nodeid: str) -> str:
+    """Return the bare test function name, e.g. 'test_add'."""
+    return full_name(nodeid).split("::")[-1]
+
+
+def param_id(nodeid: str) -> Optional[str]:
+    """Return the parametrization ID (e.g. 'v1'), or None if the test is not parametrized."""
+    return split_nodeid(nodeid)[2]
+
+
+def expand_node_ids(node_ids: Iterable[str], collected: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Match requested node IDs against the collected ones.
+
+    An exact match wins; otherwise an ID without a parametrization suffix
+    selects every parametrized instance of that test, and a file or class
+    ID (e.g. 'tests/test_v1.py') selects every test inside it.
+
+    Args:
+        node_ids: Requested node IDs, in order
+        collected: Node IDs of the collected items, in collection order
+
+    Returns:
+        Tuple of (the collected node IDs selected, in requested order and
+        each once, requested node IDs that selected nothing)
+    """
+    collected = list(collected)
+    exact = set(collected)
+    by_base = {}
+    for nodeid in collected:
+        by_base.setdefault(strip_params(nodeid), []).append(nodeid)
+
+    selected: List[str] = []
+    seen = set()
+    missing: List[str] = []
+    for node_id in node_ids:
+        matches = [node_id] if node_id in exact else by_base.get(node_id)
+        if matches is None:
+            prefix = node_id + "::"
+            matches = [nodeid for nodeid in collected if nodeid.startswith(prefix)]
+        if not matches:
+            missing.append(node_id)
+        for nodeid in matches:
+            if nodeid not in seen:
+                seen.add(nodeid)
+                selected.append(nodeid)
+    return selected, missing
@@ -1,57 +1,212 @@
 import os
 import sys
+import shlex
 import argparse
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 # Add parent directory to path so we can import the utils module
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 
 from prioritization.utils import get_all_tests, evaluate_fault_detection_efficiency
 from prioritization.logging_utils import setup_logging
+from prioritization.evaluation_utils import save_prioritized_order
 from prioritization.prioritization_methods import (
     random_prioritization,
     semantic_prioritization,
     previous_failure_prioritization,
     submod_ordering,
+    coverage_submod_ordering,
+    record_function_history,
 )
+from prioritization.selection import select_tests, diff_revisions, diff_directories, map_changes
+from prioritization.discovery import default_rootdir
+from prioritization.discovery_cache import CACHE_FILE
+from prioritization.fixture_scheduling import shared_fixtures, measured_setup_costs, schedule_by_fixtures
 
-def create_test_bash_script(prioritized_tests: List[Dict[str, Any]], output_file: str, logger, version:str = "v1"):
-    """Create a bash script to run tests in prioritized order using pytest."""
+def create_test_bash_script(prioritized_tests: List[Dict[str, Any]], output_file: str, logger, version:str = "v1",
+                            order_file: str = "prioritized_tests.json", stop_options: Dict[str, Any] = None,
+                            events_file: str = "test_events.jsonl", reruns: int = 0,
+                            after_run: Optional[List[str]] = None):
+    """
+    Create a bash script that runs tests in prioritized order using pytest.
+    
+    The order is saved to order_file and enforced by the order_plugin pytest
+    plugin, so the script starts pytest once instead of once per test. Results
+    are written to events_file as JSON lines by the result_events plugin, so
+    the console output stays quiet apart from failures.
+    stop_options maps order_plugin stopping options (e.g. 'max-failures',
+    'time-budget') to values; options set to None are left out.
+    With reruns, failing tests are rerun up to that many times by the
+    flakiness plugin and tests that then pass are reported as FLAKY.
+    after_run lists commands run once the tests have run (whatever their
+    outcome); the script still exits with pytest's status.
+    """
     logger.info(f"Creating bash script: {output_file}")
     
+    save_prioritized_order(prioritized_tests, order_file, logger)
+    
     with open(output_file, "w") as f:
         f.write("#!/bin/bash\n\n")
         f.write("# This script was auto-generated to run tests in prioritized order\n\n")
         
-        for test in prioritized_tests:
-            test_name = test.get('method_name', '')
-            test_file = test.get('file_path', '')
-            class_name = test.get('class_name', '')
-            
-            # Format the pytest command exactly as requested
-            command = f'pytest tests/test_calculator.py::{class_name}::{test_name} -v -k "{version}"'
-            
-            f.write(f"{command}\n")
+        # Single pytest session, reordered by the plugin
+        command = (f'python -m pytest -p prioritization.order_plugin --priority-order={order_file} '
+                   f'-p prioritization.result_events --result-events={events_file} ')
+        for option, value in (stop_options or {}).items():
+            if value is not None:
+                command += f'--priority-{option}={value} '
+        if reruns:
+            command += f'-p prioritization.flakiness --flaky-reruns={reruns} '
+        command += f'tests/test_calculator.py -q -k "{version}"'
+        
+        f.write(f"{command}\n")
+        if after_run:
+            f.write("status=$?\n")
+            for after in after_run:
+                f.write(f"{after}\n")
+            f.write("exit $status\n")
     
     # Make the script executable
     os.chmod(output_file, 0o755)
     logger.info(f"Bash script {output_file} created successfully and made executable.")
 
+def prioritize_tests(method: str, logger=None, test_dir: str = None,
+                     failure_history: str = "test_results.json", source_dir: str = "v1",
+                     coverage_store: str = "coverage_store",
+                     changes: Optional[List[Dict[str, Any]]] = None,
+                     function_history: Optional[str] = None,
+                     embedding_cache: Optional[str] = None, items: bool = False,
+                     max_displacement: Optional[int] = None,
+                     setup_events: Optional[str] = None,
+                     complexity: bool = False) -> List[Dict[str, Any]]:
+    """
+    Discover the test suite and order it with the given prioritization method.
+    
+    Args:
+        method: One of 'random', 'semantic', 'failure', 'submod' or 'coverage'
+        logger: Logger instance for tracking execution
+        test_dir: Directory containing test files (defaults to the project's tests/)
+        failure_history: JSON snapshot or SQLite history store (.db) with test
+            failure history (for 'failure')
+        source_dir: Directory containing source code (for 'submod')
+        coverage_store: Coverage store directory (for 'coverage', and for
+            selecting tests by coverage when changes are given)
+        changes: Optional changes from selection.diff_revisions or
+            selection.diff_directories; only the tests they affect are
+            prioritized (all tests if a change cannot be mapped), and 'submod'
+            weights the changed functions
+        function_history: Optional JSON file of function fingerprints kept
+            across runs, so 'submod' can weight functions by change and churn
+        embedding_cache: Optional .npz cache of function embeddings (for 'submod')
+        items: Order pytest items (each parametrized instance, by node ID)
+            instead of test functions
+        max_displacement: If given, reorder the prioritized tests so that
+            tests sharing class- or module-scoped fixtures run together,
+            moving no test more than this many positions
+            (see fixture_scheduling)
+        setup_events: Optional result events file of an earlier run, whose
+            setup durations give the fixtures' setup costs
+        complexity: Also weight source functions by cyclomatic complexity
+            (for 'submod')
+        
+    Returns:
+        List of test dictionaries in prioritized order
+    """
+    if test_dir is None:
+        test_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../tests"))
+    
+    tests = get_all_tests(test_dir, logger=logger, items=items)
+    if logger:
+        logger.info(f"Found {len(tests)} tests in {test_dir}")
+    if not tests:
+        return []
+    
+    if changes is not None:
+        tests = select_tests(tests, changes, test_dir, [source_dir], coverage_store, logger)["selected"]
+        if not tests:
+            return []
+    
+    if method == "random":
+        prioritized = random_prioritization(tests, logger)
+    elif method == "semantic":
+        prioritized = semantic_prioritization(tests, logger)
+    elif method == "failure":
+        prioritized = previous_failure_prioritization(tests, failure_history, logger)
+    elif method == "submod":
+        changed_functions = map_changes(changes)["functions"] if changes is not None else None
+        prioritized = submod_ordering(tests, source_dir, logger, changed_functions=changed_functions,
+                                      history_file=function_history, embedding_cache=embedding_cache,
+                                      complexity=complexity)
+    elif method == "coverage":
+        prioritized = coverage_submod_ordering(tests, coverage_store, logger=logger)
+    else:
+        raise ValueError(f"Unknown prioritization method: {method}")
+    
+    if max_displacement:
+        fixtures = shared_fixtures(prioritized, default_rootdir([test_dir]), os.path.join(test_dir, CACHE_FILE),
+                                   logger)
+        setup_costs = None
+        if setup_events and os.path.exists(setup_events):
+            setup_costs = measured_setup_costs(setup_events, prioritized, fixtures)
+        prioritized = schedule_by_fixtures(prioritized, fixtures, setup_costs, max_displacement, logger)
+    return prioritized
+
 def main():
     """Main function to generate a bash script for running prioritized tests."""
     parser = argparse.ArgumentParser(description="Generate bash script for test prioritization")
     parser.add_argument("--test-dir", default="../tests", 
                         help="Directory containing test files")
-    parser.add_argument("--method", choices=["random", "semantic", "failure", "submod"], 
+    parser.add_argument("--method", choices=["random", "semantic", "failure", "submod", "coverage"], 
                         default="random", help="Prioritization method to use")
     parser.add_argument("--failure-history", default="../test_results.json",
-                       help="JSON file containing test failure history")
+                       help="JSON snapshot or SQLite history store (.db) containing test failure history")
     parser.add_argument("--seed", type=int, help="Random seed for reproducibility")
+    parser.add_argument("--items", action="store_true",
+                        help="Order every pytest item (e.g. test_add[v0] and test_add[v1]) by node ID "
+                             "instead of test functions")
+    parser.add_argument("--group-fixtures", type=int, metavar="N",
+                        help="Run tests sharing class- or module-scoped fixtures together, moving no test "
+                             "more than N positions from its priority rank")
+    parser.add_argument("--setup-events", metavar="FILE",
+                        help="Result events of an earlier run (see --events-output); their setup "
+                             "durations give the fixture costs for --group-fixtures")
+    parser.add_argument("--changed-since", metavar="REV",
+                        help="Only prioritize tests affected by changes since this git revision")
+    parser.add_argument("--diff-dirs", nargs=2, metavar=("OLD", "NEW"),
+                        help="Only prioritize tests affected by the differences between two source directories")
     parser.add_argument("--source-dir", default="../v1",
                        help="Directory containing source code (for submod method)")
+    parser.add_argument("--function-history", metavar="FILE",
+                        help="JSON file of function fingerprints kept across runs; submod weights "
+                             "functions that changed since the last run and by how often they change. "
+                             "The generated script records the new fingerprints after the tests ran")
+    parser.add_argument("--record-function-history", action="store_true",
+                        help="Only record the current fingerprints of --source-dir in --function-history "
+                             "and exit")
+    parser.add_argument("--complexity-weights", action="store_true",
+                        help="Also weight source functions by cyclomatic complexity (for submod method)")
+    parser.add_argument("--embedding-cache", metavar="FILE.npz",
+                        help="Cache of function embeddings keyed by fingerprint (for submod method)")
+    parser.add_argument("--coverage-store", default="coverage_store",
+                        help="Coverage store directory (for coverage method)")
     parser.add_argument("--bash-output", default="run_prioritized_tests.sh",
                         help="Output file for the bash script (default: run_prioritized_tests.sh)")
+    parser.add_argument("--order-output", default="prioritized_tests.json",
+                        help="JSON file the bash script reads the test order from (default: prioritized_tests.json)")
+    parser.add_argument("--events-output", default="test_events.jsonl",
+                        help="JSONL file the bash script writes test results to (default: test_events.jsonl)")
+    parser.add_argument("--fail-fast", action="store_true",
+                        help="Make the script stop at the first failing test")
+    parser.add_argument("--max-failures", type=int,
+                        help="Make the script stop after this many distinct failing tests")
+    parser.add_argument("--time-budget", type=float,
+                        help="Make the script stop starting tests after this many seconds")
+    parser.add_argument("--min-failure-probability", type=float,
+                        help="Make the script stop once no remaining test has at least this "
+                             "historical failure probability (uses --failure-history)")
+    parser.add_argument("--reruns", type=int, default=0,
+                        help="Make the script rerun failing tests up to this many times to detect flaky tests")
     parser.add_argument("--log-level", default="INFO", 
                         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         help="Set the logging level")
@@ -72,6 +227,12 @@ def main():
     logger.info("===== Bash Script Generator Started =====")
     logger.info(f"Current working directory: {os.getcwd()}")
     
+    if args.record_function_history:
+        if not args.function_history:
+            parser.error("--record-function-history needs --function-history")
+        record_function_history(args.source_dir, args.function_history, logger)
+        return
+
     # Set random seed if provided
     if args.seed is not None:
         random.seed(args.seed)
@@ -81,25 +242,28 @@ def main():
     test_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), args.test_dir))
     logger.info(f"Test directory: {test_dir}")
     
-    # Get all tests with semantic features
+    # Get all tests with semantic features and apply the selected method
     logger.info("Retrieving and analyzing test files...")
-    tests = get_all_tests(test_dir)
+    changes = None
+    if args.changed_since:
+        changes = diff_revisions(args.changed_since)
+    elif args.diff_dirs:
+        changes = diff_directories(*args.diff_dirs)
+    prioritized_tests = prioritize_tests(args.method, logger, test_dir=test_dir,
+                                         failure_history=args.failure_history, source_dir=args.source_dir,
+                                         coverage_store=args.coverage_store, changes=changes,
+                                         function_history=args.function_history,
+                                         embedding_cache=args.embedding_cache, items=args.items,
+                                         max_displacement=args.group_fixtures,
+                                         setup_events=args.setup_events,
+                                         complexity=args.complexity_weights)
     
-    if not tests:
-        logger.error(f"No tests found in {test_dir}")
+    if not prioritized_tests:
+        if changes is not None:
+            logger.info("No tests are affected by the changes")
+        else:
+            logger.error(f"No tests found in {test_dir}")
         return
-    
-    logger.info(f"Found {len(tests)} tests")
-    
-    # Apply selected prioritization method
-    if args.method == "random":
-        prioritized_tests = random_prioritization(tests, logger)
-    elif args.method == "semantic":
-        prioritized_tests = semantic_prioritization(tests, logger)
-    elif args.method == "failure":
-        prioritized_tests = previous_failure_prioritization(tests, args.failure_history, logger)
-    elif args.method == "submod":
-        prioritized_tests = submod_ordering(tests, args.source_dir, logger)
 
     # Evaluate APFD and other metrics
     logger.info("Calculating APFD and other fault detection metrics...")
@@ -108,7 +272,22 @@ def main():
     logger.info(f"APFD Score: {apfd_score:.4f}")
 
     # Generate bash script
-    create_test_bash_script(prioritized_tests, args.bash_output, logger)
+    stop_options = {
+        "max-failures": 1 if args.fail_fast else args.max_failures,
+        "time-budget": args.time_budget,
+        "min-failure-probability": args.min_failure_probability,
+    }
+    if args.min_failure_probability is not None:
+        stop_options["history"] = args.failure_history
+    after_run = []
+    if args.method == "submod" and args.function_history:
+        # The history moves on only once this ordering has actually been run
+        after_run.append(f"python -m prioritization.order --method submod --record-function-history "
+                         f"--source-dir {shlex.quote(os.path.abspath(args.source_dir))} "
+                         f"--function-history {shlex.quote(os.path.abspath(args.function_history))}")
+    create_test_bash_script(prioritized_tests, args.bash_output, logger, order_file=args.order_output,
+                            stop_options=stop_options, events_file=args.events_output, reruns=args.reruns,
+                            after_run=after_run)
     logger.info(f"To run tests in prioritized order, execute: bash {args.bash_output}")
     
     logger.info("===== Bash Script Generator Completed =====")
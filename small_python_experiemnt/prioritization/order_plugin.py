@@ -0,0 +1,137 @@
+"""
+Pytest plugin that runs collected tests in a prioritized order.
+
+The order file is the JSON list written by
+``evaluation_utils.save_prioritized_order``, e.g.
+``["TestCalculator::test_divide", "TestCalculator::test_power[v1]", ...]``.
+Entries may be full node IDs, ``Class::method`` names, or either form with a
+parametrization suffix such as ``[v1]``. An entry without a suffix applies to
+every parametrized instance of the test. Tests missing from the file run
+last, in their collected order.
+
+The run can also stop early (see prioritization.stopping): after a number
+of distinct failing tests, after a wall-clock budget, or once no remaining
+test's historical failure probability reaches a threshold. The tests that
+were not run are listed in the terminal summary.
+
+Usage:
+    python -m pytest -p prioritization.order_plugin --priority-order=prioritized_tests.json tests/
+    python -m pytest -p prioritization.order_plugin --priority-order=prioritized_tests.json \
+        --priority-max-failures=1 --priority-time-budget=30 tests/
+"""
+
+import json
+from typing import Dict, List
+
+import pytest
+
+from prioritization.nodeids import split_nodeid, strip_params
+from prioritization.stopping import StoppingPlugin, build_stopping_policy
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("prioritization")
+    group.addoption(
+        "--priority-order",
+        metavar="FILE",
+        default=None,
+        help="JSON file listing tests in the order they should run",
+    )
+    group.addoption(
+        "--priority-max-failures",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Stop after N distinct failing tests (1 stops at the first failure)",
+    )
+    group.addoption(
+        "--priority-time-budget",
+        metavar="SECONDS",
+        type=float,
+        default=None,
+        help="Stop starting new tests after SECONDS of wall-clock time",
+    )
+    group.addoption(
+        "--priority-min-failure-probability",
+        metavar="P",
+        type=float,
+        default=None,
+        help="Stop once no remaining test has a historical failure probability of at least P",
+    )
+    group.addoption(
+        "--priority-history",
+        metavar="FILE",
+        default="test_results.json",
+        help="Failure history used by --priority-min-failure-probability",
+    )
+
+
+def pytest_configure(config):
+    policy = build_stopping_policy(
+        max_failures=config.getoption("priority_max_failures"),
+        time_budget=config.getoption("priority_time_budget"),
+        min_failure_probability=config.getoption("priority_min_failure_probability"),
+        failure_history=config.getoption("priority_history"),
+    )
+    if policy is not None:
+        config.pluginmanager.register(StoppingPlugin(policy), "priority-stopping")
+
+
+def load_priority_order(path: str) -> List[str]:
+    """
+    Load a prioritized order file.
+
+    Args:
+        path: Path to a JSON list of test names or node IDs
+
+    Returns:
+        List of test names in priority order
+    """
+    with open(path, 'r') as f:
+        order = json.load(f)
+
+    # Tolerate a list of test dictionaries as well as plain names
+    return [entry['full_name'] if isinstance(entry, dict) else entry for entry in order]
+
+
+def priority_keys(nodeid: str) -> List[str]:
+    """Return every order-file spelling that can refer to the given node ID, most specific first."""
+    _, name, param = split_nodeid(nodeid)
+    keys = [nodeid]
+    if param is not None:
+        keys.append(f"{name}[{param}]")
+        keys.append(strip_params(nodeid))
+    keys.append(name)
+    return keys
+
+
+def rank_items(items: List[pytest.Item], order: List[str]) -> None:
+    """
+    Sort items in place by their position in the order list.
+
+    Args:
+        items: Collected pytest items
+        order: Test names in priority order
+    """
+    ranks: Dict[str, int] = {}
+    for rank, name in enumerate(order):
+        ranks.setdefault(name, rank)
+
+    unranked = len(order)
+
+    def item_rank(item):
+        for key in priority_keys(item.nodeid):
+            if key in ranks:
+                return ranks[key]
+        return unranked
+
+    # sort() is stable, so parametrized instances keep their collected order
+    items.sort(key=item_rank)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    order_file = config.getoption("priority_order")
+    if not order_file:
+        return
+    rank_items(items, load_priority_order(order_file))
@@ -0,0 +1,299 @@
+"""
+Order-preserving parallel test executor.
+
+A pool of persistent pytest worker processes each collects the test files
+once and then waits for work. Tests are handed out in priority order: the
+executor keeps a single queue sorted by rank and whichever worker goes idle
+first takes the next task from the front.
+
+A task is a batch of consecutive tests (in priority order) from the same
+module, at most ``batch_size`` long. The worker runs each test knowing the
+next one of its batch, so pytest keeps class-, module- and session-scoped
+fixtures alive between them instead of tearing everything down after every
+test; fixtures are only torn down at the end of a batch.
+
+Every result records both its priority rank and when it completed, so APFD
+can be scored against either the planned sequence or the order in which
+failures actually became visible (see ``sequence_results`` and
+``APFDCalculator.process_outcomes``).
+"""
+
+import io
+import time
+import queue
+import contextlib
+import multiprocessing
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pytest
+
+from prioritization.nodeids import expand_node_ids
+from prioritization.stopping import StoppingPolicy
+
+ResultCallback = Callable[[Dict[str, Any]], None]
+
+DEFAULT_BATCH_SIZE = 8
+
+
+class _WorkerPlugin:
+    """Replaces pytest's run loop with one that runs tests pulled from a queue."""
+
+    def __init__(self, worker_id: int, tasks, results):
+        self.worker_id = worker_id
+        self.tasks = tasks
+        self.results = results
+        self._current: Optional[Dict[str, Any]] = None
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        items = {item.nodeid: item for item in session.items}
+        self.results.put(("ready", self.worker_id, list(items)))
+
+        while True:
+            batch = self.tasks.get()
+            if batch is None:
+                break
+            for i, (rank, node_id) in enumerate(batch):
+                following = items.get(batch[i + 1][1]) if i + 1 < len(batch) else None
+                self._run(items.get(node_id), rank, node_id, following)
+        return True
+
+    def _run(self, item, rank: int, node_id: str, nextitem) -> None:
+        """Run one test; pytest tears down the fixtures nextitem does not share."""
+        self._current = {
+            "nodeid": node_id,
+            "rank": rank,
+            "worker": self.worker_id,
+            "status": "PASSED",
+            "duration": 0.0,
+            "output": "",
+            "reruns": 0,
+            "flaky": False,
+            "started_at": time.monotonic(),
+        }
+        if item is None:
+            self._current.update(status="ERROR", output=f"{node_id} was not collected")
+            self._finish()
+            return
+        item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+
+    def pytest_runtest_logreport(self, report):
+        result = self._current
+        if result is None:
+            return
+        result["duration"] += report.duration
+        result["reruns"] = getattr(report, "reruns", 0)
+        result["flaky"] = getattr(report, "flaky", False)
+        if report.failed and result["status"] == "PASSED":
+            result["status"] = "FAILED" if report.when == "call" else "ERROR"
+            result["output"] = report.longreprtext
+        elif report.skipped and result["status"] == "PASSED":
+            result["status"] = "SKIPPED"
+        if report.when == "teardown":
+            self._finish()
+
+    def _finish(self) -> None:
+        self._current["completed_at"] = time.monotonic()
+        self.results.put(("result", self.worker_id, self._current))
+        self._current = None
+
+
+def _worker_main(worker_id: int, paths: List[str], extra_args: List[str], tasks, results) -> None:
+    plugin = _WorkerPlugin(worker_id, tasks, results)
+    args = ["-p", "no:cacheprovider", *extra_args, *paths]
+    # Workers report through the results queue; their console output is noise
+    with io.StringIO() as sink, contextlib.redirect_stdout(sink):
+        pytest.main(args, plugins=[plugin])
+    results.put(("exit", worker_id, None))
+
+
+class ParallelExecutor:
+    """
+    Pool of persistent pytest workers that runs tests in priority order.
+
+    Usage:
+        with ParallelExecutor(["tests/test_v1.py"], num_workers=4) as executor:
+            results = executor.run(node_ids)
+    """
+
+    def __init__(self, paths: Iterable[str], num_workers: Optional[int] = None,
+                 extra_args: Optional[List[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            paths: Test files (or directories) every worker collects once
+            num_workers: Number of worker processes (defaults to the CPU count)
+            extra_args: Additional pytest command-line arguments for the workers
+            batch_size: Most consecutive same-module tests handed to a worker
+                at once (1 tears fixtures down after every test)
+        """
+        self.paths = list(paths)
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.extra_args = list(extra_args or [])
+        self.batch_size = max(1, batch_size)
+        self._context = multiprocessing.get_context()
+        self._tasks = None
+        self._results = None
+        self._workers: List[Any] = []
+        # Node IDs the workers collected, in collection order
+        self.collected: List[str] = []
+
+    def start(self) -> None:
+        """Start the workers and wait until each has finished collection."""
+        if self._workers:
+            return
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        for worker_id in range(self.num_workers):
+            process = self._context.Process(
+                target=_worker_main,
+                args=(worker_id, self.paths, self.extra_args, self._tasks, self._results),
+                daemon=True,
+            )
+            process.start()
+            self._workers.append(process)
+
+        ready = 0
+        while ready < self.num_workers:
+            kind, worker_id, collected = self._get_message()
+            if kind == "ready":
+                # Every worker collects the same paths
+                self.collected = collected
+                ready += 1
+            elif kind == "exit":
+                raise RuntimeError(f"Test worker {worker_id} exited during collection")
+
+    def _get_message(self):
+        while True:
+            try:
+                return self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(process.is_alive() for process in self._workers):
+                    raise RuntimeError("All test workers exited unexpectedly")
+
+    def run(self, node_ids: Iterable[str], callback: Optional[ResultCallback] = None,
+            stop_policy: Optional[StoppingPolicy] = None) -> List[Dict[str, Any]]:
+        """
+        Run tests across the pool in priority order.
+
+        Node IDs are matched against the collected items the way
+        runner.run_tests matches them, so a test's ID without parameters
+        runs each of its parametrized instances, each with its own rank.
+
+        Args:
+            node_ids: Node IDs in priority order
+            callback: Called with each result as soon as it arrives
+            stop_policy: Policy that may end the run early. Tests already
+                handed to a worker finish; the others are listed in its
+                skipped attribute.
+
+        Returns:
+            Result dictionaries in completion order. Each has the keys
+            nodeid, rank, worker, status, duration, output, reruns, flaky,
+            started_at and completed_at (seconds since the run started).
+            Requested IDs matching no collected test come last, as errors
+            without a rank or worker.
+        """
+        self.start()
+        node_ids, missing = expand_node_ids(node_ids, self.collected)
+        start = time.monotonic()
+
+        # A single FIFO in rank order: idle workers always take the
+        # highest-priority batch that has not started yet.
+        if stop_policy is not None:
+            stop_policy.start(node_ids)
+        for batch in self._batches(node_ids):
+            self._tasks.put(batch)
+
+        results = []
+        expected = len(node_ids)
+        while len(results) < expected:
+            kind, worker_id, result = self._get_message()
+            if kind == "exit":
+                raise RuntimeError(f"Test worker {worker_id} exited mid-run")
+            if kind != "result":
+                continue
+            result["started_at"] -= start
+            result["completed_at"] -= start
+            results.append(result)
+            if callback:
+                callback(result)
+            if stop_policy is not None and stop_policy.reason is None and stop_policy.update(result):
+                skipped = [task for batch in self._drain_tasks() for task in batch]
+                stop_policy.skipped = [node_id for _, node_id in skipped]
+                expected -= len(skipped)
+
+        for node_id in missing:
+            now = time.monotonic() - start
+            result = {
+                "nodeid": node_id,
+                "rank": None,
+                "worker": None,
+                "status": "ERROR",
+                "duration": 0.0,
+                "output": f"{node_id} was not collected",
+                "reruns": 0,
+                "flaky": False,
+                "started_at": now,
+                "completed_at": now,
+            }
+            results.append(result)
+            if callback:
+                callback(result)
+        return results
+
+    def _batches(self, node_ids: List[str]) -> List[List[Tuple[int, str]]]:
+        """Split ranked node IDs into runs of consecutive tests from the same module."""
+        batches: List[List[Tuple[int, str]]] = []
+        module = None
+        for rank, node_id in enumerate(node_ids, 1):
+            node_module = node_id.split("::")[0]
+            if not batches or node_module != module or len(batches[-1]) >= self.batch_size:
+                batches.append([])
+                module = node_module
+            batches[-1].append((rank, node_id))
+        return batches
+
+    def _drain_tasks(self) -> List[Any]:
+        """Take back every batch no worker has started yet, in rank order."""
+        drained = []
+        while True:
+            try:
+                drained.append(self._tasks.get(timeout=0.05))
+            except queue.Empty:
+                return sorted(drained)
+
+    def close(self) -> None:
+        """Stop the workers."""
+        for _ in self._workers:
+            self._tasks.put(None)
+        for process in self._workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+
+    def __enter__(self) -> "ParallelExecutor":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def sequence_results(results: List[Dict[str, Any]], sequence: str = "priority") -> List[Dict[str, Any]]:
+    """
+    Order results for scoring.
+
+    Args:
+        results: Result dictionaries from ParallelExecutor.run or runner.run_tests
+        sequence: 'priority' to order by rank, 'completion' to order by the
+            wall-clock time each test finished
+
+    Returns:
+        New list of results in the requested sequence
+    """
+    if sequence == "priority":
+        return sorted(results, key=lambda r: (r.get("rank") is None, r.get("rank") or 0))
+    if sequence == "completion":
+        return sorted(results, key=lambda r: r.get("completed_at", float("inf")))
+    raise ValueError(f"Unknown sequence: {sequence}")
@@ -2,6 +2,7 @@ import os
 import ast
 import time
 import json
+import heapq
 import astor 
 import torch
 import random
@@ -9,6 +10,9 @@ import numpy as np
 from tqdm.auto import tqdm
 from transformers import AutoTokenizer, AutoModel
 from prioritization.utils import extract_source_functions, generate_embedding
+from prioritization.coverage_store import CoverageStore
+from prioritization.history_store import HistoryStore, is_history_db
+from prioritization.failure_scoring import FailureScorer, HistoryIndex
 
 
 def random_prioritization(tests, logger=None):
@@ -82,67 +86,163 @@ def semantic_prioritization(tests, logger=None):
     return prioritized
 
 
-def previous_failure_prioritization(tests, failure_history_file, logger=None):
+def previous_failure_prioritization(tests, failure_history_file, logger=None, half_life=10.0, flaky_weight=1.0):
     """
     Prioritize tests based on previous failure history.
+    
+    failure_history_file is either a JSON snapshot ({test: 'PASS'|'FAIL'|'FLAKY'})
+    or a SQLite history store (see prioritization.history_store). History is
+    streamed once through a FailureScorer, so recent failures and outcome
+    transitions outrank old ones (half_life is in runs), tests with recent
+    FLAKY runs are discounted (flaky_weight, 0 to disable) and ties go to
+    the shorter test.
     """
     if logger:
         logger.info(f"Starting previous failure prioritization using history file: {failure_history_file}")
-        
-    # Default scores if no history exists
-    test_scores = {test['full_name']: 0 for test in tests}
+    
+    scorer = FailureScorer(half_life=half_life, flaky_weight=flaky_weight)
     
     # Try to load failure history
     try:
-        with open(failure_history_file, 'r') as f:
-            failure_history = json.load(f)
-            
-        if logger:
-            logger.info(f"Loaded failure history with {len(failure_history)} entries")
-            
-        # Higher score for failed tests
-        for test_name, result in failure_history.items():
-            if result == "FAIL":
-                # Extract just the method name from the full test path
-                # e.g. "test_divide" from "tests/test_v1.py::TestCalculator::test_divide"
-                method_name = test_name.split("::")[-1]
-                
-                # Find all tests with this method name and increase their score
-                for test in tests:
-                    if test['method_name'] == method_name:
-                        test_scores[test['full_name']] = 100
-                        
-                        if logger:
-                            logger.info(f"Prioritizing test {test['full_name']} due to previous failure of {method_name}")
+        if is_history_db(failure_history_file):
+            with HistoryStore(failure_history_file) as history:
+                scorer.consume(history.iter_results())
+                if logger:
+                    logger.info(f"Loaded failure history from {history.run_count()} runs")
+        else:
+            with open(failure_history_file, 'r') as f:
+                failure_history = json.load(f)
+            scorer.consume_snapshot(failure_history)
+            if logger:
+                logger.info(f"Loaded failure history with {len(failure_history)} entries")
     except (FileNotFoundError, json.JSONDecodeError) as e:
         # If no history file or invalid JSON, use default scores
         if logger:
             logger.warning(f"Could not load failure history: {str(e)}. Using default scores.")
-        pass
     
-    # Sort based on scores
-    prioritized = sorted(tests, key=lambda test: test_scores.get(test['full_name'], 0), reverse=True)
+    prioritized = scorer.rank(tests)
     
     if logger:
+        index = HistoryIndex(tests)
+        if index.ambiguous:
+            logger.warning(f"Ignoring history recorded under ambiguous method names: {sorted(index.ambiguous)}")
+        scores = scorer.scores(index)
         logger.info(f"Previous failure prioritization complete. Ordered {len(prioritized)} tests")
         # Log tests prioritized due to failure history
-        prioritized_tests = [t for t in prioritized if test_scores.get(t['full_name'], 0) > 0]
+        prioritized_tests = [name for name, (score, _) in scores.items() if score > 0]
         logger.info(f"Number of tests prioritized due to previous failures: {len(prioritized_tests)}")
         
     return prioritized
 
 
-def submod_ordering(tests, source_dir="../v1", logger=None):
+def _is_changed(func, changed_functions):
+    """Whether a source function is one of the 'path::qualname' changed functions."""
+    for function in changed_functions:
+        path, _, qualname = function.rpartition("::")
+        if qualname == func['qualname'] and (path == func['file'] or path.endswith("/" + func['file'])):
+            return True
+    return False
+
+
+def _function_history(source_functions, history):
+    """Return the history record of every source function after the current fingerprints are recorded."""
+    updated = {}
+    for func in source_functions:
+        key = f"{func['file']}::{func['qualname']}"
+        record = history.get(key)
+        changes = 0 if record is None else record['changes'] + (record['fingerprint'] != func['fingerprint'])
+        updated[key] = {'fingerprint': func['fingerprint'], 'changes': changes}
+    return updated
+
+
+def _load_function_history(history_file):
+    if history_file and os.path.exists(history_file):
+        with open(history_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def function_weights(source_functions, changed_functions=None, history_file=None,
+                     stable_weight=0.0, complexity=False, logger=None):
     """
-    Prioritize tests using a submodular optimization approach with code embeddings.
-    Uses UnixCoder to embed functions and test cases, then greedily selects tests
-    that maximize marginal similarity gain.
+    Weight source functions for the facility-location objective of submod_ordering.
+    
+    A function's weight is 1 if it changed and stable_weight if it did not,
+    scaled by 1 + log(1 + churn), where churn counts the recorded runs in
+    which its fingerprint changed, and (with complexity) by its cyclomatic
+    complexity relative to the mean. Changes come from changed_functions
+    and from fingerprints that differ from those recorded in history_file.
+    With neither, every function counts as changed. The history is only
+    read; record_function_history updates it once a run has been used, so
+    ordering twice gives the same order.
+    
+    Args:
+        source_functions: Functions from extract_source_functions
+        changed_functions: Optional set of 'path::qualname' changed functions,
+            as from selection.map_changes
+        history_file: Optional JSON file of per-function fingerprints and
+            change counts kept across runs
+        stable_weight: Weight of an unchanged function before scaling
+            (0 leaves unchanged functions out of the objective)
+        complexity: Whether to scale weights by cyclomatic complexity
+        logger: Optional logger object for logging information
+        
+    Returns:
+        list: One weight per source function
     """
+    keys = [f"{func['file']}::{func['qualname']}" for func in source_functions]
+    history = _load_function_history(history_file)
+    
+    if changed_functions is None and not history:
+        changed = [True] * len(source_functions)
+    else:
+        changed = [changed_functions is not None and _is_changed(func, changed_functions)
+                   for func in source_functions]
+        if history:
+            for i, (key, func) in enumerate(zip(keys, source_functions)):
+                record = history.get(key)
+                changed[i] = changed[i] or record is None or record['fingerprint'] != func['fingerprint']
+    
+    updated = _function_history(source_functions, history)
+    churn = [updated[key]['changes'] for key in keys]
+    
+    weights = np.array([1.0 if is_changed else stable_weight for is_changed in changed])
+    weights *= 1 + np.log1p(churn)
+    if complexity and source_functions:
+        complexities = np.array([func['complexity'] for func in source_functions], dtype=float)
+        weights *= complexities / complexities.mean()
     
     if logger:
-        logger.info("Loading UnixCoder model for code embeddings...")
+        logger.info(f"{sum(changed)} of {len(source_functions)} source functions changed")
+        for key, weight in zip(keys, weights):
+            logger.debug(f"Weight of {key}: {weight:.3f}")
+    return weights.tolist()
+
+
+def record_function_history(source_dir, history_file, logger=None):
+    """
+    Record the current fingerprints of the source functions in history_file.
+    
+    Call this once the tests of a run ordered with function_weights have
+    actually run, so a function's churn counts the runs it changed in.
     
-    # Load UnixCoder model and tokenizer
+    Args:
+        source_dir: Directory containing the source code
+        history_file: JSON file of per-function fingerprints and change counts
+        logger: Optional logger object for logging information
+    """
+    source_functions = extract_source_functions(source_dir, logger)
+    updated = _function_history(source_functions, _load_function_history(history_file))
+    with open(history_file, 'w') as f:
+        json.dump(updated, f, indent=2)
+    if logger:
+        logger.info(f"Recorded fingerprints of {len(updated)} source functions in {history_file}")
+
+
+def _unixcoder_embedder(logger=None):
+    """Load UnixCoder and return a function embedding a piece of code."""
+    if logger:
+        logger.info("Loading UnixCoder model for code embeddings...")
     try:
         tokenizer = AutoTokenizer.from_pretrained("microsoft/unixcoder-base")
         model = AutoModel.from_pretrained("microsoft/unixcoder-base")
@@ -153,15 +253,65 @@ def submod_ordering(tests, source_dir="../v1", logger=None):
     except Exception as e:
         if logger:
             logger.error(f"Error loading UnixCoder: {str(e)}")
+        raise
+    return lambda code: generate_embedding(code, tokenizer, model)
+
+
+def submod_ordering(tests, source_dir="../v1", logger=None, changed_functions=None,
+                    history_file=None, stable_weight=0.0, embedding_cache=None,
+                    complexity=False, embed=None):
+    """
+    Prioritize tests using a submodular optimization approach with code embeddings.
+    Uses UnixCoder to embed functions and test cases, then greedily selects tests
+    that maximize the marginal gain of a weighted facility-location objective:
+    the sum over source functions of the function's weight (see
+    function_weights) times its best similarity to a selected test.
     
-    # Extract source code functions
+    Functions with zero weight, such as unchanged ones when a change is
+    known, are left out before anything is embedded. Function embeddings can
+    be cached in an .npz file keyed by fingerprint (the .npz suffix is added
+    if missing), so only new or changed functions are embedded again. With
+    complexity, weights are also scaled by cyclomatic complexity. embed maps
+    a piece of code to its embedding vector and defaults to UnixCoder.
+    """
+    
+    if embed is None:
+        embed = _unixcoder_embedder(logger)
+    
+    # Extract source code functions and weight them
     source_functions = extract_source_functions(source_dir, logger)
+    weights = function_weights(source_functions, changed_functions, history_file,
+                               stable_weight, complexity, logger=logger)
+    if not tests or not source_functions:
+        if logger and tests:
+            logger.warning(f"No source functions found in {source_dir}; keeping the original order")
+        return list(tests)
+    kept = [i for i, weight in enumerate(weights) if weight > 0]
+    if not kept:
+        if logger:
+            logger.warning("No source function carries weight; weighting all functions equally")
+        weights = [1.0] * len(source_functions)
+        kept = list(range(len(source_functions)))
+    source_functions = [source_functions[i] for i in kept]
+    weights = np.array([weights[i] for i in kept])
     
-    # Generate embeddings for source functions
+    if logger:
+        logger.info(f"Ordering against {len(source_functions)} weighted source functions")
+    
+    # Generate embeddings for source functions, reusing cached ones
+    cache = {}
+    if embedding_cache and not embedding_cache.endswith('.npz'):
+        # np.savez appends the suffix, so the cache must be looked up with it
+        embedding_cache += '.npz'
+    if embedding_cache and os.path.exists(embedding_cache):
+        cache = dict(np.load(embedding_cache))
     function_embeddings = []
     for func in tqdm(source_functions, desc="Embedding functions"):
-        embedding = generate_embedding(func['code'], tokenizer, model)
-        function_embeddings.append(embedding)
+        if func['fingerprint'] not in cache:
+            cache[func['fingerprint']] = embed(func['code'])
+        function_embeddings.append(cache[func['fingerprint']])
+    if embedding_cache:
+        np.savez(embedding_cache, **cache)
     
     function_embeddings = np.array(function_embeddings)
         
@@ -171,8 +321,7 @@ def submod_ordering(tests, source_dir="../v1", logger=None):
     # Generate embeddings for test cases
     test_embeddings = []
     for test in tqdm(tests, desc="Embedding tests"):
-        embedding = generate_embedding(test['code'], tokenizer, model)
-        test_embeddings.append(embedding)
+        test_embeddings.append(embed(test['code']))
     
     test_embeddings = np.array(test_embeddings)
     
@@ -183,51 +332,28 @@ def submod_ordering(tests, source_dir="../v1", logger=None):
     if logger:
         logger.info("Running submodular optimization...")
     
-    def similarity(embedding_a, embedding_b):
-        """Calculate cosine similarity between two embeddings"""
-        return np.dot(embedding_a, embedding_b) / (np.linalg.norm(embedding_a) * np.linalg.norm(embedding_b))
-    
-    def calculate_gain(selected_indices, candidate_index):
-        """
-        Calculate the marginal gain of adding a new test
-        This implements a facility location objective function, which is submodular
-        """
-        if not selected_indices:
-            # For the first selection, just use max similarity to any function
-            similarities = [similarity(test_embeddings[candidate_index], func_embedding) 
-                           for func_embedding in function_embeddings]
-            return np.mean(similarities)
-        
-        # For subsequent selections, calculate marginal gain
-        gain = 0
-        for func_idx, func_embedding in enumerate(function_embeddings):
-            # Current max similarity for this function from selected tests
-            current_max = max([similarity(test_embeddings[idx], func_embedding) for idx in selected_indices])
-            # Max similarity if we add the candidate test
-            new_sim = similarity(test_embeddings[candidate_index], func_embedding)
-            # Add the marginal gain (limited to positive values)
-            gain += max(0, new_sim - current_max)
-        
-        return gain
+    # Cosine similarity of every test to every function, computed once;
+    # facility location only rewards positive similarity
+    test_embeddings = test_embeddings / np.linalg.norm(test_embeddings, axis=1, keepdims=True)
+    function_embeddings = function_embeddings / np.linalg.norm(function_embeddings, axis=1, keepdims=True)
+    similarities = np.maximum(test_embeddings @ function_embeddings.T, 0)
     
-    # Greedy selection
-    remaining_indices = set(range(len(tests)))
+    # Greedy selection: the marginal gain of a test is the weighted sum of
+    # how much it raises each function's best similarity
+    current_max = np.zeros(len(source_functions))
+    remaining = np.ones(len(tests), dtype=bool)
     selected_indices = []
     prioritized_tests = []
     
     start_time = time.time()
-    while remaining_indices:
-        best_gain = -float('inf')
-        best_idx = None
-        
-        for idx in remaining_indices:
-            gain = calculate_gain(selected_indices, idx)
-            if gain > best_gain:
-                best_gain = gain
-                best_idx = idx
+    while remaining.any():
+        gains = np.maximum(similarities - current_max, 0) @ weights
+        gains[~remaining] = -np.inf
+        best_idx = int(np.argmax(gains))
         
+        current_max = np.maximum(current_max, similarities[best_idx])
+        remaining[best_idx] = False
         selected_indices.append(best_idx)
-        remaining_indices.remove(best_idx)
         prioritized_tests.append(tests[best_idx])
         
         if logger and len(selected_indices) % 10 == 0:
@@ -241,3 +367,56 @@ def submod_ordering(tests, source_dir="../v1", logger=None):
             logger.info(f"  {i+1}. {test['full_name']}")
     
     return prioritized_tests
+
+
+def coverage_submod_ordering(tests, coverage_store="coverage_store", commit=None, logger=None):
+    """
+    Prioritize tests by greedy maximum coverage over stored per-test coverage.
+    
+    Each step picks the test covering the most functions not yet covered
+    (the submodular set-cover objective), using lazy evaluation: a test's
+    previous gain is an upper bound on its current one, so most candidates are
+    never re-scored. Once everything coverable is covered the covered set is
+    reset and selection continues over the remaining tests. Tests without
+    stored coverage go last in their original order.
+    """
+    snapshot = CoverageStore(coverage_store).open(commit, kind="function")
+    rows = snapshot.rows_by_name()
+    if logger:
+        logger.info(f"Loaded coverage for {len(rows)} tests over {len(snapshot.elements)} functions "
+                    f"from {snapshot.path}")
+    
+    covered_tests = [i for i, test in enumerate(tests) if test['full_name'] in rows]
+    uncovered_tests = [test for test in tests if test['full_name'] not in rows]
+    
+    covered = np.zeros(len(snapshot.elements), dtype=bool)
+    # Heap of (-gain upper bound, test index); ties keep the original order
+    heap = [(-len(rows[tests[i]['full_name']]), i) for i in covered_tests]
+    heapq.heapify(heap)
+    prioritized = []
+    
+    while heap:
+        _, i = heapq.heappop(heap)
+        row = rows[tests[i]['full_name']]
+        gain = int(np.count_nonzero(~covered[row]))
+        if heap and gain < -heap[0][0]:
+            # Stale bound: re-insert with the true gain
+            heapq.heappush(heap, (-gain, i))
+            continue
+        if gain == 0 and covered.any():
+            # Nothing left adds coverage: reset and re-score the rest
+            covered[:] = False
+            heap.append((0, i))
+            heap = [(-len(rows[tests[j]['full_name']]), j) for _, j in heap]
+            heapq.heapify(heap)
+            continue
+        covered[row] = True
+        prioritized.append(tests[i])
+    
+    prioritized.extend(uncovered_tests)
+    
+    if logger:
+        logger.info(f"Coverage prioritization complete. Ordered {len(prioritized)} tests "
+                    f"({len(uncovered_tests)} without stored coverage)")
+    
+    return prioritized
@@ -0,0 +1,154 @@
+"""
+Structured per-test result events.
+
+A pytest plugin that writes one compact JSON line per finished test instead
+of relying on scraping the verbose console output:
+
+    {"nodeid": "tests/test_calculator.py::TestCalculator::test_divide[v1]",
+     "rank": 3, "status": "FAILED", "duration": 0.0004, "setup_duration": 0.0001,
+     "exc_type": "ZeroDivisionError", "traceback_hash": "5c1f0a8e2b7d4c11",
+     "message": "ZeroDivisionError: division by zero", "output": "..."}
+
+``status`` is PASSED, FAILED, SKIPPED or ERROR, as in the runner results.
+``duration`` covers setup, call and teardown; ``setup_duration`` is the
+setup alone, where fixtures the test is the first to need are created.
+``exc_type``, ``traceback_hash``, ``message`` and ``output`` (the failure
+text) are only present for failures and errors, and ``reruns`` and
+``flaky`` only for tests rerun by the flakiness plugin. ``traceback_hash`` identifies
+the failing location (exception type and the file and function of every
+traceback entry, without line numbers), so the same fault hashes the same
+across runs even when the message changes or unrelated edits shift lines.
+
+Usage:
+    python -m pytest -q -p prioritization.result_events --result-events=test_events.jsonl tests/
+
+Events can be read back with ``read_result_events`` and scored with
+``APFDCalculator.process_result_events``.
+"""
+
+import os
+import json
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Union
+
+import pytest
+
+
+def traceback_hash(excinfo) -> str:
+    """Return a short stable hash of an exception's type and the functions in its traceback."""
+    digest = hashlib.sha1(excinfo.typename.encode())
+    for entry in excinfo.traceback:
+        # File names rather than full paths, so checkouts in different places
+        # agree, and no line numbers, so edits elsewhere in a file do not
+        digest.update(f"|{os.path.basename(str(entry.path))}:{entry.name}".encode())
+    return digest.hexdigest()[:16]
+
+
+class ResultEventWriter:
+    """Pytest plugin that writes a JSON line for every finished test."""
+
+    def __init__(self, output: Union[str, TextIO]):
+        """
+        Args:
+            output: Path of the JSONL file to write, or an open text stream
+        """
+        self._owns_stream = isinstance(output, str)
+        self.stream = open(output, 'w', encoding='utf-8') if self._owns_stream else output
+        self._rank = 0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def write(self, event: Dict[str, Any]) -> None:
+        """Write one event line."""
+        self.stream.write(json.dumps(event, separators=(',', ':')) + "\n")
+        self.stream.flush()
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        report = yield
+        if call.excinfo is not None and report.failed:
+            report.exc_type = call.excinfo.typename
+            report.traceback_hash = traceback_hash(call.excinfo)
+        return report
+
+    def pytest_runtest_logreport(self, report):
+        event = self._pending.get(report.nodeid)
+        if event is None:
+            self._rank += 1
+            event = self._pending[report.nodeid] = {
+                "nodeid": report.nodeid,
+                "rank": self._rank,
+                "status": "PASSED",
+                "duration": 0.0,
+            }
+        event["duration"] += report.duration
+        if report.when == "setup":
+            event["setup_duration"] = round(report.duration, 6)
+
+        if report.failed and event["status"] == "PASSED":
+            event["status"] = "FAILED" if report.when == "call" else "ERROR"
+            event["exc_type"] = getattr(report, "exc_type", None)
+            event["traceback_hash"] = getattr(report, "traceback_hash", None)
+            crash = getattr(report.longrepr, "reprcrash", None)
+            event["message"] = crash.message.splitlines()[0] if crash and crash.message else ""
+            event["output"] = report.longreprtext
+        elif report.skipped and event["status"] == "PASSED":
+            event["status"] = "SKIPPED"
+
+        if report.when == "teardown":
+            del self._pending[report.nodeid]
+            event["duration"] = round(event["duration"], 6)
+            if getattr(report, "reruns", 0):
+                event["reruns"] = report.reruns
+                event["flaky"] = report.flaky
+            self.write(event)
+
+    def pytest_unconfigure(self, config):
+        self.close()
+
+    def close(self) -> None:
+        """Close the output file if this writer opened it."""
+        if self._owns_stream and not self.stream.closed:
+            self.stream.close()
+
+
+def iter_result_events(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream events from a JSONL file.
+
+    Args:
+        path: File written by ResultEventWriter
+
+    Yields:
+        Event dictionaries in the order they were written
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line
+                break
+
+
+def read_result_events(path: str) -> List[Dict[str, Any]]:
+    """Read every event from a JSONL file."""
+    return list(iter_result_events(path))
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("prioritization")
+    group.addoption(
+        "--result-events",
+        metavar="FILE",
+        default=None,
+        help="Write one JSON line per finished test to FILE",
+    )
+
+
+def pytest_configure(config):
+    path: Optional[str] = config.getoption("result_events")
+    if path:
+        config.pluginmanager.register(ResultEventWriter(path), "result-event-writer")
@@ -0,0 +1,154 @@
+"""
+In-process test runner.
+
+Runs a list of pytest node IDs in a single pytest session: the interpreter
+starts once, plugins load once and each test file is collected once, after
+which the requested tests execute in exactly the given order. Each finished
+test is handed to an optional callback as a result dictionary:
+
+    {
+        "nodeid": "tests/test_v1.py::TestCalculator::test_divide",
+        "rank": 1,                 # position in the requested order (1-based)
+        "status": "FAILED",        # PASSED, FAILED, SKIPPED or ERROR
+        "duration": 0.0012,        # seconds spent in setup, call and teardown
+        "longrepr": <pytest traceback representation or None>,
+        "output": "...",           # failure text ('' for passing tests)
+        "reruns": 0,               # reruns by the flakiness plugin, if enabled
+        "flaky": False,            # True if it failed and then passed on a rerun
+    }
+"""
+
+import contextlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, TextIO
+
+import pytest
+
+from prioritization.flakiness import RerunPlugin
+from prioritization.fork_server import ForkServerPlugin
+from prioritization.nodeids import expand_node_ids
+from prioritization.stopping import StoppingPlugin, StoppingPolicy
+
+ResultCallback = Callable[[Dict[str, Any]], None]
+
+
+class OrderedSessionPlugin:
+    """
+    Pytest plugin that restricts a session to the requested node IDs, runs
+    them in the requested order and reports one result per test.
+
+    A requested ID without a parametrization suffix selects every
+    parametrized instance of that test, and a file or class ID (e.g.
+    'tests/test_v1.py') selects every test inside it.
+    """
+
+    def __init__(self, node_ids: Iterable[str], callback: Optional[ResultCallback] = None):
+        self.node_ids = list(node_ids)
+        self.callback = callback
+        self.results: List[Dict[str, Any]] = []
+        self.missing: List[str] = []
+        self._ranks: Dict[str, int] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        by_id = {item.nodeid: item for item in items}
+        selected, self.missing = expand_node_ids(self.node_ids, by_id)
+        self._ranks = {nodeid: rank for rank, nodeid in enumerate(selected, 1)}
+
+        deselected = [item for item in items if item.nodeid not in self._ranks]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = [by_id[nodeid] for nodeid in selected]
+
+    def pytest_runtest_logreport(self, report):
+        result = self._pending.setdefault(report.nodeid, {
+            "nodeid": report.nodeid,
+            "rank": self._ranks.get(report.nodeid),
+            "status": "PASSED",
+            "duration": 0.0,
+            "longrepr": None,
+            "output": "",
+            "reruns": 0,
+            "flaky": False,
+        })
+        result["duration"] += report.duration
+        result["reruns"] = getattr(report, "reruns", 0)
+        result["flaky"] = getattr(report, "flaky", False)
+
+        if report.failed and result["status"] == "PASSED":
+            # A failure outside the test body is an error, as pytest reports it.
+            result["status"] = "FAILED" if report.when == "call" else "ERROR"
+            result["longrepr"] = report.longrepr
+            result["output"] = report.longreprtext
+        elif report.skipped and result["status"] == "PASSED":
+            result["status"] = "SKIPPED"
+            result["longrepr"] = report.longrepr
+
+        if report.when == "teardown":
+            del self._pending[report.nodeid]
+            self.results.append(result)
+            if self.callback:
+                self.callback(result)
+
+
+def run_tests(node_ids: Iterable[str], callback: Optional[ResultCallback] = None,
+              extra_args: Optional[List[str]] = None, plugins: Optional[List[Any]] = None,
+              output: Optional[TextIO] = None, verbose: bool = True,
+              stop_policy: Optional[StoppingPolicy] = None, fork: bool = False,
+              fork_batch_size: int = 1, reruns: int = 0,
+              rerun_budget: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Run tests in the given order inside a single pytest session.
+
+    Args:
+        node_ids: Node IDs in execution order, e.g. 'tests/test_v1.py::TestCalculator::test_add'
+        callback: Called with each test's result dictionary as soon as it finishes
+        extra_args: Additional pytest command-line arguments
+        plugins: Additional plugin objects to register for the session
+        output: Stream to receive pytest's console output (defaults to stdout)
+        verbose: Whether to run pytest with -v
+        stop_policy: Policy that may end the run early; afterwards its
+            reason and skipped attributes describe what was not run
+        fork: Run each test in a child forked from the collected session
+            (see prioritization.fork_server) so tests cannot leak state
+        fork_batch_size: Number of consecutive tests each forked child runs
+        reruns: Rerun a failing test up to this many times; one that then
+            passes is reported as PASSED with flaky set
+        rerun_budget: Maximum total seconds spent on reruns
+
+    Returns:
+        List of result dictionaries in execution order
+    """
+    node_ids = list(node_ids)
+    session_plugin = OrderedSessionPlugin(node_ids, callback)
+
+    # Collect each file once; the plugin selects and orders the items.
+    paths = list(dict.fromkeys(node_id.split("::")[0] for node_id in node_ids))
+    args = ["-v" if verbose else "-q", *(extra_args or []), *paths]
+    plugins = [session_plugin, *(plugins or [])]
+    if stop_policy is not None:
+        plugins.append(StoppingPlugin(stop_policy))
+    if fork:
+        plugins.append(ForkServerPlugin(fork_batch_size))
+    if reruns > 0:
+        plugins.append(RerunPlugin(reruns, rerun_budget))
+
+    redirect = contextlib.redirect_stdout(output) if output else contextlib.nullcontext()
+    with redirect:
+        pytest.main(args, plugins=plugins)
+
+    for node_id in session_plugin.missing:
+        result = {
+            "nodeid": node_id,
+            "rank": None,
+            "status": "ERROR",
+            "duration": 0.0,
+            "longrepr": None,
+            "output": f"{node_id} was not collected",
+            "reruns": 0,
+            "flaky": False,
+        }
+        session_plugin.results.append(result)
+        if callback:
+            callback(result)
+
+    return session_plugin.results
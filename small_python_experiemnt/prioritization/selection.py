@@ -0,0 +1,496 @@
+"""
+Change-based regression test selection.
+
+Instead of running the whole suite on every change, select the tests that
+can reach the code that changed:
+
+1. Diff two git revisions (``--changed-since REV``) or two directories such
+   as ``v0/`` and ``v1/`` (``--diff-dirs OLD NEW``).
+2. Map every changed line to the function or method containing it with
+   ``ast``. Both sides of the diff are mapped, so deleted lines count too.
+   Comment-only and blank lines and ``if __name__ == "__main__":`` blocks
+   are ignored, a changed class header or
+   class attribute counts as a change to the class, and a changed
+   module-level import counts as a change to the functions that use the
+   imported names. In a test module, importing names no function uses
+   (such as a test class imported to be collected again) counts as a
+   module-level change.
+3. Select the tests that reach a changed function, either through stored
+   per-test coverage (see prioritization.coverage_store) or through static
+   call references: a name-based call graph of the changed files and the
+   source directories, followed from the tests and the fixtures they use.
+   A change inside a test or fixture selects the tests using it.
+
+Anything that cannot be mapped this way (other module-level code, a changed
+conftest.py module, a deleted Python file, a non-Python file that is not
+documentation) makes the selection fall back to the full suite.
+
+Usage:
+    python -m prioritization.selection --changed-since HEAD~1
+    python -m prioritization.selection --diff-dirs v0 v1 --coverage-store coverage_store
+"""
+
+import os
+import ast
+import sys
+import difflib
+import fnmatch
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from prioritization.git_utils import diff_files, show_file
+
+# Changed files that cannot affect test outcomes
+IGNORED_FILES = ("*.md", "*.rst", "*.png", "*.jpg", "*.svg", "*.ipynb")
+
+# Methods whose change affects every use of their class
+CONSTRUCTORS = ("__init__", "__new__", "__post_init__")
+
+
+def is_test_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return name == "conftest.py" or fnmatch.fnmatch(name, "test_*.py") or fnmatch.fnmatch(name, "*_test.py")
+
+
+def _referenced_names(node: ast.AST) -> Set[str]:
+    """Names and attribute names used anywhere inside a node."""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, ast.Attribute):
+            names.add(child.attr)
+    return names
+
+
+def _is_main_guard(node: ast.AST) -> bool:
+    """Whether a statement is 'if __name__ == "__main__":'."""
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__"
+            and len(node.test.comparators) == 1 and isinstance(node.test.comparators[0], ast.Constant)
+            and node.test.comparators[0].value == "__main__")
+
+
+class SourceMap:
+    """Where the functions, classes and imports of one Python file are."""
+
+    def __init__(self, source: str):
+        tree = ast.parse(source)
+        self.lines = source.splitlines()
+        self.functions: Dict[str, Tuple[int, int]] = {}    # qualname -> (first, last line)
+        self.classes: Dict[str, Tuple[int, int]] = {}
+        self.references: Dict[str, Set[str]] = {}          # function qualname -> names it uses
+        self.parameters: Dict[str, List[str]] = {}
+        self.imports: List[Tuple[int, int, Set[str]]] = []  # module-level (first, last, bound names)
+        self.script_blocks: List[Tuple[int, int]] = []      # 'if __name__ == "__main__":' blocks
+
+        def visit(node, prefix):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    name = f"{prefix}{child.name}"
+                    # Decorators belong to the function they decorate
+                    first = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                    self.functions[name] = (first, child.end_lineno)
+                    self.references[name] = _referenced_names(child)
+                    self.parameters[name] = [arg.arg for arg in child.args.args]
+                    visit(child, f"{name}.")
+                elif isinstance(child, ast.ClassDef):
+                    name = f"{prefix}{child.name}"
+                    first = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                    self.classes[name] = (first, child.end_lineno)
+                    visit(child, f"{name}.")
+                elif isinstance(child, (ast.Import, ast.ImportFrom)) and node is tree:
+                    bound = {(alias.asname or alias.name).split(".")[0] for alias in child.names}
+                    self.imports.append((child.lineno, child.end_lineno, bound))
+                elif node is tree and _is_main_guard(child):
+                    self.script_blocks.append((child.lineno, child.end_lineno))
+
+        visit(tree, "")
+
+    def _innermost(self, spans: Dict[str, Tuple[int, int]], line: int) -> Optional[str]:
+        containing = [name for name, (first, last) in spans.items() if first <= line <= last]
+        return max(containing, key=lambda name: spans[name][0]) if containing else None
+
+    def classify(self, line: int) -> Tuple[str, Any]:
+        """
+        Classify a changed line.
+
+        Returns:
+            ('ignore', None) for blank and comment-only lines,
+            ('function', qualname), ('class', qualname),
+            ('import', bound names) or ('module', line)
+        """
+        text = self.lines[line - 1].strip() if 0 < line <= len(self.lines) else ""
+        if not text or text.startswith("#"):
+            return "ignore", None
+        if any(first <= line <= last for first, last in self.script_blocks):
+            # Only runs when the file is executed as a script, never under test
+            return "ignore", None
+        function = self._innermost(self.functions, line)
+        cls = self._innermost(self.classes, line)
+        if function and (not cls or self.functions[function][0] >= self.classes[cls][0]):
+            return "function", function
+        if cls:
+            return "class", cls
+        for first, last, bound in self.imports:
+            if first <= line <= last:
+                return "import", bound
+        return "module", line
+
+    def users_of(self, names: Set[str]) -> Set[str]:
+        """Return the functions in this file that use any of the given names."""
+        return {function for function, used in self.references.items() if used & names}
+
+    def members(self, cls: str) -> Set[str]:
+        """Return the functions defined inside a class."""
+        return {function for function in self.functions if function.startswith(f"{cls}.")}
+
+
+def _read(path: Optional[str]) -> Optional[str]:
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'r', errors='replace') as f:
+        return f.read()
+
+
+def diff_revisions(base: str, head: Optional[str] = None, repo_dir: str = ".") -> List[Dict[str, Any]]:
+    """
+    Collect the changes between two git revisions under repo_dir.
+
+    Args:
+        base: Revision to diff from
+        head: Revision to diff to (defaults to the working tree)
+        repo_dir: Directory inside the repository; paths are relative to it
+
+    Returns:
+        One change dictionary per file: old_path, new_path, old_lines,
+        new_lines, old_source, new_source and binary
+    """
+    changes = []
+    for change in diff_files(base, head, repo_dir):
+        old_path, new_path = change["old_path"], change["new_path"]
+        change["old_source"] = show_file(base, old_path, repo_dir) if old_path else None
+        if new_path is None:
+            change["new_source"] = None
+        elif head:
+            change["new_source"] = show_file(head, new_path, repo_dir)
+        else:
+            change["new_source"] = _read(os.path.join(repo_dir, new_path))
+        changes.append(change)
+    return changes
+
+
+def diff_directories(old_dir: str, new_dir: str) -> List[Dict[str, Any]]:
+    """
+    Collect the changes between two versions of a source directory, e.g. v0 and v1.
+
+    Returns:
+        Change dictionaries as from diff_revisions; paths include the directory
+    """
+    def files(root):
+        found = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if name != "__pycache__"]
+            for filename in filenames:
+                if not filename.endswith((".pyc", ".pyo")):
+                    found.add(os.path.relpath(os.path.join(dirpath, filename), root))
+        return found
+
+    old_files, new_files = files(old_dir), files(new_dir)
+    changes = []
+    for rel in sorted(old_files | new_files):
+        old_path = os.path.join(old_dir, rel) if rel in old_files else None
+        new_path = os.path.join(new_dir, rel) if rel in new_files else None
+        old_source, new_source = _read(old_path), _read(new_path)
+        if old_source == new_source:
+            continue
+        old_lines, new_lines = set(), set()
+        matcher = difflib.SequenceMatcher(None, (old_source or "").splitlines(),
+                                          (new_source or "").splitlines(), autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != "equal":
+                old_lines.update(range(i1 + 1, i2 + 1))
+                new_lines.update(range(j1 + 1, j2 + 1))
+        changes.append({"old_path": old_path, "new_path": new_path, "old_lines": old_lines,
+                        "new_lines": new_lines, "old_source": old_source, "new_source": new_source,
+                        "binary": False})
+    return changes
+
+
+def map_changes(changes: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Map changed lines to the functions containing them.
+
+    Returns:
+        Dictionary with functions (set of 'path::qualname' for the new path,
+        or the old one for deleted code), test_files (test files with
+        module-level changes: all their tests are affected) and unmapped
+        (descriptions of changes that could not be mapped)
+    """
+    functions: Set[str] = set()
+    test_files: Set[str] = set()
+    unmapped: List[str] = []
+
+    for change in changes:
+        path = change["new_path"] or change["old_path"]
+        if any(fnmatch.fnmatch(os.path.basename(path), pattern) for pattern in IGNORED_FILES):
+            continue
+        if not path.endswith(".py") or change["binary"]:
+            unmapped.append(f"{path} (not a Python source file)")
+            continue
+        if change["new_source"] is None:
+            unmapped.append(f"{path} (deleted)")
+            continue
+
+        for side in ("old", "new"):
+            source = change[f"{side}_source"]
+            if source is None or not change[f"{side}_lines"]:
+                continue
+            try:
+                source_map = SourceMap(source)
+            except SyntaxError:
+                unmapped.append(f"{change[f'{side}_path']} (does not parse)")
+                continue
+            for line in sorted(change[f"{side}_lines"]):
+                kind, value = source_map.classify(line)
+                if kind == "function":
+                    functions.add(f"{path}::{value}")
+                elif kind == "class":
+                    functions.add(f"{path}::{value}")
+                    functions.update(f"{path}::{member}" for member in source_map.members(value))
+                elif kind == "import":
+                    functions.update(f"{path}::{user}" for user in source_map.users_of(value))
+                    used = set().union(*source_map.references.values())
+                    if (is_test_file(path) and os.path.basename(path) != "conftest.py"
+                            and value - used):
+                        # pytest collects imported test classes and functions the module never calls,
+                        # e.g. 'from test_calculator import TestCalculator' in tests/test_v1.py
+                        test_files.add(path)
+                elif kind == "module":
+                    if is_test_file(path) and os.path.basename(path) != "conftest.py":
+                        test_files.add(path)
+                    else:
+                        unmapped.append(f"{change[f'{side}_path']}:{line}")
+
+    return {"functions": functions, "test_files": test_files, "unmapped": unmapped}
+
+
+def _short(name: str) -> str:
+    return name.rsplit("::", 1)[-1].rsplit(".", 1)[-1]
+
+
+def affected_names(changed_functions: Set[str], source_files: Iterable[str]) -> Set[str]:
+    """
+    Follow a name-based call graph backwards from the changed functions.
+
+    Args:
+        changed_functions: 'path::qualname' of the changed functions
+        source_files: Python files whose functions may call them
+
+    Returns:
+        Short names (function, method or class names) a test may use to
+        reach a changed function, directly or through other functions
+    """
+    graph: Dict[str, Set[str]] = {}  # 'path::qualname' -> names it uses
+    for path in source_files:
+        source = _read(path)
+        try:
+            source_map = SourceMap(source) if source is not None else None
+        except SyntaxError:
+            source_map = None
+        if source_map:
+            graph.update({f"{path}::{name}": used for name, used in source_map.references.items()})
+
+    def names_for(function):
+        qualname = function.rsplit("::", 1)[-1]
+        names = {_short(function)}
+        if "." in qualname and _short(function) in CONSTRUCTORS:
+            # Creating an instance runs the constructor
+            names.add(qualname.rsplit(".", 2)[-2])
+        return names
+
+    names = set()
+    for function in changed_functions:
+        names |= names_for(function)
+    frontier = True
+    while frontier:
+        frontier = False
+        for function, used in graph.items():
+            if used & names and not names_for(function) <= names:
+                names |= names_for(function)
+                frontier = True
+    return names
+
+
+def test_references(test_files: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Statically collect what every test uses.
+
+    Args:
+        test_files: Test modules (and conftest.py files) to parse
+
+    Returns:
+        Dictionary mapping 'Class::method' full names to a dictionary with
+        names (used by the test or, transitively, its fixtures) and files
+        (the test modules defining it)
+    """
+    parsed = {}
+    fixtures: Dict[str, Set[str]] = {}   # fixture name -> names used by it (from any file)
+    fixture_params: Dict[str, List[str]] = {}
+    for path in test_files:
+        source = _read(path)
+        try:
+            parsed[path] = SourceMap(source) if source is not None else None
+        except SyntaxError:
+            parsed[path] = None
+        if parsed[path] is None:
+            continue
+        for name, used in parsed[path].references.items():
+            if not _short(name).startswith("test"):
+                fixtures.setdefault(_short(name), set()).update(used)
+                fixture_params.setdefault(_short(name), []).extend(parsed[path].parameters[name])
+
+    def fixture_names(params, seen):
+        names = set()
+        for param in params:
+            if param in fixtures and param not in seen:
+                seen.add(param)
+                names |= {param} | fixtures[param] | fixture_names(fixture_params[param], seen)
+        return names
+
+    tests: Dict[str, Dict[str, Any]] = {}
+    for path, source_map in parsed.items():
+        if source_map is None or os.path.basename(path) == "conftest.py":
+            continue
+        for name, used in source_map.references.items():
+            if not _short(name).startswith("test"):
+                continue
+            entry = tests.setdefault(name.replace(".", "::"), {"names": set(), "files": set()})
+            entry["names"] |= used | fixture_names(source_map.parameters[name], set())
+            entry["files"].add(path)
+    return tests
+
+
+def _find_python_files(directories: Iterable[str]) -> List[str]:
+    found = []
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if name != "__pycache__"]
+            found.extend(os.path.join(dirpath, name) for name in filenames if name.endswith(".py"))
+    return sorted(found)
+
+
+def select_tests(tests: List[Dict[str, Any]], changes: List[Dict[str, Any]], test_dir: str = "tests",
+                 source_dirs: Iterable[str] = ("v1",), coverage_store: Optional[str] = None,
+                 logger=None) -> Dict[str, Any]:
+    """
+    Select the tests affected by a set of changes.
+
+    Args:
+        tests: Test dictionaries (from get_all_tests)
+        changes: Changes from diff_revisions or diff_directories
+        test_dir: Directory containing the test files
+        source_dirs: Directories of the code under test, for the call graph
+        coverage_store: Optional coverage store directory with per-test coverage
+        logger: Optional logger instance
+
+    Returns:
+        Dictionary with selected (the affected tests, in their original
+        order), fallback (True if every test was selected because a change
+        could not be mapped), changed_functions, affected_names and unmapped
+    """
+    changes = list(changes)
+    mapped = map_changes(changes)
+    result = {
+        "selected": tests,
+        "fallback": bool(mapped["unmapped"]),
+        "changed_functions": sorted(mapped["functions"]),
+        "affected_names": [],
+        "unmapped": mapped["unmapped"],
+    }
+    if result["fallback"]:
+        if logger:
+            logger.warning(f"Running all {len(tests)} tests: {len(mapped['unmapped'])} change(s) could not be "
+                           f"mapped to functions, e.g. {mapped['unmapped'][0]}")
+        return result
+
+    # The call graph covers the source directories and every changed file
+    changed_files = [change["new_path"] for change in changes if change["new_path"]]
+    test_files = [path for path in _find_python_files([test_dir]) if is_test_file(path)]
+    source_files = sorted(set(_find_python_files(source_dirs)) | set(changed_files) | set(test_files))
+    names = affected_names(mapped["functions"], source_files)
+    result["affected_names"] = sorted(names)
+
+    references = test_references(test_files)
+    defining = set().union(*(entry["files"] for entry in references.values()))
+    wrappers = sorted(mapped["test_files"] - defining)
+    if wrappers:
+        # e.g. tests/test_v1.py only imports its tests, so which ones it affects is unknown
+        result["fallback"] = True
+        result["unmapped"] = [f"{path} (module-level change in a file that defines no tests)" for path in wrappers]
+        if logger:
+            logger.warning(f"Running all {len(tests)} tests: module-level change in {wrappers[0]}")
+        return result
+
+    changed_tests = {function.rsplit("::", 1)[-1].replace(".", "::") for function in mapped["functions"]}
+    selected_names = set()
+    for full_name, entry in references.items():
+        if (full_name in changed_tests or entry["names"] & names
+                or entry["files"] & mapped["test_files"]):
+            selected_names.add(full_name)
+
+    if coverage_store and os.path.isdir(coverage_store):
+        from prioritization.coverage_store import CoverageStore
+        from prioritization.nodeids import full_name as node_full_name
+        try:
+            snapshot = CoverageStore(coverage_store).open(kind="function")
+        except FileNotFoundError:
+            snapshot = None
+        if snapshot is not None:
+            for function in mapped["functions"]:
+                path, qualname = function.rsplit("::", 1)
+                element = f"{os.path.relpath(path)}::{qualname}"
+                selected_names.update(node_full_name(test) for test in snapshot.column(element))
+
+    result["selected"] = [test for test in tests if test["full_name"] in selected_names]
+    if logger:
+        logger.info(f"Selected {len(result['selected'])} of {len(tests)} tests affected by "
+                    f"{len(mapped['functions'])} changed function(s)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select the tests affected by a change")
+    changes = parser.add_mutually_exclusive_group(required=True)
+    changes.add_argument("--changed-since", metavar="REV", help="Git revision to diff the working tree against")
+    changes.add_argument("--diff-dirs", nargs=2, metavar=("OLD", "NEW"), help="Two source directories to diff")
+    parser.add_argument("--head", help="Git revision to diff to instead of the working tree")
+    parser.add_argument("--test-dir", default="tests", help="Directory containing test files")
+    parser.add_argument("--source-dir", action="append", dest="source_dirs",
+                        help="Directory of the code under test (repeatable; default: v1)")
+    parser.add_argument("--coverage-store", help="Coverage store with per-test coverage")
+
+    args = parser.parse_args()
+
+    from prioritization.utils import get_all_tests
+
+    if args.changed_since:
+        changes = diff_revisions(args.changed_since, args.head)
+    else:
+        changes = diff_directories(*args.diff_dirs)
+    tests = get_all_tests(args.test_dir)
+    result = select_tests(tests, changes, args.test_dir, args.source_dirs or ["v1"], args.coverage_store)
+
+    if result["fallback"]:
+        print(f"# Unmapped changes, running all tests: {', '.join(result['unmapped'])}", file=sys.stderr)
+    else:
+        print(f"# {len(result['selected'])} of {len(tests)} tests affected by: "
+              f"{', '.join(result['changed_functions']) or 'no code changes'}", file=sys.stderr)
+    for test in result["selected"]:
+        for nodeid in test["nodeids"]:
+            print(nodeid)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
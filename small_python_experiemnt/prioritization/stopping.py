@@ -0,0 +1,304 @@
+"""
+Stopping policies for prioritized test execution.
+
+The point of running tests in priority order is to learn about failures
+early, so a run does not always need to go to the end. A stopping policy
+watches results as they arrive and decides when the remaining tests are not
+worth running:
+
+    MaxFailures(1)                       stop at the first failure (fail-fast)
+    MaxFailures(3)                       stop after three distinct failing tests
+    TimeBudget(60)                       stop once 60 seconds have elapsed
+    FailureProbabilityThreshold(p, 0.05) stop once no remaining test has a
+                                         historical failure probability >= 0.05
+
+After a run, ``policy.reason`` says why it stopped (None if it ran to the
+end) and ``policy.skipped`` lists the node IDs that were never run.
+
+Policies plug into the in-process runner and the order plugin through
+``StoppingPlugin``, and into ``ParallelExecutor.run`` directly.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from prioritization.history_store import HistoryStore, is_history_db
+from prioritization.nodeids import full_name, method_name, strip_params
+
+FAILED_STATUSES = ("FAILED", "ERROR")
+
+
+class StoppingPolicy:
+    """Base class: never stops. Subclasses override ``check``."""
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self.skipped: List[str] = []
+
+    def start(self, node_ids: List[str]) -> None:
+        """
+        Reset the policy for a new run.
+
+        Args:
+            node_ids: Node IDs in the order they are going to run
+        """
+        self.reason = None
+        self.skipped = []
+
+    def update(self, result: Dict[str, Any]) -> Optional[str]:
+        """
+        Record a finished test and decide whether to stop.
+
+        Args:
+            result: Runner result dictionary with at least nodeid and status
+
+        Returns:
+            The reason for stopping, or None to keep going
+        """
+        if self.reason is None:
+            self.reason = self.check(result)
+        return self.reason
+
+    def check(self, result: Dict[str, Any]) -> Optional[str]:
+        return None
+
+
+class MaxFailures(StoppingPolicy):
+    """Stop after a number of distinct failing tests (1 gives fail-fast)."""
+
+    def __init__(self, count: int = 1):
+        super().__init__()
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        self.count = count
+        self._failed = set()
+
+    def start(self, node_ids: List[str]) -> None:
+        super().start(node_ids)
+        self._failed = set()
+
+    def check(self, result: Dict[str, Any]) -> Optional[str]:
+        if result["status"] not in FAILED_STATUSES:
+            return None
+        # Parametrized instances of one test count as a single failure
+        self._failed.add(full_name(result["nodeid"]))
+        if len(self._failed) >= self.count:
+            return f"{len(self._failed)} distinct failing test(s)"
+        return None
+
+
+class TimeBudget(StoppingPolicy):
+    """Stop once the run has used its wall-clock budget."""
+
+    def __init__(self, seconds: float):
+        super().__init__()
+        self.seconds = seconds
+        self._started = time.monotonic()
+
+    def start(self, node_ids: List[str]) -> None:
+        super().start(node_ids)
+        self._started = time.monotonic()
+
+    def check(self, result: Dict[str, Any]) -> Optional[str]:
+        elapsed = time.monotonic() - self._started
+        if elapsed >= self.seconds:
+            return f"time budget of {self.seconds:g}s used ({elapsed:.2f}s elapsed)"
+        return None
+
+
+class FailureProbabilityThreshold(StoppingPolicy):
+    """
+    Stop once every remaining test is unlikely to fail.
+
+    Probabilities are looked up by node ID, then by 'Class::method' name, then
+    by bare method name, so histories keyed at any of those levels work. Tests
+    without a history are treated as ``default`` (1.0 unless given, so unknown
+    tests are always run).
+    """
+
+    def __init__(self, probabilities: Dict[str, float], threshold: float, default: float = 1.0):
+        super().__init__()
+        self.probabilities = probabilities
+        self.threshold = threshold
+        self.default = default
+        self._order: List[str] = []
+        self._suffix_max: List[float] = []
+        self._done = set()
+        self._next = 0
+
+    def probability(self, nodeid: str) -> float:
+        """Return the historical failure probability of a test."""
+        for key in (nodeid, strip_params(nodeid), full_name(nodeid), method_name(nodeid)):
+            if key in self.probabilities:
+                return self.probabilities[key]
+        return self.default
+
+    def start(self, node_ids: List[str]) -> None:
+        super().start(node_ids)
+        self._order = list(node_ids)
+        # suffix_max[i] is the highest probability among tests i..end
+        self._suffix_max = [0.0] * (len(self._order) + 1)
+        for i in range(len(self._order) - 1, -1, -1):
+            self._suffix_max[i] = max(self.probability(self._order[i]), self._suffix_max[i + 1])
+        self._done = set()
+        self._next = 0
+
+    def check(self, result: Dict[str, Any]) -> Optional[str]:
+        self._done.add(result["nodeid"])
+        # Results arrive roughly in order, so the first unfinished test only moves forward
+        while self._next < len(self._order) and self._order[self._next] in self._done:
+            self._next += 1
+        if self._next >= len(self._order):
+            return None
+        remaining = self._suffix_max[self._next]
+        if remaining < self.threshold:
+            return f"remaining tests have failure probability below {self.threshold:g} (max {remaining:.3f})"
+        return None
+
+
+class AnyOf(StoppingPolicy):
+    """Stop as soon as any of the given policies wants to."""
+
+    def __init__(self, policies: Iterable[StoppingPolicy]):
+        super().__init__()
+        self.policies = list(policies)
+
+    def start(self, node_ids: List[str]) -> None:
+        super().start(node_ids)
+        for policy in self.policies:
+            policy.start(node_ids)
+
+    def check(self, result: Dict[str, Any]) -> Optional[str]:
+        reason = None
+        # Every policy sees every result so their state stays consistent
+        for policy in self.policies:
+            reason = policy.update(result) or reason
+        return reason
+
+
+def load_failure_probabilities(history_file: str, logger=None) -> Dict[str, float]:
+    """
+    Load historical failure probabilities.
+
+    Args:
+        history_file: JSON file mapping test names either to a failure
+            probability or to a last result ('PASS'/'FAIL'), as written by
+            tests/analyze_regression.py, or a SQLite history store
+            (failure rate over all recorded runs)
+        logger: Optional logger instance
+
+    Returns:
+        Dictionary mapping test names to failure probabilities
+    """
+    if is_history_db(history_file):
+        with HistoryStore(history_file) as history:
+            return history.failure_rates()
+    
+    try:
+        with open(history_file, 'r') as f:
+            history = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        if logger:
+            logger.warning(f"Could not load failure history: {str(e)}")
+        return {}
+
+    probabilities = {}
+    for name, value in history.items():
+        if isinstance(value, str):
+            # FLAKY tests passed on a rerun, so they count as passing
+            probabilities[name] = 1.0 if value == "FAIL" else 0.0
+        else:
+            probabilities[name] = float(value)
+    return probabilities
+
+
+def build_stopping_policy(max_failures: Optional[int] = None, time_budget: Optional[float] = None,
+                          min_failure_probability: Optional[float] = None,
+                          failure_history: Optional[str] = None, logger=None) -> Optional[StoppingPolicy]:
+    """
+    Build a stopping policy from command-line style options.
+
+    Args:
+        max_failures: Stop after this many distinct failing tests
+        time_budget: Stop after this many seconds
+        min_failure_probability: Stop once no remaining test is at least this likely to fail
+        failure_history: History file for min_failure_probability
+        logger: Optional logger instance
+
+    Returns:
+        A policy, or None if no option was given
+    """
+    policies: List[StoppingPolicy] = []
+    if max_failures:
+        policies.append(MaxFailures(max_failures))
+    if time_budget:
+        policies.append(TimeBudget(time_budget))
+    if min_failure_probability is not None:
+        if not failure_history:
+            raise ValueError("min_failure_probability needs a failure history file")
+        probabilities = load_failure_probabilities(failure_history, logger)
+        policies.append(FailureProbabilityThreshold(probabilities, min_failure_probability))
+
+    if not policies:
+        return None
+    return policies[0] if len(policies) == 1 else AnyOf(policies)
+
+
+class StoppingPlugin:
+    """
+    Pytest plugin that applies a stopping policy to a session.
+
+    Tests run in the order pytest has them after collection; when the policy
+    says stop, the session stops after the current test and the rest are
+    recorded in ``policy.skipped``.
+    """
+
+    def __init__(self, policy: StoppingPolicy):
+        self.policy = policy
+        self.session = None
+        self.planned: List[str] = []
+        self.executed: List[str] = []
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def pytest_sessionstart(self, session):
+        self.session = session
+
+    def pytest_collection_finish(self, session):
+        # Runs after every pytest_collection_modifyitems, so this is the final order
+        self.planned = [item.nodeid for item in session.items]
+        self.executed = []
+        self.policy.start(self.planned)
+
+    def pytest_runtest_logreport(self, report):
+        result = self._pending.setdefault(report.nodeid, {"nodeid": report.nodeid, "status": "PASSED"})
+        if report.failed and result["status"] == "PASSED":
+            result["status"] = "FAILED" if report.when == "call" else "ERROR"
+        elif report.skipped and result["status"] == "PASSED":
+            result["status"] = "SKIPPED"
+        if report.when != "teardown":
+            return
+
+        del self._pending[report.nodeid]
+        self.executed.append(report.nodeid)
+        already_stopped = self.policy.reason is not None
+        reason = self.policy.update(result)
+        if reason and not already_stopped and len(self.executed) < len(self.planned):
+            if self.session.testsfailed:
+                # Report a failed run rather than an interrupted one
+                self.session.shouldfail = f"Stopping policy: {reason}"
+            else:
+                self.session.shouldstop = f"Stopping policy: {reason}"
+
+    def pytest_sessionfinish(self, session):
+        executed = set(self.executed)
+        self.policy.skipped = [nodeid for nodeid in self.planned if nodeid not in executed]
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.policy.reason is None:
+            return
+        terminalreporter.section("stopping policy")
+        terminalreporter.write_line(f"Stopped early: {self.policy.reason}")
+        terminalreporter.write_line(f"{len(self.policy.skipped)} test(s) not run:")
+        for nodeid in self.policy.skipped:
+            terminalreporter.write_line(f"  {nodeid}")
@@ -1,92 +1,256 @@
-import ast
 import os
 import inspect
 import importlib.util
 from typing import Dict, List, Any, Optional, Set
 
+from prioritization.discovery import default_rootdir, parse_module, visible_fixtures
+from prioritization.discovery_cache import DiscoveryCache
+
 def parse_test_file(file_path: str) -> Dict[str, Any]:
     """
     Parse a test file to extract fixtures, test classes, and test functions.
-    
+
+    The file is parsed by prioritization.discovery, so fixture and test
+    arguments are the ones pytest fills (no self, none with defaults).
+
     Args:
         file_path: Path to the test file
-    
+
     Returns:
-        Dictionary containing information about the test file
+        Dictionary containing information about the test file; 'tests'
+        maps each test ID ('Class::method' or 'function') to its arguments
     """
     with open(file_path, 'r') as f:
-        file_content = f.read()
-    
-    # Parse the file with AST
-    tree = ast.parse(file_content)
-    
-    # Extract information
+        module = parse_module(f.read())
+
+    def fixture_info(fixture, class_name=None):
+        return {'name': fixture['name'], 'lineno': fixture['lineno'], 'args': fixture['argnames'],
+                'has_params': fixture['params'] is not None, 'scope': fixture['scope'],
+                'autouse': fixture['autouse'], 'class_name': class_name}
+
     result = {
         'file_path': file_path,
-        'fixtures': [],
+        'fixtures': [fixture_info(fixture) for fixture in module['fixtures'].values()],
         'classes': [],
-        'functions': []
+        'functions': [],
+        'tests': {}
     }
-    
-    for node in ast.walk(tree):
-        # Find fixtures (functions with @pytest.fixture decorator)
-        if isinstance(node, ast.FunctionDef):
-            for decorator in node.decorator_list:
-                if (isinstance(decorator, ast.Call) and 
-                    isinstance(decorator.func, ast.Attribute) and 
-                    decorator.func.attr == 'fixture'):
-                    
-                    result['fixtures'].append({
-                        'name': node.name,
-                        'lineno': node.lineno,
-                        'args': [arg.arg for arg in node.args.args],
-                        'has_params': any(kwd.arg == 'params' for kwd in decorator.keywords)
-                    })
-        
-        # Find test classes
-        elif isinstance(node, ast.ClassDef) and node.name.startswith('Test'):
-            class_info = {
-                'name': node.name,
-                'methods': []
-            }
-            
-            for method in [n for n in node.body if isinstance(n, ast.FunctionDef)]:
-                if method.name.startswith('test_'):
-                    class_info['methods'].append({
-                        'name': method.name,
-                        'args': [arg.arg for arg in method.args.args if arg.arg != 'self'],
-                    })
-            
-            result['classes'].append(class_info)
-        
-        # Find standalone test functions
-        elif isinstance(node, ast.FunctionDef) and node.name.startswith('test_'):
-            result['functions'].append({
-                'name': node.name,
-                'args': [arg.arg for arg in node.args.args]
-            })
-    
+    for name, binding in module['bindings'].items():
+        if binding['kind'] == 'class' and name.startswith('Test'):
+            result['fixtures'].extend(fixture_info(fixture, name) for fixture in binding['fixtures'].values())
+            methods = [{'name': test['name'], 'args': test['argnames']} for test in binding['tests'].values()]
+            result['classes'].append({'name': name, 'methods': methods})
+            result['tests'].update((f"{name}::{method['name']}", method['args']) for method in methods)
+        elif binding['kind'] == 'function' and name.startswith('test'):
+            result['functions'].append({'name': name, 'args': binding['argnames']})
+            result['tests'][name] = binding['argnames']
     return result
 
 def get_fixture_dependencies(test_info: Dict[str, Any]) -> Set[str]:
     """Extract fixtures required by a test function."""
-    fixtures = set()
-    
-    # For class methods
+    test_id = test_info['method_name']
     if test_info.get('class_name'):
-        for cls_info in test_info.get('file_fixtures', {}).get('classes', []):
-            if cls_info['name'] == test_info['class_name']:
-                for method in cls_info['methods']:
-                    if method['name'] == test_info['method_name']:
-                        fixtures.update(method['args'])
-    
-    # For standalone functions
-    else:
-        for func in test_info.get('file_fixtures', {}).get('functions', []):
-            if func['name'] == test_info['method_name']:
-                fixtures.update(func['args'])
-    
-    return fixtures
+        test_id = f"{test_info['class_name']}::{test_id}"
+    return set(test_info.get('file_fixtures', {}).get('tests', {}).get(test_id, []))
+
+class FixtureGraph:
+    """
+    The fixtures visible to one test module, and which tests need each.
+
+    Built from prioritization.discovery's resolution of the module: its own
+    and imported fixtures, those of the conftest.py files above it and,
+    for each test class, those of the class and its bases. Closer
+    definitions override farther ones, and an overriding fixture that
+    requests its own name also needs what the overridden one needs, as in
+    pytest. Dependencies are resolved transitively when the graph is built,
+    so every lookup is a dictionary access. The graph is plain data and can
+    be stored with to_dict and restored with from_dict.
+    """
+
+    def __init__(self, definitions: Dict[str, Dict[str, Any]],
+                 class_definitions: Dict[str, Dict[str, Dict[str, Any]]],
+                 arguments: Dict[str, List[str]], tests: Dict[str, List[str]],
+                 dependents: Dict[str, List[str]]):
+        """
+        Args:
+            definitions: Fixture definitions visible in the module, by name
+            class_definitions: Fixtures of the module's test classes (including
+                inherited ones), by class and name
+            arguments: Fixtures each test of the module requests itself
+            tests: Every fixture each test needs, directly or transitively
+            dependents: Tests needing each fixture, directly or transitively
+        """
+        self.definitions = definitions
+        self.class_definitions = class_definitions
+        self.arguments = arguments
+        self.tests = tests
+        self.dependents = dependents
+
+    @classmethod
+    def build(cls, fixtures: Dict[str, Any]) -> "FixtureGraph":
+        """
+        Args:
+            fixtures: The module's fixtures, from discovery.visible_fixtures
+        """
+        definitions: Dict[str, Dict[str, Any]] = {}
+        for level in reversed(fixtures['levels']):
+            for name, fixture in level.items():
+                definitions[name] = cls._override(fixture, definitions.get(name))
+        # pytest uses autouse fixtures by name, even where a fixture that is not autouse overrides them
+        module_autouse = [name for level in reversed(fixtures['levels'])
+                          for name, fixture in level.items() if fixture['autouse']]
+
+        class_definitions: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        autouse = {None: module_autouse}
+        for class_name, layers in fixtures['classes'].items():
+            layer: Dict[str, Dict[str, Any]] = {}
+            for level in reversed(layers):
+                for name, fixture in level.items():
+                    layer[name] = cls._override(fixture, layer.get(name) or definitions.get(name))
+            if layer:
+                class_definitions[class_name] = layer
+                autouse[class_name] = module_autouse + [name for level in reversed(layers)
+                                                        for name, fixture in level.items() if fixture['autouse']]
+
+        closures: Dict[Optional[str], Dict[str, Set[str]]] = {}
+        arguments = fixtures['tests']
+        tests = {}
+        dependents: Dict[str, List[str]] = {}
+        for test_id, names in arguments.items():
+            class_name = test_id.split('::')[0] if '::' in test_id else None
+            if class_name not in class_definitions:
+                class_name = None
+            needed = cls._closure(autouse[class_name] + names, definitions, class_definitions.get(class_name),
+                                  closures.setdefault(class_name, {}))
+            tests[test_id] = needed
+            for name in needed:
+                dependents.setdefault(name, []).append(test_id)
+        return cls(definitions, class_definitions, dict(arguments), tests, dependents)
+
+    @staticmethod
+    def _override(fixture: Dict[str, Any], overridden: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge in the dependencies of the overridden fixture if the fixture requests it."""
+        if overridden is None or fixture['name'] not in fixture['argnames']:
+            return fixture
+        argnames = [arg for arg in fixture['argnames'] if arg != fixture['name']] + overridden['argnames']
+        return dict(fixture, argnames=list(dict.fromkeys(argnames)))
+
+    @staticmethod
+    def _closure(names: List[str], definitions: Dict[str, Dict[str, Any]],
+                 class_layer: Optional[Dict[str, Dict[str, Any]]],
+                 memo: Dict[str, Set[str]]) -> List[str]:
+        """Return the names and every fixture they need, sorted; names without a definition are kept."""
+        needed: Set[str] = set()
+        for name in names:
+            if name not in memo:
+                # Each fixture's own closure is computed once per class
+                reachable: Set[str] = set()
+                stack = [name]
+                while stack:
+                    current = stack.pop()
+                    if current in reachable:
+                        continue
+                    reachable.add(current)
+                    fixture = (class_layer or {}).get(current) or definitions.get(current)
+                    if fixture is not None:
+                        stack.extend(fixture['argnames'])
+                memo[name] = reachable
+            needed.update(memo[name])
+        return sorted(needed)
+
+    def definition(self, name: str, class_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the definition of a fixture as seen from a test (None for built-in or unknown fixtures)."""
+        layer = self.class_definitions.get(class_name) if class_name else None
+        return (layer or {}).get(name) or self.definitions.get(name)
+
+    def fixtures_of(self, test_id: str) -> List[str]:
+        """Return every fixture a test of the module needs, directly or transitively."""
+        return self.tests.get(test_id, [])
+
+    def dependents_of(self, fixture: str) -> List[str]:
+        """Return the tests of the module that need a fixture, directly or transitively."""
+        return self.dependents.get(fixture, [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'definitions': self.definitions,
+            'class_definitions': self.class_definitions,
+            'arguments': self.arguments,
+            'tests': self.tests,
+            'dependents': self.dependents
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FixtureGraph":
+        return cls(data['definitions'], data['class_definitions'], data['arguments'], data['tests'],
+                   data['dependents'])
+
+def conftest_files(file_path: str, rootdir: Optional[str] = None) -> List[str]:
+    """
+    Return the conftest.py files whose fixtures a test module sees, farthest first.
+
+    Args:
+        file_path: Test module
+        rootdir: Highest directory to look in (defaults to the filesystem root)
+    """
+    file_path = os.path.abspath(file_path)
+    stop = os.path.normcase(os.path.abspath(rootdir)) if rootdir else None
+    files = []
+    directory = os.path.dirname(file_path)
+    while True:
+        conftest = os.path.join(directory, 'conftest.py')
+        if conftest != file_path and os.path.isfile(conftest):
+            files.append(conftest)
+        if os.path.normcase(directory) == stop or os.path.dirname(directory) == directory:
+            break
+        directory = os.path.dirname(directory)
+    return files[::-1]
+
+def _unchanged(sources: Dict[str, str], cache: DiscoveryCache) -> bool:
+    """Return whether every file a graph was built from still has the same contents."""
+    try:
+        return all(cache.digest(path) == digest for path, digest in sources.items())
+    except OSError:
+        return False
+
+def fixture_graph(file_path: str, rootdir: Optional[str] = None,
+                  cache: Optional[DiscoveryCache] = None) -> FixtureGraph:
+    """
+    Build the fixture graph of a test module.
+
+    Files are read through the discovery cache, so each is parsed once for
+    discovery and fixtures alike. The graph is stored in the module's
+    'fixture_graph' section, together with the hashes of the files it was
+    built from (the module, its conftest.py files and the modules its
+    fixtures and classes come from), so it is rebuilt only when one of them
+    changed or a conftest.py file was added.
+
+    Args:
+        file_path: Test module
+        rootdir: Directory to look for conftest.py files up to and to
+            resolve imports from (defaults as in discovery.discover_tests)
+        cache: Optional discovery cache
+
+    Returns:
+        FixtureGraph of the module
+
+    Raises:
+        ValueError: If the module cannot be parsed
+    """
+    rootdir = rootdir or default_rootdir([file_path])
+    if cache is None:
+        return FixtureGraph.build(visible_fixtures(file_path, rootdir))
+
+    cached = cache.get(file_path, 'fixture_graph')
+    if (cached is not None and _unchanged(cached['sources'], cache)
+            and all(path in cached['sources'] for path in conftest_files(file_path, rootdir))):
+        return FixtureGraph.from_dict(cached['graph'])
+
+    fixtures = visible_fixtures(file_path, rootdir, cache)
+    graph = FixtureGraph.build(fixtures)
+    sources = {path: cache.digest(path) for path in fixtures['sources']}
+    cache.put(file_path, {'sources': sources, 'graph': graph.to_dict()}, 'fixture_graph')
+    return graph
 
 def load_module_from_file(file_path: str) -> Any:
     """Load a Python module from file path."""
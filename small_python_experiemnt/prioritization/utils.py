@@ -1,13 +1,58 @@
+import io
 import os
 import re
 import ast
 import astor 
 import torch
+import hashlib
 import inspect
-import subprocess
 import importlib.util
 from typing import List, Dict, Any, Callable, Optional, Tuple
 
+from prioritization.runner import run_tests
+from prioritization.nodeids import strip_params
+from prioritization.discovery import discover_tests
+
+
+# Nodes that add a decision point to a function's control flow
+BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler,
+                ast.comprehension, ast.Assert)
+
+
+def function_fingerprint(node):
+    """
+    Hash a function's AST.
+    
+    Reformatting a function or editing its comments keeps its fingerprint;
+    any change to its code (including its docstring) changes it.
+    """
+    return hashlib.sha1(ast.dump(node, include_attributes=False).encode()).hexdigest()[:16]
+
+
+def cyclomatic_complexity(node):
+    """Return McCabe's cyclomatic complexity of a function: 1 plus its decision points."""
+    complexity = 1
+    for child in ast.walk(node):
+        if isinstance(child, BRANCH_NODES):
+            complexity += 1
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+    return complexity
+
+
+def _qualified_names(tree):
+    """Map every function and class node in a module to its qualified name, e.g. 'Calculator.add'."""
+    names = {}
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names[child] = prefix + child.name
+                visit(child, names[child] + ".")
+            else:
+                visit(child, prefix)
+    visit(tree, "")
+    return names
+
 
 def extract_source_functions(source_dir, logger=None):
     """
@@ -18,7 +63,9 @@ def extract_source_functions(source_dir, logger=None):
         logger: Optional logger object for logging information
         
     Returns:
-        list: List of dictionaries containing function names and code
+        list: List of dictionaries containing function names, qualified
+            names, file (relative to source_dir), line number, code,
+            fingerprint (see function_fingerprint) and cyclomatic complexity
     """
     source_functions = []
     for file in os.listdir(os.path.abspath(source_dir)):
@@ -33,13 +80,19 @@ def extract_source_functions(source_dir, logger=None):
             # Use AST to extract functions
             try:
                 tree = ast.parse(content)
+                qualified_names = _qualified_names(tree)
                 for node in ast.walk(tree):
                     if isinstance(node, ast.FunctionDef):
                         function_name = node.name
                         function_body = astor.to_source(node)
                         source_functions.append({
                             'name': function_name,
-                            'code': function_body
+                            'qualname': qualified_names[node],
+                            'file': file,
+                            'lineno': node.lineno,
+                            'code': function_body,
+                            'fingerprint': function_fingerprint(node),
+                            'complexity': cyclomatic_complexity(node)
                         })
             except SyntaxError as e:
                 if logger:
@@ -48,7 +101,7 @@ def extract_source_functions(source_dir, logger=None):
     if logger:
         logger.info(f"Found {len(source_functions)} functions in source code")
         for func in source_functions:
-            logger.debug(f"Function: {func['name']}")
+            logger.debug(f"Function: {func['qualname']} ({func['fingerprint']})")
             
     return source_functions
 
@@ -215,89 +268,102 @@ def find_test_files(directory: str, pattern: str = "test_*.py") -> List[str]:
     return test_files
 
 
-def get_all_tests(test_dir: str) -> List[Dict[str, Any]]:
+def get_all_tests(test_dir: str, use_cache: bool = True, cache_file: Optional[str] = None,
+                  logger=None, items: bool = False, rootdir: Optional[str] = None,
+                  workers: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Get all tests from a directory with their semantic features.
     
+    Test files are found recursively and parsed across a process pool;
+    unchanged files are not parsed again, their results come from a
+    discovery cache (see prioritization.discovery).
+    
     Args:
         test_dir: Directory containing test files
+        use_cache: Whether to use the discovery cache
+        cache_file: Cache file (defaults to __pycache__/discovery_cache.json
+            in test_dir)
+        logger: Optional logger object for logging information
+        items: Return one dictionary per pytest item (each parametrized
+            instance, and each module a test class is collected in) with its
+            'nodeid', instead of one per test function
+        rootdir: Directory node IDs are relative to (defaults to pytest's)
+        workers: Processes used to parse changed files
         
     Returns:
-        List of dictionaries with test information and features
+        List of dictionaries with test information and features; test
+        functions list the node IDs of their items under 'nodeids'
     """
-    test_files = find_test_files(test_dir)
-    all_tests = []
-    
-    for file_path in test_files:
-        # Skip the version-specific wrappers
-        if "test_v0.py" in file_path or "test_v1.py" in file_path:
-            continue
-            
-        methods = extract_test_methods_from_ast(file_path)
-        for method in methods:
-            semantic_features = extract_semantic_features(method)
-            method.update({'semantic_features': semantic_features})
-            all_tests.append(method)
-    
-    return all_tests
+    discovery = discover_tests([test_dir], rootdir=rootdir, workers=workers, use_cache=use_cache,
+                               cache_file=cache_file, features=extract_semantic_features, logger=logger)
+    return discovery["items"] if items else discovery["tests"]
 
 
 def evaluate_fault_detection_efficiency(prioritized_tests: List[Dict[str, Any]], 
-                                       test_command: str = "pytest {test_name} -v") -> Dict[str, Any]:
+                                       test_file: str = "tests/test_v1.py") -> Dict[str, Any]:
     """
     Evaluates how quickly the prioritized test order finds faults in the code.
     
     Args:
-        prioritized_tests: List of test dictionaries in prioritized order
-        test_command: Command template to execute tests, with {test_name} placeholder
+        prioritized_tests: List of test dictionaries in prioritized order;
+            pytest items run their 'nodeid' and test functions every node ID
+            under 'nodeids', in order
+        test_file: Test module tests without node IDs are run from
         
     Returns:
-        Dictionary with statistics about fault detection efficiency
+        Dictionary with statistics about fault detection efficiency, with
+        positions counted over the pytest items that ran
     """
-    total_tests = len(prioritized_tests)
     detected_faults = set()
     all_faults = set()  # We'll populate this as we find faults
     fault_detection_positions = {}
-    tests_executed = 0
     
     print("Evaluating fault detection efficiency...")
     
-    for i, test in enumerate(prioritized_tests, 1):
-        test_name = test['full_name'].replace('::', '.')
-        test_path = f"tests/test_v1.py::{test_name}"
+    tests_by_node = {}
+    for test in prioritized_tests:
+        if test.get('nodeid'):
+            node_ids = [test['nodeid']]
+        else:
+            node_ids = test.get('nodeids') or [f"{test_file}::{test['full_name']}"]
+        for node_id in node_ids:
+            tests_by_node.setdefault(node_id, test)
+    
+    def record_result(result: Dict[str, Any]) -> None:
+        # A failing test means it detected a fault; tests that were never
+        # collected have no position and cannot have detected anything
+        if result['status'] not in ("FAILED", "ERROR") or result['rank'] is None:
+            return
         
-        # Run the test and check if it fails (which means it detected a fault)
-        cmd = test_command.format(test_name=test_path)
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        i = result['rank']
+        # A function-level ID runs as its parametrized instances
+        test = tests_by_node.get(result['nodeid']) or tests_by_node[strip_params(result['nodeid'])]
+        test_name = test['full_name']
+        output = result['output']
         
-        tests_executed += 1
-        is_failure = result.returncode != 0
+        # Try to extract what kind of error was found
+        if "ZeroDivisionError" in output:
+            fault_type = "division_by_zero"
+        elif "AssertionError" in output:
+            if "power" in test_name:
+                fault_type = "negative_exponent"
+            elif "square_root" in test_name:
+                fault_type = "incorrect_sqrt"
+            else:
+                fault_type = f"assertion_in_{test['method_name']}"
+        else:
+            fault_type = f"unknown_fault_{len(all_faults)}"
         
-        if is_failure:
-            # Extract the error type from the output
-            error_lines = [line for line in result.stderr.split('\n') 
-                          if 'ERROR' in line or 'FAILED' in line]
-            
-            for error_line in error_lines:
-                # Try to extract what kind of error was found
-                if "ZeroDivisionError" in result.stdout:
-                    fault_type = "division_by_zero"
-                elif "AssertionError" in result.stdout:
-                    if "power" in test_name:
-                        fault_type = "negative_exponent"
-                    elif "square_root" in test_name:
-                        fault_type = "incorrect_sqrt"
-                    else:
-                        fault_type = f"assertion_in_{test['method_name']}"
-                else:
-                    fault_type = f"unknown_fault_{len(all_faults)}"
-                
-                all_faults.add(fault_type)
-                
-                if fault_type not in detected_faults:
-                    detected_faults.add(fault_type)
-                    fault_detection_positions[fault_type] = i
-                    print(f"Fault '{fault_type}' detected by test #{i}: {test_name}")
+        all_faults.add(fault_type)
+        
+        if fault_type not in detected_faults:
+            detected_faults.add(fault_type)
+            fault_detection_positions[fault_type] = i
+            print(f"Fault '{fault_type}' detected by test #{i}: {test_name}")
+    
+    # Run the whole order in one pytest session, recording faults as tests finish
+    results = run_tests(list(tests_by_node), callback=record_result, verbose=False, output=io.StringIO())
+    total_tests = len([result for result in results if result['rank'] is not None])
     
     # Calculate efficiency metrics
     if all_faults:
@@ -349,11 +415,10 @@ def run_test_with_coverage(test_name: str, source_dir: str = "v1") -> Tuple[bool
     cov = coverage.Coverage(source=[source_dir])
     cov.start()
     
-    # Run the test
-    test_path = f"tests/test_v1.py::{test_name.replace('::', '.')}"
-    cmd = f"pytest {test_path} -v"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    passed = result.returncode == 0
+    # Run the test in this process so coverage actually sees it execute
+    test_path = f"tests/test_v1.py::{test_name}"
+    results = run_tests([test_path], verbose=False, output=io.StringIO())
+    passed = bool(results) and all(result['status'] == "PASSED" for result in results)
     
     # Stop coverage and get results
     cov.stop()
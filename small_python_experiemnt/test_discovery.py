@@ -0,0 +1,114 @@
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+import subprocess
+
+from prioritization.discovery import discover_tests, default_rootdir
+
+# A tree with a conftest.py, class-scoped and parametrized fixtures, a
+# parametrize mark and a test class imported into a second module
+FILES = {
+    "tests/conftest.py": '''
+        import pytest
+
+        @pytest.fixture(scope="module")
+        def db():
+            return {}
+
+        @pytest.fixture(params=["sqlite", "postgres"])
+        def backend(request):
+            return request.param
+    ''',
+    "tests/test_store.py": '''
+        import pytest
+
+        class TestStore:
+            @pytest.fixture(scope="class")
+            def store(self, db):
+                return db
+
+            def test_put(self, store):
+                pass
+
+            def test_backend(self, store, backend):
+                pass
+
+            @pytest.mark.parametrize("key", ["a", "b", 3])
+            def test_get(self, store, key, default=None):
+                pass
+
+        def test_module(db, backend):
+            pass
+    ''',
+    "tests/test_reuse.py": '''
+        import pytest
+        from test_store import TestStore as TestImported
+
+        @pytest.fixture(params=[1, 2], ids=["one", "two"])
+        def size(request):
+            return request.param
+
+        def test_size(size, backend):
+            pass
+    ''',
+    "tests/sub/test_deep.py": '''
+        def test_deep(db):
+            pass
+    ''',
+}
+
+
+def collect_only(paths, cwd):
+    """Return the node IDs pytest collects, run from cwd."""
+    result = subprocess.run([sys.executable, "-m", "pytest", "--collect-only", "-q", "-p", "no:cacheprovider", *paths],
+                            cwd=cwd, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+    return [line for line in result.stdout.splitlines() if "::" in line]
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tmp.name)
+        for path, source in FILES.items():
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            with open(os.path.join(self.root, path), "w") as f:
+                f.write(textwrap.dedent(source))
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def discover(self, paths, cwd):
+        os.chdir(cwd)
+        return [item["nodeid"] for item in discover_tests(paths, use_cache=False, workers=1)["items"]]
+
+    def test_matches_pytest_collection(self):
+        """Test that discovery finds the items pytest collects, in the same order."""
+        expected = collect_only(["tests"], self.root)
+        self.assertEqual(len(expected), 19)
+        self.assertEqual(self.discover(["tests"], self.root), expected)
+
+    def test_matches_pytest_collection_outside_project(self):
+        """Test that node IDs match pytest's when run from a directory sharing only the filesystem root."""
+        outside = os.path.abspath(os.sep)
+        tests = os.path.join(self.root, "tests")
+        expected = collect_only([tests], outside)
+        self.assertIn("test_store.py::TestStore::test_put", expected)
+        self.assertEqual(self.discover([tests], outside), expected)
+
+    def test_default_rootdir(self):
+        """Test that the rootdir includes the cwd unless only the filesystem root is shared."""
+        os.chdir(self.root)
+        self.assertEqual(default_rootdir(["tests/sub"]), self.root)
+        self.assertEqual(default_rootdir(["tests/test_store.py::TestStore"]), self.root)
+        self.assertEqual(default_rootdir([]), self.root)
+        os.chdir(os.path.abspath(os.sep))
+        tests = os.path.join(self.root, "tests")
+        self.assertEqual(default_rootdir([tests, os.path.join(tests, "sub")]), tests)
+
+if __name__ == '__main__':
+    unittest.main()
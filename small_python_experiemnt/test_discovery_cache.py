@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import tempfile
+import unittest
+
+from prioritization.discovery_cache import CACHE_VERSION, DiscoveryCache
+
+
+class TestDiscoveryCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp.name, "__pycache__", "discovery_cache.json")
+        self.test_file = os.path.join(self.tmp.name, "test_sample.py")
+        self.write("def test_one():\n    pass\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, source, mtime_ns=None):
+        with open(self.test_file, "w") as f:
+            f.write(source)
+        if mtime_ns is not None:
+            os.utime(self.test_file, ns=(mtime_ns, mtime_ns))
+
+    def reopen(self):
+        return DiscoveryCache(self.cache_file)
+
+    def test_reused_after_save(self):
+        """Test that data cached for an unchanged file survives a save and reload."""
+        cache = self.reopen()
+        self.assertIsNone(cache.get(self.test_file))
+        cache.put(self.test_file, {"tests": ["test_one"]})
+        cache.save()
+        cache = self.reopen()
+        self.assertEqual(cache.get(self.test_file), {"tests": ["test_one"]})
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        self.assertFalse(cache.dirty)
+
+    def test_touched_file_is_reused(self):
+        """Test that a file with a new mtime but the same contents keeps its data."""
+        cache = self.reopen()
+        cache.put(self.test_file, {"tests": ["test_one"]})
+        self.write("def test_one():\n    pass\n", mtime_ns=os.stat(self.test_file).st_mtime_ns + 10 ** 9)
+        self.assertEqual(cache.get(self.test_file), {"tests": ["test_one"]})
+        # The new mtime is recorded, so the next lookup needs no hashing
+        self.assertTrue(cache.dirty)
+
+    def test_changed_file_is_invalidated(self):
+        """Test that changed contents of the same size invalidate every section of the file."""
+        cache = self.reopen()
+        cache.put(self.test_file, {"tests": ["test_one"]})
+        cache.put(self.test_file, {"graph": {}}, "fixture_graph")
+        mtime_ns = os.stat(self.test_file).st_mtime_ns
+        self.write("def test_two():\n    pass\n", mtime_ns=mtime_ns + 10 ** 9)
+        self.assertIsNone(cache.get(self.test_file))
+        self.assertIsNone(cache.get(self.test_file, "fixture_graph"))
+
+        # Storing one section for the new contents drops the old ones
+        cache.put(self.test_file, {"tests": ["test_two"]})
+        self.assertEqual(cache.get(self.test_file), {"tests": ["test_two"]})
+        self.assertIsNone(cache.get(self.test_file, "fixture_graph"))
+
+    def test_digest(self):
+        with open(self.test_file, "rb") as f:
+            expected = hashlib.sha1(f.read()).hexdigest()
+        cache = self.reopen()
+        self.assertEqual(cache.digest(self.test_file), expected)
+        cache.put(self.test_file, {})
+        self.assertEqual(cache.digest(self.test_file), expected)
+
+    def test_discards_old_versions_and_corrupt_files(self):
+        """Test that a cache written by another version, or unreadable, starts empty."""
+        cache = self.reopen()
+        cache.put(self.test_file, {"tests": ["test_one"]})
+        cache.save()
+        with open(self.cache_file) as f:
+            data = json.load(f)
+        data["version"] = CACHE_VERSION - 1
+        with open(self.cache_file, "w") as f:
+            json.dump(data, f)
+        self.assertIsNone(self.reopen().get(self.test_file))
+
+        with open(self.cache_file, "w") as f:
+            f.write("{not json")
+        self.assertIsNone(self.reopen().get(self.test_file))
+
+    def test_save_drops_deleted_files(self):
+        """Test that files deleted since they were cached are not written back."""
+        other = os.path.join(self.tmp.name, "test_other.py")
+        with open(other, "w") as f:
+            f.write("")
+        cache = self.reopen()
+        cache.put(self.test_file, {})
+        cache.put(other, {})
+        os.remove(other)
+        cache.save()
+        with open(self.cache_file) as f:
+            self.assertEqual(list(json.load(f)["files"]), [os.path.abspath(self.test_file)])
+
+if __name__ == '__main__':
+    unittest.main()
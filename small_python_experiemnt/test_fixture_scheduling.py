@@ -0,0 +1,118 @@
+import os
+import random
+import tempfile
+import textwrap
+import unittest
+
+from prioritization.fixture_scheduling import fixture_setup_cost, schedule_by_fixtures, shared_fixtures
+
+FILES = {
+    "tests/conftest.py": '''
+        import pytest
+
+        @pytest.fixture(scope="session")
+        def server():
+            pass
+
+        @pytest.fixture(scope="module")
+        def db(server):
+            pass
+    ''',
+    "tests/test_store.py": '''
+        import pytest
+
+        @pytest.fixture(scope="module", params=["sqlite", "postgres"])
+        def backend(db):
+            pass
+
+        class TestStore:
+            @pytest.fixture(scope="class", autouse=True)
+            def store(self):
+                pass
+
+            def test_put(self, tmp_path):
+                pass
+
+            def test_backend(self, backend, retries=3):
+                pass
+
+        def test_plain():
+            pass
+    ''',
+}
+
+
+def make_test(file, name, class_name=None, param_id=None):
+    return {"file": file, "class_name": class_name, "method_name": name, "param_id": param_id,
+            "full_name": f"{class_name}::{name}" if class_name else name}
+
+
+class TestSharedFixtures(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        for path, source in FILES.items():
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            with open(os.path.join(self.root, path), "w") as f:
+                f.write(textwrap.dedent(source))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_finds_shared_fixtures_with_their_scope_nodes(self):
+        """Test that class, module and session fixtures are found transitively, with parameters."""
+        tests = [
+            make_test("tests/test_store.py", "test_put", "TestStore"),
+            make_test("tests/test_store.py", "test_backend", "TestStore", "postgres"),
+            make_test("tests/test_store.py", "test_plain"),
+        ]
+        cache_file = os.path.join(self.root, "cache.json")
+        for _ in range(2):
+            # Built once, then read back from the cache
+            fixtures = shared_fixtures(tests, self.root, cache_file)
+            self.assertEqual([sorted(needed) for needed in fixtures], [
+                [("tests/test_store.py::TestStore", "store", None)],
+                [("", "server", None), ("tests/test_store.py", "backend", "postgres"),
+                 ("tests/test_store.py", "db", None), ("tests/test_store.py::TestStore", "store", None)],
+                [],
+            ])
+
+
+class TestScheduleByFixtures(unittest.TestCase):
+    def setUp(self):
+        # Tests of four modules, interleaved the way a priority order tends to leave them
+        rng = random.Random(0)
+        self.tests = [make_test(f"tests/test_{i % 4}.py", f"test_{i}") for i in range(40)]
+        rng.shuffle(self.tests)
+        self.fixtures = [[(t["file"], "db", None)] for t in self.tests]
+
+    def test_displacement_bound_and_fewer_setups(self):
+        """Test that no test moves further than max_displacement and shared setups go down."""
+        for max_displacement in (1, 3, 10):
+            scheduled = schedule_by_fixtures(self.tests, self.fixtures, max_displacement=max_displacement)
+            self.assertCountEqual(map(id, scheduled), map(id, self.tests))
+            rank = {id(t): i for i, t in enumerate(self.tests)}
+            order = [rank[id(t)] for t in scheduled]
+            self.assertLessEqual(max(abs(r - i) for i, r in enumerate(order)), max_displacement)
+            before = fixture_setup_cost(self.tests, self.fixtures)
+            after = fixture_setup_cost(self.tests, self.fixtures, order=order)
+            self.assertLess(after["setups"], before["setups"])
+
+    def test_costs_steer_the_order(self):
+        """Test that the expensive module's fixture is the one set up only once."""
+        tests = [make_test("tests/test_a.py", "test_1"), make_test("tests/test_b.py", "test_2"),
+                 make_test("tests/test_a.py", "test_3"), make_test("tests/test_b.py", "test_4")]
+        fixtures = [[(t["file"], "db_" + t["file"][-4], None)] for t in tests]
+        for costs, expected in (({"db_a": 10.0, "db_b": 0.1}, ["test_2", "test_1", "test_3", "test_4"]),
+                                ({"db_a": 0.1, "db_b": 10.0}, ["test_1", "test_3", "test_2", "test_4"])):
+            scheduled = schedule_by_fixtures(tests, fixtures, costs, max_displacement=1)
+            self.assertEqual([t["method_name"] for t in scheduled], expected)
+            order = [tests.index(t) for t in scheduled]
+            self.assertLess(fixture_setup_cost(tests, fixtures, costs, order)["cost"],
+                            fixture_setup_cost(tests, fixtures, costs)["cost"])
+
+    def test_zero_displacement_keeps_the_order(self):
+        self.assertEqual(schedule_by_fixtures(self.tests, self.fixtures, max_displacement=0), self.tests)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+from prioritization.history_store import HistoryStore
+from prioritization.failure_scoring import FailureScorer, HistoryIndex
+
+A = "tests/test_v1.py::TestCalculator::test_add[v1]"
+B = "tests/test_v1.py::TestCalculator::test_divide"
+C = "tests/test_v1.py::TestCalculator::test_power"
+D = "tests/test_v1.py::TestCalculator::test_gcd"
+
+# Outcome of each test in runs 1 to 4, and its duration
+OUTCOMES = {
+    A: (["FAILED", "PASSED", "FAILED", "PASSED"], 0.2),
+    B: (["PASSED", "PASSED", "PASSED", "ERROR"], 0.3),
+    C: (["PASSED", "FLAKY", "PASSED", "PASSED"], 0.5),
+    D: (["PASSED", "PASSED", "PASSED", "PASSED"], 0.1),
+}
+
+
+def discovered(*names):
+    return [{"full_name": name, "method_name": name.split("::")[-1]} for name in names]
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.history = HistoryStore(":memory:", batch_size=3)
+        for run in range(4):
+            self.history.record_run(
+                [{"nodeid": test, "status": outcomes[run], "duration": duration}
+                 for test, (outcomes, duration) in OUTCOMES.items()],
+                commit=f"c{run}", timestamp=100.0 * (run + 1))
+
+    def tearDown(self):
+        self.history.close()
+
+    def test_failure_rates(self):
+        """Test that failure rates count FAILED and ERROR but not FLAKY, over all or the latest runs."""
+        self.assertEqual(self.history.run_count(), 4)
+        self.assertEqual(self.history.failure_rates(), {A: 0.5, B: 0.25, C: 0.0, D: 0.0})
+        self.assertEqual(self.history.failure_rates(last_runs=2), {A: 0.5, B: 0.5, C: 0.0, D: 0.0})
+        self.assertEqual(self.history.failure_rates(last_runs=1)[A], 0.0)
+
+    def test_flip_rates(self):
+        """Test that a flip is a FLAKY run or a run whose failure differs from the test's previous run."""
+        self.assertEqual(self.history.flip_rates(), {A: 0.75, B: 0.25, C: 0.25, D: 0.0})
+        # The first run in the window has no previous run to flip from
+        self.assertEqual(self.history.flip_rates(last_runs=2), {A: 0.5, B: 0.5, C: 0.0, D: 0.0})
+        self.assertEqual(self.history.flaky_tests(), [C])
+        self.assertEqual(self.history.flaky_tests(last_runs=2), [])
+
+    def test_runs_since_failure(self):
+        """Test that failures are aged in runs (0 for the latest) and in seconds, and never-failing tests are absent."""
+        self.assertEqual(self.history.runs_since_failure(), {A: 1, B: 0})
+        self.assertEqual(self.history.last_failure_age(now=500.0), {A: 200.0, B: 100.0})
+
+    def test_test_stats(self):
+        """Test that the combined statistics agree with the individual queries."""
+        stats = self.history.test_stats()
+        self.assertEqual(stats[A], {"runs": 4, "failures": 2, "failure_rate": 0.5, "mean_duration": 0.2,
+                                    "last_failure": 300.0})
+        self.assertIsNone(stats[D]["last_failure"])
+        self.assertEqual(self.history.mean_durations(), {test: duration for test, (_, duration) in OUTCOMES.items()})
+
+    def test_import_snapshot(self):
+        """Test that a legacy snapshot is recorded as a run with runner outcomes."""
+        self.history.import_snapshot({"test_add": "FAIL", "test_power": "FLAKY", "test_gcd": "PASS"})
+        rows = [row[1:3] for row in self.history.iter_results(since_run=4)]
+        self.assertEqual(sorted(rows), [("test_add", "FAILED"), ("test_gcd", "PASSED"), ("test_power", "FLAKY")])
+
+    def test_failure_scorer_ranking(self):
+        """Test that tests rank by decayed failures and transitions, then by duration."""
+        tests = discovered("TestCalculator::test_power", "TestCalculator::test_gcd",
+                           "TestCalculator::test_divide", "TestCalculator::test_add")
+        scorer = FailureScorer(half_life=10).consume(self.history.iter_results())
+        ranked = [test["full_name"] for test in scorer.rank(tests)]
+        # test_add failed twice and flipped three times, test_divide failed once, most recently;
+        # the others never failed and the faster one goes first
+        self.assertEqual(ranked, ["TestCalculator::test_add", "TestCalculator::test_divide",
+                                  "TestCalculator::test_gcd", "TestCalculator::test_power"])
+
+
+class TestFailureScorer(unittest.TestCase):
+    def test_flaky_runs_discount_the_score(self):
+        """Test that of two tests with the same failures, the one that was FLAKY ranks lower."""
+        scorer = FailureScorer()
+        scorer.update(1, "test_steady", "FAILED")
+        scorer.update(1, "test_flaky", "FAILED")
+        scorer.update(2, "test_steady", "PASSED")
+        scorer.update(2, "test_flaky", "FLAKY")
+        ranked = scorer.rank(discovered("TestX::test_flaky", "TestX::test_steady"))
+        self.assertEqual([test["full_name"] for test in ranked], ["TestX::test_steady", "TestX::test_flaky"])
+
+    def test_older_failures_count_less(self):
+        """Test that a failure half_life runs ago counts half as much as one in the latest run."""
+        scorer = FailureScorer(half_life=2, transition_weight=0)
+        scorer.update(1, "test_old", "FAILED")
+        scorer.update(3, "test_new", "FAILED")
+        scores = scorer.scores(HistoryIndex(discovered("TestX::test_old", "TestX::test_new")))
+        self.assertAlmostEqual(scores["TestX::test_old"][0], 0.5)
+        self.assertAlmostEqual(scores["TestX::test_new"][0], 1.0)
+
+    def test_index_trusts_only_unique_method_names(self):
+        """Test that history keyed by a bare method name only matches when one test has that name."""
+        index = HistoryIndex(discovered("TestA::test_add", "TestB::test_add", "TestA::test_gcd"))
+        self.assertEqual(index.resolve("test_gcd"), "TestA::test_gcd")
+        self.assertIsNone(index.resolve("test_add"))
+        self.assertEqual(index.resolve("tests/test_v1.py::TestB::test_add[v0]"), "TestB::test_add")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import io
+import os
+import sys
+import json
+import types
+import tempfile
+import textwrap
+import contextlib
+import unittest
+
+import pytest
+
+from prioritization.order_plugin import load_priority_order, priority_keys, rank_items
+
+TESTS = '''
+import pytest
+
+class TestCalc:
+    @pytest.mark.parametrize("version", ["v0", "v1"])
+    def test_add(self, version):
+        pass
+
+    def test_divide(self):
+        pass
+
+def test_power():
+    pass
+'''
+
+
+class Recorder:
+    """Records the node IDs a session runs, in order."""
+
+    def __init__(self):
+        self.nodeids = []
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call":
+            self.nodeids.append(report.nodeid)
+
+
+class TestPriorityKeys(unittest.TestCase):
+    def test_parametrized_node_id(self):
+        """Test that a parametrized item matches its own ID, then its name with and without parameters."""
+        self.assertEqual(priority_keys("tests/test_v1.py::TestCalc::test_add[v1]"), [
+            "tests/test_v1.py::TestCalc::test_add[v1]",
+            "TestCalc::test_add[v1]",
+            "tests/test_v1.py::TestCalc::test_add",
+            "TestCalc::test_add",
+        ])
+
+    def test_plain_node_id(self):
+        self.assertEqual(priority_keys("tests/test_v1.py::test_power"), ["tests/test_v1.py::test_power", "test_power"])
+
+
+class TestRankItems(unittest.TestCase):
+    def test_sorts_by_most_specific_entry(self):
+        """Test that items follow the order file, instances keep their order and unlisted items go last."""
+        nodeids = ["t.py::TestCalc::test_add[v0]", "t.py::TestCalc::test_add[v1]",
+                   "t.py::TestCalc::test_divide", "t.py::test_power", "t.py::test_other"]
+        items = [types.SimpleNamespace(nodeid=nodeid) for nodeid in nodeids]
+        rank_items(items, ["test_power", "TestCalc::test_add[v1]", "TestCalc::test_divide", "TestCalc::test_add",
+                           "test_power"])
+        self.assertEqual([item.nodeid for item in items], [
+            "t.py::test_power", "t.py::TestCalc::test_add[v1]", "t.py::TestCalc::test_divide",
+            "t.py::TestCalc::test_add[v0]", "t.py::test_other",
+        ])
+
+
+class TestOrderPlugin(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        with open("test_order_sample.py", "w") as f:
+            f.write(textwrap.dedent(TESTS))
+
+    def tearDown(self):
+        sys.modules.pop("test_order_sample", None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def run_order(self, order, *args):
+        with open("order.json", "w") as f:
+            json.dump(order, f)
+        recorder = Recorder()
+        with contextlib.redirect_stdout(io.StringIO()):
+            pytest.main(["-q", "-p", "no:cacheprovider", "-p", "prioritization.order_plugin",
+                         "--priority-order=order.json", *args, "test_order_sample.py"], plugins=[recorder])
+        return recorder.nodeids
+
+    def test_runs_in_priority_order(self):
+        """Test that a session runs the order file's tests first and the unlisted ones last."""
+        ran = self.run_order([{"full_name": "test_power"}, "test_order_sample.py::TestCalc::test_add[v1]",
+                              "TestCalc::test_add"])
+        self.assertEqual(ran, [
+            "test_order_sample.py::test_power",
+            "test_order_sample.py::TestCalc::test_add[v1]",
+            "test_order_sample.py::TestCalc::test_add[v0]",
+            "test_order_sample.py::TestCalc::test_divide",
+        ])
+
+    def test_load_priority_order(self):
+        """Test that an order file may list test dictionaries as well as names."""
+        with open("order.json", "w") as f:
+            json.dump([{"full_name": "TestCalc::test_divide", "method_name": "test_divide"}, "test_power"], f)
+        self.assertEqual(load_priority_order("order.json"), ["TestCalc::test_divide", "test_power"])
+
+    def test_stops_at_max_failures(self):
+        """Test that the stopping options end the session."""
+        with open("test_order_sample.py", "a") as f:
+            f.write("\ndef test_fails():\n    assert False\n")
+        ran = self.run_order(["test_fails", "test_power"], "--priority-max-failures=1")
+        self.assertEqual(ran, ["test_order_sample.py::test_fails"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from prioritization.parallel_executor import ParallelExecutor, sequence_results
+from prioritization.runner import run_tests
+from prioritization.stopping import MaxFailures
+
+TESTS = '''
+import pytest
+
+@pytest.mark.parametrize("value", [1, 2, 3])
+def test_value(value):
+    assert value != 2
+
+def test_plain():
+    pass
+
+class TestGroup:
+    def test_first(self):
+        pass
+
+    def test_second(self):
+        assert False
+'''
+
+
+class TestParallelExecutor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        with open("test_sample.py", "w") as f:
+            f.write(textwrap.dedent(TESTS))
+
+    def tearDown(self):
+        # run_tests imports the module in this process, and forked workers would inherit it
+        sys.modules.pop("test_sample", None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_ranks_expanded_items_like_the_runner(self):
+        """Test that a test's ID without parameters runs each instance with its own rank, as run serially."""
+        node_ids = ["test_sample.py::TestGroup", "test_sample.py::test_value", "test_sample.py::test_missing"]
+        with ParallelExecutor(["test_sample.py"], num_workers=2) as executor:
+            parallel = executor.run(node_ids)
+        serial = run_tests(node_ids, verbose=False, output=io.StringIO())
+
+        def summary(results):
+            return [(result["rank"], result["nodeid"], result["status"]) for result in sequence_results(results)]
+        self.assertEqual(summary(parallel), summary(serial))
+        self.assertEqual(summary(parallel), [
+            (1, "test_sample.py::TestGroup::test_first", "PASSED"),
+            (2, "test_sample.py::TestGroup::test_second", "FAILED"),
+            (3, "test_sample.py::test_value[1]", "PASSED"),
+            (4, "test_sample.py::test_value[2]", "FAILED"),
+            (5, "test_sample.py::test_value[3]", "PASSED"),
+            (None, "test_sample.py::test_missing", "ERROR"),
+        ])
+
+    def test_records_rank_and_completion(self):
+        """Test that every ranked result records its worker and when it started and completed."""
+        with ParallelExecutor(["test_sample.py"], num_workers=2, batch_size=2) as executor:
+            results = executor.run(["test_sample.py::test_plain", "test_sample.py::test_value"])
+        self.assertEqual(sorted(result["rank"] for result in results), [1, 2, 3, 4])
+        for result in results:
+            self.assertIn(result["worker"], (0, 1))
+            self.assertLessEqual(0, result["started_at"])
+            self.assertLessEqual(result["started_at"], result["completed_at"])
+        completed = [result["completed_at"] for result in sequence_results(results, "completion")]
+        self.assertEqual(completed, sorted(completed))
+
+    def test_stop_policy_skips_tests_not_started(self):
+        """Test that tests no worker has started are skipped once the policy stops the run."""
+        node_ids = ["test_sample.py::test_value", "test_sample.py::test_plain", "test_sample.py::TestGroup"]
+        policy = MaxFailures(1)
+        with ParallelExecutor(["test_sample.py"], num_workers=1, batch_size=1) as executor:
+            results = executor.run(node_ids, stop_policy=policy)
+        self.assertIsNotNone(policy.reason)
+        run = {result["nodeid"] for result in results}
+        self.assertIn("test_sample.py::test_value[2]", run)
+        # The worker may have started more tests before the failure arrived
+        self.assertFalse(run & set(policy.skipped))
+        self.assertEqual(len(run) + len(policy.skipped), 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import json
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    from prioritization.prioritization_methods import function_weights, record_function_history, submod_ordering
+    from prioritization.utils import extract_source_functions
+except ImportError as e:  # numpy, torch or transformers missing
+    MISSING = str(e)
+else:
+    MISSING = None
+
+SOURCE = '''
+def alpha(x):
+    return x + 1
+
+def beta(x):
+    return x * 2
+'''
+
+# Stub embeddings, picked by the first key found in the code. test_b is
+# close to alpha and a little to beta; test_a is even closer to alpha.
+VECTORS = {
+    "def alpha": [1.0, 0.0],
+    "def beta": [0.0, 1.0],
+    "test_a": [1.0, 0.05],
+    "test_b": [1.0, 0.3],
+    "test_c": [0.0, 1.0],
+}
+
+@unittest.skipIf(MISSING, f"prioritization dependencies not installed: {MISSING}")
+class TestSubmodOrdering(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.tmp.name, "src")
+        os.makedirs(self.source_dir)
+        with open(os.path.join(self.source_dir, "module.py"), "w") as f:
+            f.write(SOURCE)
+        self.tests = [{"full_name": name, "code": f"def {name}(): pass"} for name in ("test_a", "test_b", "test_c")]
+        self.embedded = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def embed(self, code):
+        self.embedded.append(code)
+        return np.array(next(vector for key, vector in VECTORS.items() if key in code))
+
+    def test_facility_location_gain_has_diminishing_returns(self):
+        """Test that a test adding little over the selected ones is picked after one covering new functions."""
+        # By total similarity test_a (1.05) beats test_c (1.0), but once
+        # test_b has covered alpha, test_c raises beta's best similarity much more.
+        ordered = submod_ordering(self.tests, self.source_dir, embed=self.embed)
+        self.assertEqual([test["full_name"] for test in ordered], ["test_b", "test_c", "test_a"])
+
+    def test_ordering_does_not_update_history(self):
+        """Test that ordering only reads the function history, so repeated orders agree."""
+        history_file = os.path.join(self.tmp.name, "history.json")
+        first = submod_ordering(self.tests, self.source_dir, history_file=history_file, embed=self.embed)
+        second = submod_ordering(self.tests, self.source_dir, history_file=history_file, embed=self.embed)
+        self.assertEqual(first, second)
+        self.assertFalse(os.path.exists(history_file))
+
+        record_function_history(self.source_dir, history_file)
+        with open(history_file) as f:
+            history = json.load(f)
+        self.assertEqual(sorted(history), ["module.py::alpha", "module.py::beta"])
+        functions = extract_source_functions(self.source_dir)
+        self.assertEqual(function_weights(functions, history_file=history_file), [0.0, 0.0])
+
+    def test_embedding_cache_without_suffix_is_reused(self):
+        """Test that an embedding cache named without .npz is found on the next run."""
+        cache = os.path.join(self.tmp.name, "embeddings")
+        submod_ordering(self.tests, self.source_dir, embedding_cache=cache, embed=self.embed)
+        self.assertTrue(os.path.exists(cache + ".npz"))
+        self.embedded.clear()
+        submod_ordering(self.tests, self.source_dir, embedding_cache=cache, embed=self.embed)
+        self.assertFalse([code for code in self.embedded if code.lstrip().startswith("def alpha")
+                          or code.lstrip().startswith("def beta")])
+
+if __name__ == '__main__':
+    unittest.main()
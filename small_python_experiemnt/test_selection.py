@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import textwrap
+import unittest
+
+from prioritization.selection import diff_directories, select_tests
+
+FILES = {
+    "calc.py": '''
+        import math
+
+        PRECISION = 2
+
+
+        def _check(b):
+            if b == 0:
+                raise ValueError("division by zero")
+
+
+        def add(a, b):
+            return a + b
+
+
+        def divide(a, b):
+            _check(b)
+            return a / b
+
+
+        def root(a):
+            return math.sqrt(a)
+
+
+        if __name__ == "__main__":
+            print(add(1, 2))
+    ''',
+    "tests/conftest.py": '''
+        import pytest
+        import calc
+
+
+        @pytest.fixture
+        def halves():
+            return calc.divide(1, 2)
+    ''',
+    "tests/test_calc.py": '''
+        import calc
+
+        HELPER = 1
+
+
+        class TestCalc:
+            def test_add(self):
+                assert calc.add(1, 2) == 3
+
+            def test_divide(self):
+                assert calc.divide(4, 2) == 2
+
+            def test_half(self, halves):
+                assert halves == 0.5
+
+        def test_root():
+            assert calc.root(4) == 2
+    ''',
+    "tests/test_wrap.py": '''
+        from test_calc import TestCalc as TestWrapped
+    ''',
+    "README.md": "Calculator\n",
+}
+
+TESTS = [{"full_name": name} for name in
+         ("TestCalc::test_add", "TestCalc::test_divide", "TestCalc::test_half", "test_root")]
+
+
+class TestSelectTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        for path, source in FILES.items():
+            path = os.path.join("old", path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(textwrap.dedent(source))
+        shutil.copytree("old", "new")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def edit(self, path, old, new):
+        path = os.path.join("new", path)
+        with open(path) as f:
+            source = f.read()
+        self.assertIn(old, source)
+        with open(path, "w") as f:
+            f.write(source.replace(old, new))
+
+    def select(self):
+        result = select_tests(TESTS, diff_directories("old", "new"), test_dir="new/tests", source_dirs=("new",))
+        result["selected"] = [test["full_name"] for test in result["selected"]]
+        return result
+
+    def test_changed_function_selects_its_callers(self):
+        """Test that a change selects the tests reaching it through calls and fixtures, not the others."""
+        self.edit("calc.py", "raise ValueError", "raise ZeroDivisionError")
+        result = self.select()
+        self.assertFalse(result["fallback"])
+        self.assertEqual(result["changed_functions"], ["new/calc.py::_check"])
+        self.assertEqual(result["selected"], ["TestCalc::test_divide", "TestCalc::test_half"])
+
+    def test_changed_import_selects_its_users(self):
+        """Test that a changed module-level import counts as a change to the functions using it."""
+        self.edit("calc.py", "import math", "import math as math")
+        self.assertEqual(self.select()["selected"], ["test_root"])
+
+    def test_changed_test_and_test_module(self):
+        """Test that a changed test selects itself and module-level code in a test file selects its tests."""
+        self.edit("tests/test_calc.py", "calc.add(1, 2) == 3", "calc.add(2, 2) == 4")
+        self.assertEqual(self.select()["selected"], ["TestCalc::test_add"])
+        self.edit("tests/test_calc.py", "HELPER = 1", "HELPER = 2")
+        self.assertEqual(self.select()["selected"], [test["full_name"] for test in TESTS])
+
+    def test_changes_that_cannot_affect_tests(self):
+        """Test that comments, blank lines, main blocks and documentation select nothing."""
+        self.edit("calc.py", "def add(a, b):\n", "def add(a, b):\n    # Plain addition\n\n")
+        self.edit("calc.py", "print(add(1, 2))", "print(add(2, 2))")
+        self.edit("README.md", "Calculator", "A calculator")
+        result = self.select()
+        self.assertEqual((result["fallback"], result["selected"], result["unmapped"]), (False, [], []))
+
+    def test_fallbacks(self):
+        """Test that every kind of change that cannot be mapped selects the full suite and says why."""
+        cases = [
+            ("calc.py", "PRECISION = 2", "PRECISION = 3", "new/calc.py:4"),
+            ("tests/conftest.py", "import calc", "import calc\nTOLERANCE = 0", "new/tests/conftest.py:4"),
+            ("tests/test_wrap.py", "TestWrapped", "TestOther",
+             "new/tests/test_wrap.py (module-level change in a file that defines no tests)"),
+            ("calc.py", "def add(a, b):", "def add(a, b:", "new/calc.py (does not parse)"),
+        ]
+        for path, old, new, unmapped in cases:
+            with self.subTest(path=path, change=new):
+                shutil.rmtree("new")
+                shutil.copytree("old", "new")
+                self.edit(path, old, new)
+                result = self.select()
+                self.assertTrue(result["fallback"])
+                self.assertEqual(result["selected"], [test["full_name"] for test in TESTS])
+                self.assertIn(unmapped, result["unmapped"])
+
+    def test_deleted_and_non_python_files_fall_back(self):
+        os.remove(os.path.join("new", "calc.py"))
+        with open(os.path.join("new", "setup.cfg"), "w") as f:
+            f.write("[tool]\n")
+        result = self.select()
+        self.assertTrue(result["fallback"])
+        self.assertEqual(result["unmapped"], ["old/calc.py (deleted)", "new/setup.cfg (not a Python source file)"])
+
+if __name__ == '__main__':
+    unittest.main()
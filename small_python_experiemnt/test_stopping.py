@@ -0,0 +1,167 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import textwrap
+import contextlib
+import unittest
+
+import pytest
+
+from prioritization.stopping import (AnyOf, FailureProbabilityThreshold, MaxFailures, StoppingPlugin, TimeBudget,
+                                     build_stopping_policy, load_failure_probabilities)
+
+NODE_IDS = [
+    "tests/test_v1.py::TestCalculator::test_add[v0]",
+    "tests/test_v1.py::TestCalculator::test_add[v1]",
+    "tests/test_v1.py::TestCalculator::test_divide",
+    "tests/test_v1.py::TestCalculator::test_power",
+]
+
+
+def result(nodeid, status="PASSED"):
+    return {"nodeid": nodeid, "status": status}
+
+
+class TestMaxFailures(unittest.TestCase):
+    def test_parametrized_instances_count_once(self):
+        """Test that failing instances of one parametrized test are a single distinct failure."""
+        policy = MaxFailures(2)
+        policy.start(NODE_IDS)
+        self.assertIsNone(policy.update(result(NODE_IDS[0], "FAILED")))
+        self.assertIsNone(policy.update(result(NODE_IDS[1], "FAILED")))
+        self.assertIsNotNone(policy.update(result(NODE_IDS[2], "ERROR")))
+
+    def test_passing_and_skipped_tests_never_stop(self):
+        """Test that only failures and errors count."""
+        policy = MaxFailures(1)
+        policy.start(NODE_IDS)
+        for status in ("PASSED", "SKIPPED"):
+            self.assertIsNone(policy.update(result(NODE_IDS[0], status)))
+
+    def test_start_resets(self):
+        """Test that a new run forgets the failures and reason of the last one."""
+        policy = MaxFailures(1)
+        policy.start(NODE_IDS)
+        policy.update(result(NODE_IDS[2], "FAILED"))
+        policy.start(NODE_IDS)
+        self.assertIsNone(policy.reason)
+        self.assertIsNone(policy.update(result(NODE_IDS[3])))
+
+    def test_count_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            MaxFailures(0)
+
+
+class TestTimeBudget(unittest.TestCase):
+    def test_stops_once_budget_is_used(self):
+        """Test that a used-up budget stops at the next result and an ample one never does."""
+        exhausted = TimeBudget(0)
+        exhausted.start(NODE_IDS)
+        self.assertIn("time budget", exhausted.update(result(NODE_IDS[0])))
+        ample = TimeBudget(3600)
+        ample.start(NODE_IDS)
+        self.assertIsNone(ample.update(result(NODE_IDS[0])))
+
+
+class TestFailureProbabilityThreshold(unittest.TestCase):
+    def test_stops_when_remaining_tests_are_unlikely_to_fail(self):
+        """Test that the run stops once no unfinished test reaches the threshold."""
+        probabilities = {NODE_IDS[0]: 0.9, "TestCalculator::test_divide": 0.5, "test_power": 0.01}
+        policy = FailureProbabilityThreshold(probabilities, 0.1, default=0.0)
+        policy.start(NODE_IDS)
+        self.assertIsNone(policy.update(result(NODE_IDS[0])))
+        self.assertIsNone(policy.update(result(NODE_IDS[1])))
+        self.assertIn("below 0.1", policy.update(result(NODE_IDS[2])))
+
+    def test_looks_up_names_at_every_level(self):
+        """Test that a test's probability is found by node ID, unparametrized ID, full name or method name."""
+        policy = FailureProbabilityThreshold({
+            NODE_IDS[0]: 0.1,
+            "tests/test_v1.py::TestCalculator::test_add": 0.2,
+            "TestCalculator::test_divide": 0.3,
+            "test_power": 0.4,
+        }, 0.5)
+        self.assertEqual([policy.probability(nodeid) for nodeid in NODE_IDS], [0.1, 0.2, 0.3, 0.4])
+        self.assertEqual(policy.probability("tests/test_v1.py::TestCalculator::test_unknown"), 1.0)
+
+    def test_results_out_of_order(self):
+        """Test that a later test finishing first does not hide an earlier unfinished one."""
+        policy = FailureProbabilityThreshold({NODE_IDS[0]: 0.9}, 0.5, default=0.0)
+        policy.start(NODE_IDS)
+        self.assertIsNone(policy.update(result(NODE_IDS[3])))
+        self.assertIsNotNone(policy.update(result(NODE_IDS[0])))
+
+
+class TestAnyOf(unittest.TestCase):
+    def test_every_policy_sees_every_result(self):
+        """Test that the combined policy stops for either reason and keeps both policies up to date."""
+        failures = MaxFailures(2)
+        policy = AnyOf([failures, TimeBudget(3600)])
+        policy.start(NODE_IDS)
+        self.assertIsNone(policy.update(result(NODE_IDS[0], "FAILED")))
+        self.assertIn("2 distinct", policy.update(result(NODE_IDS[2], "FAILED")))
+
+
+class TestBuildStoppingPolicy(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = os.path.join(self.tmp.name, "history.json")
+        with open(self.history, "w") as f:
+            json.dump({"test_add": "FAIL", "test_divide": "FLAKY", "test_power": 0.25}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_options(self):
+        """Test that no options give no policy, one gives that policy and several combine."""
+        self.assertIsNone(build_stopping_policy())
+        self.assertIsInstance(build_stopping_policy(max_failures=1), MaxFailures)
+        combined = build_stopping_policy(max_failures=1, time_budget=10, min_failure_probability=0.1,
+                                         failure_history=self.history)
+        self.assertIsInstance(combined, AnyOf)
+        self.assertEqual([type(policy) for policy in combined.policies],
+                         [MaxFailures, TimeBudget, FailureProbabilityThreshold])
+        with self.assertRaises(ValueError):
+            build_stopping_policy(min_failure_probability=0.1)
+
+    def test_load_failure_probabilities(self):
+        """Test that last results count as certain failures or passes and a missing file as no history."""
+        self.assertEqual(load_failure_probabilities(self.history),
+                         {"test_add": 1.0, "test_divide": 0.0, "test_power": 0.25})
+        self.assertEqual(load_failure_probabilities(os.path.join(self.tmp.name, "missing.json")), {})
+
+
+class TestStoppingPlugin(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        with open("test_stop_sample.py", "w") as f:
+            f.write(textwrap.dedent('''
+                def test_first():
+                    pass
+
+                def test_second():
+                    assert False
+
+                def test_third():
+                    pass
+            '''))
+
+    def tearDown(self):
+        sys.modules.pop("test_stop_sample", None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_skips_the_rest_of_the_session(self):
+        """Test that the plugin ends the session at the policy's decision and lists the tests not run."""
+        policy = MaxFailures(1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pytest.main(["-q", "-p", "no:cacheprovider", "test_stop_sample.py"], plugins=[StoppingPlugin(policy)])
+        self.assertIsNotNone(policy.reason)
+        self.assertEqual(policy.skipped, ["test_stop_sample.py::test_third"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ import sys
 import os
 import json
 from datetime import datetime
+from prioritization.nodeids import method_name
+from prioritization.result_events import iter_result_events
 from prioritization.utils import evaluate_fault_detection_efficiency
 
 def parse_test_output(output_text):
@@ -20,6 +22,13 @@ def parse_test_output(output_text):
     
     return results
 
+def parse_result_events(events_file):
+    """Read test results from a JSONL result events file."""
+    return [
+        {'test_name': method_name(event['nodeid']), 'status': event['status']}
+        for event in iter_result_events(events_file)
+    ]
+
 def create_summary_file(results, output_file, apfd=None):
     """Create a markdown summary file with the test results."""
     with open(output_file, 'w') as f:
@@ -53,7 +62,7 @@ def main():
     if len(sys.argv) > 1:
         input_file = sys.argv[1]
     else:
-        input_file = "test_output.txt"
+        input_file = "test_events.jsonl"
     
     if len(sys.argv) > 2:
         output_file = sys.argv[2]
@@ -63,16 +72,17 @@ def main():
     # Check if input file exists
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' not found.")
-        print("Capture test output to a file first using:")
-        print("./run_prioritized_tests.sh > test_output.txt")
+        print("Run ./run_prioritized_tests.sh first; it writes test_events.jsonl")
         return
     
-    # Read the test output
-    with open(input_file, 'r') as f:
-        output_text = f.read()
-    
-    # Parse the output
-    results = parse_test_output(output_text)
+    if input_file.endswith(".jsonl"):
+        # Structured events written by the result_events pytest plugin
+        results = parse_result_events(input_file)
+    else:
+        # Read and parse verbose pytest console output
+        with open(input_file, 'r') as f:
+            output_text = f.read()
+        results = parse_test_output(output_text)
 
     # Calculate APFD if available
     apfd = None
@@ -1,13 +1,14 @@
 # tests/analyze_regression.py
 
-import subprocess
+import os
+import sys
 import json
 
-def run_test(test_name):
-    """Run a specific test and return whether it passed or failed"""
-    cmd = f"pytest tests/test_v1.py::TestCalculator::{test_name} -v"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    return result.returncode == 0  # True if passed, False if failed
+# Add the parent directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from prioritization.runner import run_tests
+from prioritization.history_store import HistoryStore
+from prioritization.git_utils import current_commit
 
 # List of all test methods
 tests = [
@@ -19,11 +20,24 @@ tests = [
     "test_square_root"
 ]
 
-# Run tests and record which ones fail
+# Run all tests in one pytest session and record which ones fail; failures
+# are rerun twice so flaky tests are recorded as FLAKY rather than FAIL
 results = {}
-for test in tests:
-    passed = run_test(test)
-    results[test] = "PASS" if passed else "FAIL"
+
+def record_result(result):
+    test = result['nodeid'].split("::")[-1]
+    if result['flaky']:
+        results[test] = "FLAKY"
+    else:
+        results[test] = "PASS" if result['status'] == "PASSED" else "FAIL"
+
+with open(os.devnull, "w") as devnull:
+    run_results = run_tests([f"tests/test_v1.py::TestCalculator::{test}" for test in tests],
+                            callback=record_result, verbose=False, output=devnull, reruns=2)
+
+# Append this run to the long-term history as well
+with HistoryStore("test_history.db") as history:
+    history.record_run(run_results, commit=current_commit())
 
 # Print results in order of failure (failed tests first)
 print("Test Prioritization Results:")
@@ -33,4 +47,4 @@ for test, result in sorted(results.items(), key=lambda x: 0 if x[1] == "FAIL" el
 
 # Save results to a file
 with open("test_results.json", "w") as f:
-    json.dump(results, f, indent=2)
\ No newline at end of file
+    json.dump(results, f, indent=2)